@@ -1,12 +1,14 @@
 from .api_server import run_comfyui_extra_api
-from .nodes import SimpleGenImageInterface
+from .nodes import SimpleGenImageInterface, SimpleGenImageBatchInterface
 
 NODE_CLASS_MAPPINGS = {
     "SimpleGenImageInterface": SimpleGenImageInterface,
+    "SimpleGenImageBatchInterface": SimpleGenImageBatchInterface,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "SimpleGenImageInterface": "Simple Gen Image Interface",
+    "SimpleGenImageBatchInterface": "Simple Gen Image Batch Interface",
 }
 
 run_comfyui_extra_api()
\ No newline at end of file
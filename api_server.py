@@ -1,20 +1,101 @@
+import asyncio
+import json
 import logging
 import os
+import time
 import traceback
+from urllib.parse import quote
 
-from aiohttp.web import Request, json_response
+from aiohttp.web import FileResponse, Request, Response, StreamResponse, json_response
 from server import PromptServer
 import folder_paths
 
 from .model_utils.refresh import refresh_folder
+from .model_utils.watcher import folder_watcher, start_watchers
+from .model_utils import hashes, lora
+from .model_utils.checkpoint import list_checkpoint_infos, matches_filters
+from .model_utils.lora_index import lora_catalog
+from .model_utils.shared_index import shared_index
+from .model_utils.cache import cache_stats
 from .model_utils.lora import (
     list_available_networks,
-    available_networks,
     create_lora_json,
+    index_ready as lora_index_ready,
+    index_status as lora_index_status,
+)
+from .utils.images import (
+    StreamReader,
+    UnsupportedImageFormat,
+    decode_img_metadata,
+    extract_stream_metadata,
+    file_img_metadata,
+)
+from .utils.files import (
+    FOLDER_TYPES,
+    delete_images,
+    resolve_annotated_file,
+    select_images,
+)
+from .utils import config
+from .utils.decoded_cache import decoded_inputs
+from .utils.downloads import (
+    ARCHIVE_FORMATS,
+    ARCHIVE_MAX_FILES,
+    download_url,
+    record_access,
+    write_archive,
+)
+from .utils.generate import (
+    MAX_WAIT as GENERATE_MAX_WAIT,
+    PromptRejected,
+    generation_jobs,
+    image_path,
+)
+from .utils.output_index import output_index
+from .utils.thumbnails import (
+    DEFAULT_SIZE as THUMBNAIL_DEFAULT_SIZE,
+    FORMATS as THUMBNAIL_FORMATS,
+    QUALITY as THUMBNAIL_QUALITY,
+    cached_thumbnail,
+    render_thumbnail,
+    thumbnail_stats,
+    start_pregeneration,
+    store_thumbnail,
+    thumbnail_etag,
+    thumbnail_url,
+    validate_params as validate_thumbnail_params,
+)
+from .utils.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    InstrumentedRoutes,
+    registry as metrics_registry,
+)
+from .utils.response_cache import (
+    ResponseCache,
+    cached_json_response,
+    etag_matches,
+    json_body,
+    query_key,
+)
+from .utils.retention import (
+    RETENTION_FOLDER_TYPES,
+    RetentionPolicy,
+    apply_retention,
+    start_retention,
+    usage as retention_usage,
+)
+from .utils.executor import (
+    ExecutorBusy,
+    run_io,
+    run_cpu,
+    executor_stats,
+    io_executor,
 )
-from .utils.images import base64_decode_to_pil, extract_img_metadata
 
-routes = PromptServer.instance.routes
+routes = InstrumentedRoutes(PromptServer.instance.routes)
+listing_cache = ResponseCache()
+# legacy clients expect every response with HTTP 200 and the status in the `code` field
+LEGACY_ERROR_STATUS = config.get_bool("LEGACY_ERROR_STATUS", False)
 
 
 def success_resp(**kwargs):
@@ -22,22 +103,111 @@ def success_resp(**kwargs):
 
 
 def error_resp(code, message, **kwargs):
-    return json_response({"code": code, "message": message, **kwargs})
+    return json_response(
+        {"code": code, "message": message, **kwargs},
+        status=200 if LEGACY_ERROR_STATUS else code,
+    )
+
+
+def checkpoints_version(with_info=False):
+    # get_filename_list revalidates ComfyUI's cached list against the folder mtimes,
+    # the build time of the cached list then identifies its content
+    checkpoints = folder_paths.get_filename_list("checkpoints")
+    entry = folder_paths.filename_list_cache.get("checkpoints")
+    version = entry[2] if entry else time.monotonic()
+    if not with_info:
+        return version
+    # a file overwritten in place leaves the folder mtime unchanged, the info is per file
+    files = []
+    for ckpt in checkpoints:
+        full_path = folder_paths.get_full_path("checkpoints", ckpt)
+        try:
+            st = os.stat(full_path) if full_path else None
+        except OSError:
+            st = None
+        files.append((ckpt, st.st_mtime_ns, st.st_size) if st else (ckpt, None, None))
+    return version, tuple(files)
+
+
+def list_checkpoints(with_info=False, include_metadata=False, **filters):
+    checkpoints = folder_paths.get_filename_list("checkpoints")
+    infos = list_checkpoint_infos(checkpoints) if with_info else {}
+    result = []
+    for ckpt in checkpoints:
+        item = {
+            "name": os.path.basename(ckpt),
+            "path": ckpt,
+            "full_path": folder_paths.get_full_path("checkpoints", ckpt) or ckpt,
+        }
+        if with_info:
+            info = infos.get(ckpt)
+            if not matches_filters(info, **filters):
+                continue
+            if info is not None:
+                item.update({k: v for k, v in info.items() if k != "metadata"})
+                if include_metadata:
+                    item["metadata"] = info["metadata"]
+        result.append(item)
+    return result
+
+
+def refresh_checkpoints_folder():
+    data = refresh_folder("checkpoints")
+    if hashes.hashing_enabled:
+        hashes.schedule_checkpoints()
+    shared_index.refresh()
+    return data
+
+
+def refresh_loras_folder():
+    data = refresh_folder("loras")
+    scan = None
+    # followers got the registry of the owner process with the filename list
+    if shared_index.owner and (
+        "loras" not in folder_watcher.watched_folders or not folder_watcher.active
+    ):
+        scan = list_available_networks()
+        if hashes.hashing_enabled:
+            hashes.schedule_loras()
+    shared_index.refresh()
+    return data, scan
 
 
 @routes.get("/comfyapi/v1/checkpoints")
 async def get_checkpoints(request: Request):
     try:
-        checkpoints = folder_paths.get_filename_list("checkpoints")
-        result = [
-            {
-                "name": os.path.basename(ckpt),
-                "path": ckpt,
-                "full_path": folder_paths.get_full_path("checkpoints", ckpt) or ckpt,
+        query = request.rel_url.query
+        split = lambda key: [v.lower() for v in query.get(key, "").split(",") if v]
+        try:
+            filters = {
+                "sd_versions": split("arch"),
+                "dtypes": split("dtype"),
+                "min_params": int(query["min_params"]) if "min_params" in query else None,
+                "max_params": int(query["max_params"]) if "max_params" in query else None,
             }
-            for ckpt in checkpoints
-        ]
-        return success_resp(result=result)
+        except ValueError as e:
+            return error_resp(400, str(e))
+        include_metadata = query.get("include_metadata", "false") == "true"
+        with_info = (
+            query.get("info", "false") == "true"
+            or include_metadata
+            or any(filters.values())
+        )
+
+        key = ("checkpoints",) + query_key(request)
+
+        def build():
+            version = checkpoints_version(with_info)
+            entry = listing_cache.get(key, version)
+            if entry is None:
+                result = list_checkpoints(with_info, include_metadata, **filters)
+                entry = listing_cache.put(key, version, json_body(result=result))
+            return entry
+
+        entry = await run_io("checkpoints", build)
+        return cached_json_response(request, entry)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         return error_resp(500, str(e))
 
@@ -46,8 +216,10 @@ async def get_checkpoints(request: Request):
 async def refresh_checkpoints(request: Request):
     """Refresh the checkpoints list and return the updated list(maybe useful for models that stored in a network storage)"""
     try:
-        data = refresh_folder("checkpoints")
+        data = await run_io("refresh-checkpoints", refresh_checkpoints_folder)
         return success_resp(data=data)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         return error_resp(500, str(e))
 
@@ -55,10 +227,109 @@ async def refresh_checkpoints(request: Request):
 @routes.get("/comfyapi/v1/loras")
 async def get_loras(request: Request):
     try:
-        loras = loras = [
-            create_lora_json(obj=obj) for obj in available_networks.values()
-        ]
-        return success_resp(loras=loras)
+        try:
+            wait = min(float(request.rel_url.query.get("wait", 0)), 60.0)
+        except ValueError as e:
+            return error_resp(400, str(e))
+
+        # wait for the background index without holding a worker thread
+        deadline = time.monotonic() + wait
+        while not lora_index_ready.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        version = (lora.registry_version, lora_index_status())
+        entry = listing_cache.get(("loras",), version)
+        if entry is None:
+
+            def build():
+                loras = [
+                    create_lora_json(obj=obj)
+                    for obj in list(lora.available_networks.values())
+                ]
+                return json_body(loras=loras, status=version[1])
+
+            body = await run_io("loras", build)
+            entry = listing_cache.put(("loras",), version, body)
+        return cached_json_response(request, entry)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+def search_loras(
+    query,
+    mode,
+    fields,
+    tags,
+    sd_versions,
+    offset,
+    limit,
+    include_metadata,
+    metadata_keys,
+    include_tags=False,
+):
+    names = lora_catalog.search(query, mode, fields, tags, sd_versions)
+    loras = []
+    for name in names[offset : offset + limit]:
+        obj = lora.available_networks.get(name)
+        if obj is None:
+            continue
+        item = create_lora_json(obj, include_metadata=include_metadata)
+        item["sd_version"] = obj.sd_version.name
+        item["trigger_words"] = lora_catalog.trigger_words(name)
+        if include_tags:
+            item["tags"] = obj.tags
+        if metadata_keys and not include_metadata:
+            metadata = obj.load_metadata()
+            item["metadata"] = {k: metadata[k] for k in metadata_keys if k in metadata}
+        loras.append(item)
+    return {"loras": loras, "total": len(names), "offset": offset, "limit": limit}
+
+
+@routes.get("/comfyapi/v1/loras/search")
+async def get_loras_search(request: Request):
+    """Search the LoRAs by name/alias prefix, trigger tags and architecture"""
+    try:
+        query = request.rel_url.query
+        split = lambda key: [v for v in query.get(key, "").split(",") if v]
+        try:
+            offset = max(int(query.get("offset", 0)), 0)
+            limit = min(max(int(query.get("limit", 50)), 1), 1000)
+        except ValueError as e:
+            return error_resp(400, str(e))
+        mode = query.get("mode", "prefix")
+        fields = query.get("in", "names")
+        if mode not in ("prefix", "fuzzy"):
+            return error_resp(400, f"invalid mode: {mode}")
+        if fields not in ("names", "tags", "all"):
+            return error_resp(400, f"invalid in: {fields}")
+
+        key = ("loras-search",) + query_key(request)
+        version = (lora.registry_version, lora_index_status())
+        entry = listing_cache.get(key, version)
+        if entry is None:
+
+            def build():
+                result = search_loras(
+                    query.get("q"),
+                    mode,
+                    fields,
+                    split("tag"),
+                    split("sd_version"),
+                    offset,
+                    limit,
+                    query.get("include_metadata", "false") == "true",
+                    split("metadata_keys"),
+                    query.get("include_tags", "false") == "true",
+                )
+                return json_body(**result, status=version[1])
+
+            body = await run_io("loras-search", build)
+            entry = listing_cache.put(key, version, body)
+        return cached_json_response(request, entry)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         return error_resp(500, str(e))
 
@@ -66,9 +337,30 @@ async def get_loras(request: Request):
 @routes.post("/comfyapi/v1/refresh-loras")
 async def refresh_loras(request: Request):
     try:
-        data = refresh_folder("loras")
-        list_available_networks()
-        return success_resp(data=data)
+        data, scan = await run_io("refresh-loras", refresh_loras_folder)
+        return success_resp(data=data, scan=scan)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+@routes.get("/comfyapi/v1/models/by-hash/{hash}")
+async def get_models_by_hash(request: Request):
+    """Checkpoints and LoRAs matching a sha256, AutoV2, short or addnet hash."""
+    hash_value = request.match_info.get("hash", "").strip()
+    if not hash_value:
+        return error_resp(400, "hash is required")
+
+    try:
+        models = await run_io("models-by-hash", hashes.lookup, hash_value)
+        if not models:
+            return error_resp(
+                404, f"no model found for hash {hash_value}", status=dict(hashes.hash_stats)
+            )
+        return success_resp(models=models, status=dict(hashes.hash_stats))
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         return error_resp(500, str(e))
 
@@ -76,24 +368,237 @@ async def refresh_loras(request: Request):
 @routes.get("/comfyapi/v1/output-images")
 async def get_output_images(request: Request):
     try:
-        is_temp = request.rel_url.query.get("temp", "false") == "true"
+        query = request.rel_url.query
+        is_temp = query.get("temp", "false") == "true"
         folder = (
             folder_paths.get_temp_directory()
             if is_temp
             else folder_paths.get_output_directory()
         )
-        # iterate through the folder and get the list of images
-        images = []
-        for root, dirs, files in os.walk(folder):
-            for file in files:
-                if file.endswith((".png", ".jpg", ".jpeg", ".webp", ".gif")):
-                    image = {"name": file, "full_path": os.path.join(root, file)}
-                    images.append(image)
-        return success_resp(images=images)
+        try:
+            limit = int(query["limit"]) if "limit" in query else None
+            since = float(query["since"]) if "since" in query else None
+            until = float(query["until"]) if "until" in query else None
+        except ValueError as e:
+            return error_resp(400, str(e))
+        extensions = [e for e in query.get("ext", "").split(",") if e]
+
+        def list_images():
+            output_index.sync(folder, force=query.get("refresh", "false") == "true")
+            return output_index.query(
+                folder,
+                sort=query.get("sort", "name"),
+                order=query.get("order", "asc"),
+                limit=limit,
+                cursor=query.get("cursor"),
+                since=since,
+                until=until,
+                subfolder=query.get("subfolder"),
+                extensions=extensions,
+            )
+
+        thumbnail_size = query.get("thumbnail_size")
+        thumbnail_format = query.get("thumbnail_format", "webp")
+        try:
+            if thumbnail_size is not None:
+                thumbnail_size = int(thumbnail_size)
+                validate_thumbnail_params(thumbnail_size, thumbnail_format, THUMBNAIL_QUALITY)
+            images, next_cursor = await run_io("output-images", list_images)
+        except ValueError as e:
+            return error_resp(400, str(e))
+        folder_type = "temp" if is_temp else "output"
+        for image in images:
+            filename = (
+                f"{image['subfolder']}/{image['name']}" if image["subfolder"] else image["name"]
+            )
+            image["download_url"] = download_url(filename, folder_type)
+            if thumbnail_size is not None:
+                image["thumbnail_url"] = thumbnail_url(
+                    filename, folder_type, thumbnail_size, thumbnail_format, image["mtime"]
+                )
+        return success_resp(images=images, next_cursor=next_cursor)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         return error_resp(500, str(e))
 
 
+# renders in progress, concurrent requests for the same thumbnail wait for the same result
+thumbnail_renders = {}
+
+
+@routes.get("/comfyapi/v1/thumbnail")
+async def get_thumbnail(request: Request):
+    """Thumbnail of an output/input/temp image, rendered once and cached on disk"""
+    try:
+        query = request.rel_url.query
+        filename = query.get("filename", "")
+        folder_type = query.get("type", "output")
+        fmt = query.get("format", "webp").lower()
+        try:
+            size = int(query.get("size", THUMBNAIL_DEFAULT_SIZE))
+            quality = int(query.get("quality", THUMBNAIL_QUALITY))
+            validate_thumbnail_params(size, fmt, quality)
+
+            def lookup():
+                filepath = resolve_annotated_file(filename, folder_type)
+                if filepath is None:
+                    return None, None, None
+                st = os.stat(filepath)
+                return filepath, st, cached_thumbnail(filepath, st, size, fmt, quality)
+
+            filepath, st, data = await run_io("thumbnail", lookup)
+        except ValueError as e:
+            return error_resp(400, str(e))
+        if filepath is None:
+            return error_resp(404, f"file {filename} not found")
+
+        etag = thumbnail_etag(filepath, st, size, fmt, quality)
+        headers = {
+            "ETag": etag,
+            # versioned URLs (see thumbnail_url) never change
+            "Cache-Control": "public, max-age=31536000, immutable" if "v" in query else "no-cache",
+        }
+        if etag_matches(request, etag):
+            return Response(status=304, headers=headers)
+
+        if data is None:
+            future = thumbnail_renders.get(etag)
+            if future is None:
+                future = asyncio.ensure_future(
+                    run_cpu("thumbnail-render", render_thumbnail, filepath, size, fmt, quality)
+                )
+                thumbnail_renders[etag] = future
+                future.add_done_callback(lambda _: thumbnail_renders.pop(etag, None))
+                data = await asyncio.shield(future)
+                await run_io("thumbnail", store_thumbnail, filepath, st, size, fmt, quality, data)
+            else:
+                data = await asyncio.shield(future)
+
+        return Response(body=data, headers=headers, content_type=THUMBNAIL_FORMATS[fmt][1])
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+def attachment_header(filename: str) -> str:
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+@routes.get("/comfyapi/v1/download")
+async def download_file(request: Request):
+    """
+    Streams an output/input/temp file with sendfile. FileResponse answers Range,
+    If-Modified-Since and If-None-Match requests.
+    """
+    try:
+        query = request.rel_url.query
+        filename = query.get("filename", "")
+        folder_type = query.get("type", "output")
+
+        def resolve():
+            filepath = resolve_annotated_file(filename, folder_type)
+            if filepath is not None:
+                record_access(folder_type, filepath)
+            return filepath
+
+        try:
+            filepath = await run_io("download", resolve)
+        except ValueError as e:
+            return error_resp(400, str(e))
+        if filepath is None:
+            return error_resp(404, f"file {filename} not found")
+
+        headers = {"Cache-Control": "no-cache"}
+        if query.get("attachment", "false") == "true":
+            headers["Content-Disposition"] = attachment_header(os.path.basename(filepath))
+        return FileResponse(filepath, headers=headers)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+def archive_files(folder_type, filenames, pattern, older_than_hours):
+    """(arcname, path) of the selected files that exist."""
+    if pattern is not None or older_than_hours is not None:
+        selected = select_images(folder_type, pattern, older_than_hours)
+        filenames = list(dict.fromkeys(filenames + selected))
+    if len(filenames) > ARCHIVE_MAX_FILES:
+        raise ValueError(f"too many files: {len(filenames)}, at most {ARCHIVE_MAX_FILES}")
+    files = []
+    for filename in filenames:
+        filepath = resolve_annotated_file(f"{filename} [{folder_type}]", folder_type)
+        if filepath is not None:
+            files.append((filename, filepath))
+    return files
+
+
+@routes.post("/comfyapi/v1/download/archive")
+async def download_archive(request: Request):
+    """Streams the selected files as a zip or tar archive, built while it is sent"""
+    try:
+        data = await request.json()
+        folder_type = data.get("type", "output")
+        fmt = data.get("format", "zip")
+        filenames = data.get("filenames") or []
+        pattern = data.get("glob")
+        older_than_hours = data.get("older_than_hours")
+        if folder_type not in FOLDER_TYPES:
+            return error_resp(400, f"invalid type: {folder_type}")
+        if fmt not in ARCHIVE_FORMATS:
+            return error_resp(
+                400, f"invalid format: {fmt}, expected one of {', '.join(ARCHIVE_FORMATS)}"
+            )
+        if not isinstance(filenames, list):
+            return error_resp(400, "filenames must be a list")
+        if not filenames and pattern is None and older_than_hours is None:
+            return error_resp(400, "filenames, glob or older_than_hours is required")
+        if older_than_hours is not None:
+            older_than_hours = float(older_than_hours)
+    except Exception as e:
+        return error_resp(400, str(e))
+
+    try:
+        files = await run_io(
+            "download-archive", archive_files, folder_type, filenames, pattern, older_than_hours
+        )
+    except ValueError as e:
+        return error_resp(400, str(e))
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+    if not files:
+        return error_resp(404, "no file found")
+
+    content_type, extension = ARCHIVE_FORMATS[fmt]
+    response = StreamResponse(
+        headers={
+            "Content-Type": content_type,
+            "Content-Disposition": attachment_header(f"{folder_type}-images{extension}"),
+        }
+    )
+    await response.prepare(request)
+    loop = asyncio.get_running_loop()
+
+    def send(chunk):
+        # the writer thread waits for each chunk to be sent, slow clients slow it down
+        asyncio.run_coroutine_threadsafe(response.write(chunk), loop).result()
+
+    try:
+        await run_io("download-archive", write_archive, fmt, files, send)
+    except Exception as e:
+        # the status is already sent, the connection is closed to signal the truncated archive
+        print(f"[extra-api] archive download interrupted: {e}")
+        if request.transport is not None:
+            request.transport.close()
+        return response
+    await response.write_eof()
+    return response
+
+
 @routes.delete("/comfyapi/v1/output-images/{filename}")
 async def delete_output_images(request: Request):
     try:
@@ -105,13 +610,17 @@ async def delete_output_images(request: Request):
             return error_resp(400, "invalid filename")
 
         is_temp = request.rel_url.query.get("temp", "false") == "true"
-        annotated_file = f"{filename} [{'temp' if is_temp else 'output'}]"
-        if not folder_paths.exists_annotated_filepath(annotated_file):
-            return error_resp(404, f"file {filename} not found")
-
-        filepath = folder_paths.get_annotated_filepath(annotated_file)
-        os.remove(filepath)
+        [result] = await run_io(
+            "delete-output-images",
+            delete_images,
+            "temp" if is_temp else "output",
+            [filename],
+        )
+        if result["code"] != 200:
+            return error_resp(result["code"], result["message"])
         return success_resp()
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         return error_resp(500, str(e))
 
@@ -127,13 +636,70 @@ async def delete_input_images(request: Request):
             return error_resp(400, "invalid filename")
 
         is_temp = request.rel_url.query.get("temp", "false") == "true"
-        annotated_file = f"{filename} [{'temp' if is_temp else 'input'}]"
-        if not folder_paths.exists_annotated_filepath(annotated_file):
-            return error_resp(404, f"file {filename} not found")
-
-        filepath = folder_paths.get_annotated_filepath(annotated_file)
-        os.remove(filepath)
+        [result] = await run_io(
+            "delete-input-images",
+            delete_images,
+            "temp" if is_temp else "input",
+            [filename],
+        )
+        if result["code"] != 200:
+            return error_resp(result["code"], result["message"])
         return success_resp()
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+@routes.post("/comfyapi/v1/images/bulk-delete")
+async def bulk_delete_images(request: Request):
+    try:
+        data = await request.json()
+        folder_type = data.get("type", "output")
+        filenames = data.get("filenames") or []
+        pattern = data.get("glob")
+        older_than_hours = data.get("older_than_hours")
+        dry_run = bool(data.get("dry_run", False))
+        if folder_type not in FOLDER_TYPES:
+            return error_resp(400, f"invalid type: {folder_type}")
+        if not isinstance(filenames, list):
+            return error_resp(400, "filenames must be a list")
+        if not filenames and pattern is None and older_than_hours is None:
+            return error_resp(400, "filenames, glob or older_than_hours is required")
+        if older_than_hours is not None:
+            older_than_hours = float(older_than_hours)
+    except Exception as e:
+        return error_resp(400, str(e))
+
+    try:
+        if pattern is not None or older_than_hours is not None:
+            selected = await run_io(
+                "bulk-delete", select_images, folder_type, pattern, older_than_hours
+            )
+            filenames = list(dict.fromkeys(filenames + selected))
+
+        if dry_run:
+            return success_resp(count=len(filenames), filenames=filenames)
+
+        # deletions run concurrently in chunks, keeping part of the io pool free
+        chunk_size = 64
+        semaphore = asyncio.Semaphore(max(1, io_executor.max_concurrency // 2))
+
+        async def delete_chunk(chunk):
+            async with semaphore:
+                return await run_io("bulk-delete", delete_images, folder_type, chunk)
+
+        chunks = await asyncio.gather(
+            *[
+                delete_chunk(filenames[i : i + chunk_size])
+                for i in range(0, len(filenames), chunk_size)
+            ]
+        )
+        results = [result for chunk in chunks for result in chunk]
+        deleted = sum(1 for result in results if result["code"] == 200)
+        return success_resp(deleted=deleted, results=results)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         return error_resp(500, str(e))
 
@@ -146,14 +712,325 @@ async def get_png_info(request: Request):
         if img_base64 is None:
             return error_resp(400, "img_base64 is required")
 
-        img = base64_decode_to_pil(img_base64)
-        metadata = extract_img_metadata(img)
+        metadata = await run_cpu("pnginfo", decode_img_metadata, img_base64)
         return success_resp(metadata=metadata)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
     except Exception as e:
         err = traceback.format_exc()
         logging.error(err)
         return error_resp(500, str(e))
 
 
+@routes.post("/comfyapi/v1/pnginfo/upload")
+async def upload_png_info(request: Request):
+    """Same as /pnginfo for a raw image body or a multipart upload, only the metadata chunks are read."""
+    try:
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            part = await reader.next()
+            while part is not None and part.filename is None:
+                part = await reader.next()
+            if part is None:
+                return error_resp(400, "image file is required")
+            read_chunk = lambda: part.read_chunk(2**16)
+        else:
+            read_chunk = lambda: request.content.read(2**16)
+
+        stream = StreamReader(read_chunk, asyncio.get_running_loop())
+        metadata = await run_io("pnginfo-upload", extract_stream_metadata, stream)
+        return success_resp(metadata=metadata)
+    except UnsupportedImageFormat as e:
+        return error_resp(400, str(e))
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        err = traceback.format_exc()
+        logging.error(err)
+        return error_resp(500, str(e))
+
+
+def read_file_metadata(filename, default_type):
+    filepath = resolve_annotated_file(filename, default_type)
+    if filepath is None:
+        raise FileNotFoundError(f"file {filename} not found")
+    return file_img_metadata(filepath)
+
+
+@routes.post("/comfyapi/v1/pnginfo/batch")
+async def batch_png_info(request: Request):
+    """
+    Extracts the metadata of many images at once, results are streamed as NDJSON
+    in completion order, one line per image.
+    """
+    try:
+        data = await request.json()
+        files = data.get("files") or []
+        images = data.get("images") or []
+        default_type = data.get("type", "output")
+        if not isinstance(files, list) or not isinstance(images, list):
+            return error_resp(400, "files and images must be lists")
+        if not files and not images:
+            return error_resp(400, "files or images is required")
+    except Exception as e:
+        return error_resp(400, str(e))
+
+    # keep a share of the io pool for the other requests
+    semaphore = asyncio.Semaphore(max(1, io_executor.max_concurrency // 2))
+
+    async def extract(item, run, fn, *args):
+        async with semaphore:
+            try:
+                return {**item, "metadata": await run("pnginfo-batch", fn, *args)}
+            except FileNotFoundError as e:
+                return {**item, "code": 404, "message": str(e)}
+            except ValueError as e:
+                return {**item, "code": 400, "message": str(e)}
+            except Exception as e:
+                return {**item, "code": 500, "message": str(e)}
+
+    tasks = [
+        extract({"file": name}, run_io, read_file_metadata, name, default_type)
+        for name in files
+    ] + [
+        extract({"image": i}, run_cpu, decode_img_metadata, img_base64)
+        for i, img_base64 in enumerate(images)
+    ]
+
+    response = StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    for task in asyncio.as_completed(tasks):
+        result = await task
+        await response.write((json.dumps(result) + "\n").encode("utf8"))
+    await response.write_eof()
+    return response
+
+
+@routes.get("/comfyapi/v1/retention")
+async def get_retention(request: Request):
+    try:
+        return success_resp(usage=await run_io("retention", retention_usage))
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+async def run_retention(request: Request, dry_run: bool):
+    try:
+        data = await request.json() if request.can_read_body else {}
+        folder_types = [data["type"]] if data.get("type") else RETENTION_FOLDER_TYPES
+        if any(t not in RETENTION_FOLDER_TYPES for t in folder_types):
+            return error_resp(400, f"invalid type: {data['type']}")
+        # an explicit policy in the body overrides the configured one
+        policy_keys = ("max_age_hours", "max_bytes", "max_files", "order")
+        policy = (
+            RetentionPolicy.from_dict(data)
+            if any(k in data for k in policy_keys)
+            else None
+        )
+        limit = int(data.get("limit", 1000))
+    except Exception as e:
+        return error_resp(400, str(e))
+
+    try:
+        results = []
+        for folder_type in folder_types:
+            result = await run_io(
+                "retention", apply_retention, folder_type, policy, dry_run
+            )
+            result["filenames"] = result["filenames"][:limit]
+            results.append(result)
+        return success_resp(results=results)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+@routes.post("/comfyapi/v1/retention/dry-run")
+async def retention_dry_run(request: Request):
+    return await run_retention(request, dry_run=True)
+
+
+@routes.post("/comfyapi/v1/retention/run")
+async def retention_run(request: Request):
+    return await run_retention(request, dry_run=False)
+
+
+@routes.get("/comfyapi/v1/executor-stats")
+async def get_executor_stats(request: Request):
+    return success_resp(**executor_stats())
+
+
+@routes.get("/comfyapi/v1/cache-stats")
+async def get_cache_stats(request: Request):
+    try:
+        stats = await run_io("cache-stats", cache_stats)
+        return success_resp(
+            **stats, thumbnails=dict(thumbnail_stats), decoded_inputs=decoded_inputs.stats()
+        )
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+def process_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@routes.get("/comfyapi/v1/memory")
+async def get_memory(request: Request):
+    """Approximate memory used by the LoRA registries and the search index"""
+    try:
+        loras = await run_io("memory", lora.registry_memory)
+        return success_resp(loras=loras, rss_bytes=process_rss())
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+@routes.get("/comfyapi/v1/shared-index")
+async def get_shared_index(request: Request):
+    try:
+        status = await run_io("shared-index", shared_index.status)
+        return success_resp(**status)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+def wait_seconds(request: Request, default: float = 0) -> float:
+    return min(max(float(request.rel_url.query.get("wait", default)), 0), GENERATE_MAX_WAIT)
+
+
+async def wait_for_job(job, timeout: float):
+    deadline = time.monotonic() + timeout
+    while not job.done:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not await job.wait_change(remaining):
+            break
+
+
+@routes.post("/comfyapi/v1/generate")
+async def generate(request: Request):
+    """
+    Queues a generation from a workflow template filled with the SimpleGenImageInterface
+    parameters, returns the job id (and the result with `wait`).
+    """
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            return error_resp(400, "a JSON object is required")
+        data = dict(data)
+        template = data.pop("template", None) or (
+            "img2img" if data.get("img2img_base64") else "txt2img"
+        )
+        wait = min(max(float(data.pop("wait", 0)), 0), GENERATE_MAX_WAIT)
+        job = await generation_jobs.submit(template, data)
+    except PromptRejected as e:
+        return error_resp(400, str(e), node_errors=e.node_errors)
+    except ValueError as e:
+        return error_resp(400, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+    if wait:
+        await wait_for_job(job, wait)
+    return success_resp(**job.to_dict())
+
+
+@routes.get("/comfyapi/v1/generate/{job_id}")
+async def get_generation(request: Request):
+    """State of a job, `wait` long-polls up to that many seconds for its completion"""
+    job = generation_jobs.get(request.match_info["job_id"])
+    if job is None:
+        return error_resp(404, "job not found")
+    try:
+        wait = wait_seconds(request)
+    except ValueError as e:
+        return error_resp(400, str(e))
+    await wait_for_job(job, wait)
+    return success_resp(**job.to_dict())
+
+
+@routes.get("/comfyapi/v1/generate/{job_id}/events")
+async def get_generation_events(request: Request):
+    """Server-Sent Events: a `status` event per queue change, then `completed` or `failed`"""
+    job = generation_jobs.get(request.match_info["job_id"])
+    if job is None:
+        return error_resp(404, "job not found")
+
+    response = StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+    await response.prepare(request)
+    while True:
+        changed = job.changed
+        event = job.status if job.done else "status"
+        await response.write(f"event: {event}\ndata: {json.dumps(job.to_dict())}\n\n".encode("utf8"))
+        if job.done:
+            break
+        try:
+            # comments keep proxies from closing idle streams
+            await asyncio.wait_for(changed.wait(), 15)
+        except asyncio.TimeoutError:
+            await response.write(b": keep-alive\n\n")
+    await response.write_eof()
+    return response
+
+
+@routes.get("/comfyapi/v1/generate/{job_id}/images/{index}")
+async def get_generation_image(request: Request):
+    job = generation_jobs.get(request.match_info["job_id"])
+    if job is None:
+        return error_resp(404, "job not found")
+    if job.status != "completed":
+        return error_resp(409, f"job is {job.status}")
+    try:
+        index = int(request.match_info["index"])
+    except ValueError:
+        return error_resp(400, f"invalid index: {request.match_info['index']}")
+    if not 0 <= index < len(job.images):
+        return error_resp(404, "image not found")
+    image = job.images[index]
+    try:
+        filepath = image_path(image)
+        if filepath is None or not await run_io("generate", os.path.isfile, filepath):
+            return error_resp(404, "image not found")
+        return FileResponse(filepath)
+    except ExecutorBusy as e:
+        return error_resp(503, str(e))
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
+@routes.get("/comfyapi/v1/metrics")
+async def get_metrics(request: Request):
+    """Request, scan, cache and executor metrics in the Prometheus text format"""
+    # rendered in the event loop, so it still answers when the worker pools are saturated
+    try:
+        body = metrics_registry.render()
+        return Response(body=body, headers={"Content-Type": METRICS_CONTENT_TYPE})
+    except Exception as e:
+        return error_resp(500, str(e))
+
+
 def run_comfyui_extra_api():
+    shared_index.start()
+    start_watchers()
+    start_retention()
+    hashes.start_hashing()
+    start_pregeneration()
     print("extra API server started")
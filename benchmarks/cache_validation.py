@@ -0,0 +1,143 @@
+"""
+Cost of validating metadata cache entries against their files.
+
+Creates a tree of files, builds an entry per file with each validator, then
+times the validation of every entry on the local disk and with a simulated
+latency per `stat` and per file read (network and FUSE mounts):
+
+    python benchmarks/cache_validation.py --files 10000 --latency-ms 0.2 --json
+"""
+
+import argparse
+import builtins
+import json
+import os
+import tempfile
+import time
+
+from harness import import_package, measure
+
+
+def make_tree(root, count, size):
+    # sparse files: only the head and the tail are written
+    files = []
+    payload = os.urandom(4096)
+    for i in range(count):
+        directory = os.path.join(root, f"{i // 500:03d}")
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, f"{i:06d}.safetensors")
+        with open(filename, "wb") as file:
+            file.write(payload)
+            if size > 2 * len(payload):
+                file.seek(size - len(payload))
+                file.write(payload)
+        files.append(filename)
+    return files
+
+
+class SlowFilesystem:
+    """Adds `latency` seconds to every stat and file open while active."""
+
+    def __init__(self, latency, validators):
+        self.latency = latency
+        self.validators = validators
+
+    def __enter__(self):
+        self.stat = os.stat
+        latency, real_stat, real_open = self.latency, os.stat, builtins.open
+
+        def slow_stat(*args, **kwargs):
+            time.sleep(latency)
+            return real_stat(*args, **kwargs)
+
+        def slow_open(*args, **kwargs):
+            time.sleep(latency)
+            return real_open(*args, **kwargs)
+
+        os.stat = slow_stat
+        self.validators.open = slow_open
+        return self
+
+    def __exit__(self, *exc):
+        os.stat = self.stat
+        del self.validators.open
+
+
+def legacy_validation(files, entries):
+    # previous behaviour: getmtime in cached_data_for_file plus getsize in the callers
+    for filename in files:
+        entry = entries[filename]
+        if os.path.getmtime(filename) > entry["mtime"]:
+            raise AssertionError(filename)
+        os.path.getsize(filename)
+
+
+def run_validator(validator, files, entries):
+    for filename in files:
+        st = os.stat(filename)
+        if not validator.is_valid(entries[filename], filename, st):
+            raise AssertionError(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--size", type=int, default=256 * 1024, help="bytes per file")
+    parser.add_argument("--latency-ms", type=float, default=0.2, help="simulated latency per syscall")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="where to create the files (a mount to test)")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    import_package()
+    from comfyui_extra_api.model_utils import validators
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as root:
+        files = make_tree(root, args.files, args.size)
+        cases = [("legacy", None)] + list(validators.validators.items())
+        entries = {
+            name: {f: validator.signature(f, os.stat(f)) for f in files}
+            for name, validator in cases
+            if validator is not None
+        }
+        entries["legacy"] = entries["mtime"]
+
+        for filesystem, latency in (("local", 0.0), ("slow", args.latency_ms / 1000)):
+            # the simulated mount is slow, a single pass is enough
+            repeat = args.repeat if latency == 0 else 1
+            for name, validator in cases:
+                if validator is None:
+                    fn = lambda: legacy_validation(files, entries["legacy"])
+                else:
+                    fn = lambda v=validator, e=entries[name]: run_validator(v, files, e)
+                if latency:
+                    with SlowFilesystem(latency, validators):
+                        seconds = measure(fn, repeat)
+                else:
+                    seconds = measure(fn, repeat)
+                results.append(
+                    {
+                        "filesystem": filesystem,
+                        "latency_ms": latency * 1000,
+                        "validator": name,
+                        "files": args.files,
+                        "seconds": round(seconds, 4),
+                        "ms_per_10k_files": round(seconds * 1000 * 10000 / args.files, 2),
+                    }
+                )
+
+    if args.json:
+        print(json.dumps({"benchmark": "cache_validation", "results": results}, indent=2))
+        return
+
+    print(f"{'filesystem':<10} {'validator':<12} {'seconds':>10} {'ms/10k files':>14}")
+    for result in results:
+        print(
+            f"{result['filesystem']:<10} {result['validator']:<12} "
+            f"{result['seconds']:>10.4f} {result['ms_per_10k_files']:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Shared helpers of the benchmark scripts: ComfyUI stubs, package import, synthetic
+trees, timing and result files.
+"""
+
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import time
+import types
+import zlib
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "comfyui_extra_api"
+
+
+def import_package():
+    # the package __init__ starts the ComfyUI extension, only its modules are needed
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PACKAGE_DIR]
+    sys.modules.setdefault(PACKAGE_NAME, package)
+    return package
+
+
+def install_stubs(root):
+    """
+    Minimal `folder_paths`, `server`, `comfy.samplers` and `node_helpers` modules so
+    the package runs without ComfyUI. Models live in <root>/models/<folder>, images in
+    <root>/output, input and temp.
+    """
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.base_path = root
+    folder_paths.folder_names_and_paths = {
+        "checkpoints": ([os.path.join(root, "models", "checkpoints")], {".safetensors", ".ckpt"}),
+        "loras": ([os.path.join(root, "models", "loras")], {".safetensors", ".ckpt", ".pt"}),
+    }
+    folder_paths.filename_list_cache = {}
+    directories = {name: os.path.join(root, name) for name in ("output", "input", "temp")}
+    model_dirs = [paths[0] for paths, _ in folder_paths.folder_names_and_paths.values()]
+    for directory in [*directories.values(), *model_dirs]:
+        os.makedirs(directory, exist_ok=True)
+
+    def get_folder_paths(folder_name):
+        return folder_paths.folder_names_and_paths[folder_name][0][:]
+
+    def get_filename_list_(folder_name):
+        paths, extensions = folder_paths.folder_names_and_paths[folder_name]
+        names = []
+        mtimes = {}
+        for path in paths:
+            for dirpath, _, files in os.walk(path, followlinks=True):
+                mtimes[dirpath] = os.path.getmtime(dirpath)
+                for file in files:
+                    if os.path.splitext(file)[1].lower() in extensions:
+                        relpath = os.path.relpath(os.path.join(dirpath, file), path)
+                        names.append(relpath.replace(os.sep, "/"))
+        return sorted(names), mtimes, time.perf_counter()
+
+    def get_filename_list(folder_name):
+        if folder_name not in folder_paths.filename_list_cache:
+            folder_paths.filename_list_cache[folder_name] = get_filename_list_(folder_name)
+        return list(folder_paths.filename_list_cache[folder_name][0])
+
+    def get_full_path(folder_name, filename):
+        for path in folder_paths.folder_names_and_paths[folder_name][0]:
+            full_path = os.path.join(path, filename)
+            if os.path.isfile(full_path):
+                return full_path
+        return None
+
+    def get_directory_by_type(folder_type):
+        return directories.get(folder_type)
+
+    def get_annotated_filepath(name, default_dir=None):
+        for folder_type, directory in directories.items():
+            suffix = f"[{folder_type}]"
+            if name.endswith(suffix):
+                return os.path.join(directory, name[: -len(suffix)].strip())
+        return os.path.join(default_dir or directories["input"], name)
+
+    folder_paths.get_folder_paths = get_folder_paths
+    folder_paths.get_filename_list_ = get_filename_list_
+    folder_paths.get_filename_list = get_filename_list
+    folder_paths.get_full_path = get_full_path
+    folder_paths.get_directory_by_type = get_directory_by_type
+    folder_paths.get_annotated_filepath = get_annotated_filepath
+    folder_paths.get_output_directory = lambda: directories["output"]
+    folder_paths.get_input_directory = lambda: directories["input"]
+    folder_paths.get_temp_directory = lambda: directories["temp"]
+    sys.modules["folder_paths"] = folder_paths
+
+    server = types.ModuleType("server")
+
+    class PromptServer:
+        instance = None
+
+        def __init__(self):
+            try:
+                from aiohttp import web
+
+                self.routes = web.RouteTableDef()
+            except ImportError:
+                self.routes = None
+            self.prompt_queue = None
+            self.address = "127.0.0.1"
+            self.port = 8188
+
+    PromptServer.instance = PromptServer()
+    server.PromptServer = PromptServer
+    sys.modules["server"] = server
+
+    comfy = types.ModuleType("comfy")
+    comfy.__path__ = []
+    samplers = types.ModuleType("comfy.samplers")
+
+    class KSampler:
+        SAMPLERS = ["euler", "euler_ancestral", "dpmpp_2m"]
+        SCHEDULERS = ["normal", "karras"]
+
+    samplers.KSampler = KSampler
+    comfy.samplers = samplers
+    sys.modules["comfy"] = comfy
+    sys.modules["comfy.samplers"] = samplers
+
+    node_helpers = types.ModuleType("node_helpers")
+    node_helpers.pillow = lambda fn, arg: fn(arg)
+    sys.modules["node_helpers"] = node_helpers
+    return folder_paths
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def png_with_metadata(width: int = 64, height: int = 64) -> bytes:
+    """A small PNG carrying a ComfyUI-like prompt and workflow in tEXt chunks."""
+    prompt = {
+        str(i): {"class_type": f"Node{i}", "inputs": {"seed": i, "text": "a photo of a cat " * 4}}
+        for i in range(12)
+    }
+    workflow = {
+        "nodes": [{"id": i, "type": f"Node{i}", "widgets_values": [i, "x" * 40]} for i in range(12)]
+    }
+    raw = b"".join(b"\x00" + bytes(width * 3) for _ in range(height))
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+            _png_chunk(b"tEXt", b"prompt\x00" + json.dumps(prompt).encode("latin-1")),
+            _png_chunk(b"tEXt", b"workflow\x00" + json.dumps(workflow).encode("latin-1")),
+            _png_chunk(b"IDAT", zlib.compress(raw)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+def safetensors_header(index: int, keys: int) -> bytes:
+    """Header of a LoRA file with kohya-like metadata and `keys` tensors."""
+    tags = {f"tag_{(index + i) % 500}": 100 - i for i in range(30)}
+    metadata = {
+        "ss_output_name": f"lora_{index}",
+        "ss_sd_model_name": "v1-5-pruned-emaonly.safetensors",
+        "ss_base_model_version": "sd_v1",
+        "ss_resolution": "(512, 512)",
+        "ss_clip_skip": "2",
+        "ss_num_train_images": str(100 + index % 900),
+        "ss_tag_frequency": json.dumps({f"{index % 7}_dataset": tags}),
+    }
+    header = {"__metadata__": metadata}
+    offset = 0
+    for i in range(keys):
+        header[f"lora_unet_block_{i}.lora_down.weight"] = {
+            "dtype": "F16",
+            "shape": [4, 4],
+            "data_offsets": [offset, offset + 32],
+        }
+        offset += 32
+    data = json.dumps(header).encode("utf8")
+    return struct.pack("<Q", len(data)) + data + bytes(offset)
+
+
+def make_image_tree(directory: str, count: int, per_folder: int = 1000) -> list:
+    """`count` identical PNGs spread over subfolders, with increasing mtimes."""
+    data = png_with_metadata()
+    files = []
+    now = time.time()
+    for i in range(count):
+        subfolder = os.path.join(directory, f"batch_{i // per_folder:04d}")
+        if i % per_folder == 0:
+            os.makedirs(subfolder, exist_ok=True)
+        filename = os.path.join(subfolder, f"ComfyUI_{i:07d}_.png")
+        with open(filename, "wb") as file:
+            file.write(data)
+        os.utime(filename, (now - count + i, now - count + i))
+        files.append(filename)
+    return files
+
+
+def make_lora_tree(directory: str, count: int, keys: int = 200, per_folder: int = 500) -> list:
+    files = []
+    for i in range(count):
+        subfolder = os.path.join(directory, f"set{i // per_folder}")
+        if i % per_folder == 0:
+            os.makedirs(subfolder, exist_ok=True)
+        filename = os.path.join(subfolder, f"lora_{i}.safetensors")
+        with open(filename, "wb") as file:
+            file.write(safetensors_header(i, keys))
+        files.append(filename)
+    return files
+
+
+def measure(fn, repeat: int = 1, setup=None) -> float:
+    """Best time of `repeat` calls of `fn`, `setup` runs untimed before each call."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PACKAGE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit or None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_results(path: str, benchmark: str, results: list, parameters: dict):
+    with open(path, "w", encoding="utf8") as file:
+        json.dump(
+            {
+                "benchmark": benchmark,
+                "environment": environment(),
+                "parameters": parameters,
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
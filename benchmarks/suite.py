@@ -0,0 +1,233 @@
+"""
+Throughput of the folder walks, scans, metadata caches, pnginfo parsing and listing
+serialization on synthetic trees, without ComfyUI or a GPU:
+
+    python benchmarks/suite.py --images 10000 --loras 10000 --output results.json
+    python benchmarks/suite.py --compare results.json --fail-above 1.25
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+from harness import (
+    import_package,
+    install_stubs,
+    make_image_tree,
+    make_lora_tree,
+    measure,
+    png_with_metadata,
+    write_results,
+)
+
+# base64 payloads decoded by the pnginfo_base64 case
+BASE64_PAYLOADS = 1000
+
+
+def configure(root):
+    # read by the package modules when they are imported
+    os.environ["COMFYUI_EXTRA_API_CACHE_DIR"] = os.path.join(root, "cache")
+    os.environ["COMFYUI_EXTRA_API_LORA_LAZY"] = "0"
+    os.environ["COMFYUI_EXTRA_API_HASH_MODELS"] = "0"
+    os.environ["COMFYUI_EXTRA_API_WATCH"] = "0"
+    os.environ["COMFYUI_EXTRA_API_SHARED_INDEX"] = "0"
+
+
+def listing_serializer():
+    try:
+        from comfyui_extra_api.utils.response_cache import json_body
+    except ImportError:
+        # aiohttp is not installed, same encoding as json_body
+        def json_body(**kwargs):
+            return json.dumps({"code": 200, "message": "success", **kwargs}).encode("utf8")
+
+    return json_body
+
+
+def run_suite(args, root):
+    folder_paths = install_stubs(root)
+    configure(root)
+    import_package()
+    # the import scans the lora folder, it is still empty
+    from comfyui_extra_api.model_utils import cache, lora
+    from comfyui_extra_api.utils import images, output_index
+
+    json_body = listing_serializer()
+    output_dir = folder_paths.get_output_directory()
+    lora_dir = folder_paths.get_folder_paths("loras")[0]
+
+    started = time.perf_counter()
+    image_files = make_image_tree(output_dir, args.images)
+    lora_files = make_lora_tree(lora_dir, args.loras, keys=args.lora_keys)
+    print(
+        f"generated {len(image_files)} images and {len(lora_files)} loras "
+        f"in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+
+    names = [os.path.relpath(f, output_dir) for f in image_files]
+    results = []
+
+    def case(name, items, fn, repeat=args.repeat, setup=None):
+        seconds = measure(fn, repeat, setup)
+        results.append(
+            {
+                "name": name,
+                "items": items,
+                "repeat": repeat,
+                "seconds": round(seconds, 6),
+                "items_per_second": round(items / seconds, 1) if seconds else None,
+            }
+        )
+        rate = items / seconds if seconds else 0
+        print(f"{name:<26} {seconds:>10.4f}s {rate:>14.1f}/s", file=sys.stderr)
+
+    # walks and sorting
+    case("natural_sort_key", len(names), lambda: sorted(names, key=lora.natural_sort_key))
+    case("walk_files", len(image_files), lambda: list(lora.walk_files(output_dir, [".png"])))
+
+    # lora index: cold reads every header, warm validates the cache entries
+    metadata_cache = cache.cache_fn("safetensors-metadata")
+    case("lora_scan_cold", len(lora_files), lora.list_available_networks, setup=metadata_cache.clear)
+    case("lora_scan_warm", len(lora_files), lora.list_available_networks)
+
+    # metadata cache on its own, with a trivial value
+    bench_cache = cache.cache_fn("benchmark")
+
+    def fill_cache():
+        for filename in image_files:
+            cache.cached_data_for_file("benchmark", filename, filename, lambda: {"size": 1})
+
+    case("cache_miss", len(image_files), fill_cache, setup=bench_cache.clear)
+    case("cache_hit", len(image_files), fill_cache)
+
+    # pnginfo: chunk parser, cached per file, and base64 uploads
+    def parse_files():
+        for filename in image_files:
+            with open(filename, "rb") as file:
+                images.extract_stream_metadata(file)
+
+    payload = base64.b64encode(png_with_metadata()).decode("ascii")
+    pnginfo_cache = cache.cache_fn("pnginfo")
+    case("pnginfo_parse", len(image_files), parse_files)
+    case(
+        "pnginfo_cached_cold",
+        len(image_files),
+        lambda: [images.file_img_metadata(f) for f in image_files],
+        setup=pnginfo_cache.clear,
+    )
+    case(
+        "pnginfo_cached_warm",
+        len(image_files),
+        lambda: [images.file_img_metadata(f) for f in image_files],
+    )
+    case(
+        "pnginfo_base64",
+        BASE64_PAYLOADS,
+        lambda: [images.decode_img_metadata(payload) for _ in range(BASE64_PAYLOADS)],
+    )
+
+    # output index: full indexing, rescan without changes, cursor pagination
+    index_files = []
+
+    def new_index():
+        index_files.append(os.path.join(root, f"output-index-{len(index_files)}.sqlite3"))
+        new_index.index = output_index.OutputImageIndex(index_files[-1])
+
+    def paginate():
+        cursor = None
+        while True:
+            page, cursor = new_index.index.query(
+                output_dir, sort="mtime", order="desc", limit=args.page_size, cursor=cursor
+            )
+            if cursor is None:
+                break
+
+    case(
+        "output_index_sync_cold",
+        len(image_files),
+        lambda: new_index.index.sync(output_dir, force=True),
+        setup=new_index,
+    )
+    case(
+        "output_index_sync_warm",
+        len(image_files),
+        lambda: new_index.index.sync(output_dir, force=True),
+    )
+    case("output_index_paginate", len(image_files), paginate)
+
+    # listing serialization
+    def lora_listing():
+        return json_body(result=[lora.create_lora_json(n) for n in lora.available_networks.values()])
+
+    def output_listing():
+        page, cursor = new_index.index.query(output_dir, sort="name", limit=args.page_size)
+        return json_body(images=page, next_cursor=cursor)
+
+    case("lora_listing_json", len(lora.available_networks), lora_listing)
+    case("output_listing_json", min(args.page_size, len(image_files)), output_listing)
+    return results
+
+
+def compare(results, baseline_path, fail_above):
+    """Prints the time ratio of every case to the baseline, returns the regressed cases."""
+    with open(baseline_path, encoding="utf8") as file:
+        baseline = {result["name"]: result for result in json.load(file)["results"]}
+    regressions = []
+    print(f"{'case':<26} {'baseline':>10} {'current':>10} {'ratio':>8}")
+    for result in results:
+        previous = baseline.get(result["name"])
+        if previous is None or not previous["seconds"] or previous["items"] != result["items"]:
+            print(f"{result['name']:<26} {'-':>10} {result['seconds']:>10.4f} {'-':>8}")
+            continue
+        ratio = result["seconds"] / previous["seconds"]
+        flag = " slower" if fail_above and ratio > fail_above else ""
+        print(
+            f"{result['name']:<26} {previous['seconds']:>10.4f} "
+            f"{result['seconds']:>10.4f} {ratio:>8.2f}{flag}"
+        )
+        if flag:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=10000, help="output images to generate")
+    parser.add_argument("--loras", type=int, default=10000, help="LoRA safetensors headers to generate")
+    parser.add_argument("--lora-keys", type=int, default=200, help="tensors per LoRA header")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="where to create the trees (a mount to test)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    parser.add_argument(
+        "--fail-above", type=float, default=None, help="exit with 1 when a case is this many times slower"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as root:
+        results = run_suite(args, root)
+
+    parameters = {
+        "images": args.images,
+        "loras": args.loras,
+        "lora_keys": args.lora_keys,
+        "page_size": args.page_size,
+        "repeat": args.repeat,
+    }
+    if args.output:
+        write_results(args.output, "suite", results, parameters)
+    if args.json:
+        print(json.dumps({"benchmark": "suite", "parameters": parameters, "results": results}, indent=2))
+    if args.compare and compare(results, args.compare, args.fail_above):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
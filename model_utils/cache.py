@@ -1,22 +1,73 @@
+import functools
 import os
 import json
 import threading
+import time
 import diskcache
-import tqdm
+
+from ..utils import config
+from ..utils.metrics import registry
+from .validators import get_validator, validator_name
 
 current_dir = os.path.dirname(os.path.realpath(__file__))
 cache_filename = os.path.join(current_dir, "cache.json")
-cache_dir = os.path.join(current_dir, ".cache")
+# can be moved to a volume shared by several ComfyUI processes
+cache_dir = config.get_str("CACHE_DIR") or os.path.join(current_dir, ".cache")
 caches = {}
 cache_lock = threading.Lock()
+_missing = object()
+
+DEFAULT_SIZE_LIMIT = 2**32  # 4 GB, culling oldest first
+DEFAULT_DISK_MIN_FILE_SIZE = 2**18  # keep up to 256KB in Sqlite
+SUBSECTION_DEFAULTS = {
+    # encoded images, small ones stay in Sqlite
+    "thumbnails": {"SIZE_LIMIT": 2**30, "DISK_MIN_FILE_SIZE": 2**15},
+}
+
+# subsection -> counters, see `cache_stats`
+stats = {}
+stats_lock = threading.Lock()
+migration = {"state": "none", "converted": 0, "total": 0}
+
+
+def _setting(subsection: str, name: str, default: int) -> int:
+    # COMFYUI_EXTRA_API_CACHE_<SUBSECTION>_<NAME> overrides COMFYUI_EXTRA_API_CACHE_<NAME>
+    section_key = "CACHE_" + subsection.upper().replace("-", "_") + "_" + name
+    section_default = SUBSECTION_DEFAULTS.get(subsection, {}).get(name)
+    if section_default is not None:
+        return config.get_int(section_key, section_default)
+    return config.get_int(section_key, config.get_int("CACHE_" + name, default))
+
+
+def cache_settings(subsection: str) -> dict:
+    return {
+        "size_limit": _setting(subsection, "SIZE_LIMIT", DEFAULT_SIZE_LIMIT),
+        "disk_min_file_size": _setting(
+            subsection, "DISK_MIN_FILE_SIZE", DEFAULT_DISK_MIN_FILE_SIZE
+        ),
+    }
 
 
 def make_cache(subsection: str) -> diskcache.Cache:
-    return diskcache.Cache(
-        os.path.join(cache_dir, subsection),
-        size_limit=2**32,  # 4 GB, culling oldest first
-        disk_min_file_size=2**18,  # keep up to 256KB in Sqlite
-    )
+    return diskcache.Cache(os.path.join(cache_dir, subsection), **cache_settings(subsection))
+
+
+def _count(subsection, **counts):
+    with stats_lock:
+        section = stats.setdefault(
+            subsection,
+            {
+                "hits": 0,
+                "misses": 0,
+                "stale": 0,
+                "writes": 0,
+                "evictions": 0,
+                "reads": 0,
+                "read_seconds": 0.0,
+            },
+        )
+        for key, value in counts.items():
+            section[key] += value
 
 
 def convert_old_cached_data():
@@ -27,20 +78,40 @@ def convert_old_cached_data():
         return
     except Exception:
         print("[ERROR] issue occurred while trying to read cache.json")
+        migration["state"] = "failed"
         return
 
-    total_count = sum(len(keyvalues) for keyvalues in data.values())
-
-    with tqdm.tqdm(total=total_count, desc="converting cache") as progress:
-        for subsection, keyvalues in data.items():
-            cache_obj = caches.get(subsection)
-            if cache_obj is None:
-                cache_obj = make_cache(subsection)
-                caches[subsection] = cache_obj
+    migration["total"] = sum(len(keyvalues) for keyvalues in data.values())
+    migration["state"] = "running"
+    started = time.monotonic()
 
+    for subsection, keyvalues in data.items():
+        cache_obj = cache_fn(subsection)
+        # entries written since startup are newer than the old ones
+        with cache_obj.transact():
             for key, value in keyvalues.items():
-                cache_obj[key] = value
-                progress.update(1)
+                cache_obj.add(key, value)
+        migration["converted"] += len(keyvalues)
+
+    migration["state"] = "done"
+    print(
+        f"[extra-api] converted {migration['converted']} entries of {cache_filename} "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+
+
+def start_migration():
+    """Converts the old cache.json in the background, its entries are misses until it is done."""
+    if os.path.exists(cache_dir) or not os.path.isfile(cache_filename):
+        return None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    migration["state"] = "pending"
+    thread = threading.Thread(
+        target=convert_old_cached_data, name="extra-api-cache-migration", daemon=True
+    )
+    thread.start()
+    return thread
 
 
 def cache_fn(subsection):
@@ -57,9 +128,6 @@ def cache_fn(subsection):
     cache_obj = caches.get(subsection)
     if not cache_obj:
         with cache_lock:
-            if not os.path.exists(cache_dir) and os.path.isfile(cache_filename):
-                convert_old_cached_data()
-
             cache_obj = caches.get(subsection)
             if not cache_obj:
                 cache_obj = make_cache(subsection)
@@ -68,7 +136,39 @@ def cache_fn(subsection):
     return cache_obj
 
 
-def cached_data_for_file(subsection, title, filename, func):
+def get_many(subsection, titles) -> dict:
+    """
+    Reads several entries of a subsection in a single transaction, the result
+    can be passed to `cached_data_for_file` as `entry` to skip the per-key lookup.
+    """
+    cache_obj = cache_fn(subsection)
+    started = time.perf_counter()
+    with cache_obj.transact():
+        result = {title: cache_obj.get(title) for title in titles}
+    _count(subsection, reads=len(result), read_seconds=time.perf_counter() - started)
+    return result
+
+
+def set_many(subsection, entries: dict):
+    """
+    Writes several entries of a subsection in a single transaction, usually the
+    `pending` entries collected by `cached_data_for_file` during a scan.
+    """
+    if not entries:
+        return
+    cache_obj = cache_fn(subsection)
+    with cache_obj.transact():
+        count = len(cache_obj)
+        added = sum(1 for title in entries if title not in cache_obj)
+        for title, entry in entries.items():
+            cache_obj[title] = entry
+        evicted = count + added - len(cache_obj)
+    _count(subsection, writes=len(entries), evictions=max(0, evicted))
+
+
+def cached_data_for_file(
+    subsection, title, filename, func, entry=_missing, pending=None, stat=None
+):
     """
     Retrieves or generates data for a specific file, using a caching mechanism.
 
@@ -85,27 +185,107 @@ def cached_data_for_file(subsection, title, filename, func):
     It checks if the data associated with the given `title` is present in the cache and compares the
     modification time of the file with the cached modification time. If the file has been modified,
     the cache is considered invalid and the data is regenerated using the provided `func`.
-    Otherwise, the cached data is returned.
+    Otherwise, the cached data is returned. The comparison is made by the validator of the
+    subsection (see `validators.py`), by default mtime, size and inode.
 
     If the data generation fails, None is returned to indicate the failure. Otherwise, the generated
     or cached data is returned as a dictionary.
+
+    `entry` can be set to an entry prefetched with `get_many`. When `pending` is a dict,
+    new entries are stored in it instead of the cache, to be written with `set_many`.
+    `stat` can be set to an `os.stat` result the caller already has.
     """
 
     existing_cache = cache_fn(subsection)
-    ondisk_mtime = os.path.getmtime(filename)
+    validator = get_validator(subsection)
+    if stat is None:
+        stat = os.stat(filename)
 
-    entry = existing_cache.get(title)
-    if entry:
-        cached_mtime = entry.get("mtime", 0)
-        if ondisk_mtime > cached_mtime:
-            entry = None
+    if entry is _missing:
+        started = time.perf_counter()
+        entry = existing_cache.get(title)
+        _count(subsection, reads=1, read_seconds=time.perf_counter() - started)
+    stale = False
+    if entry and not validator.is_valid(entry, filename, stat):
+        entry = None
+        stale = True
 
     if not entry or "value" not in entry:
+        _count(subsection, **({"stale": 1} if stale else {"misses": 1}))
         value = func()
         if value is None:
             return None
 
-        entry = {"mtime": ondisk_mtime, "value": value}
-        existing_cache[title] = entry
+        entry = {**validator.signature(filename, stat), "value": value}
+        if pending is not None:
+            pending[title] = entry
+        else:
+            count = len(existing_cache)
+            existing_cache[title] = entry
+            # culling is the only way the count does not grow for a new key
+            evicted = count + (0 if stale else 1) - len(existing_cache)
+            _count(subsection, writes=1, evictions=max(0, evicted))
+    else:
+        _count(subsection, hits=1)
+
+    return entry["value"]
+
+
+def store_data_for_file(subsection, title, filename, value, stat=None):
+    """
+    Stores data computed outside of `cached_data_for_file` (e.g. in a process pool) with
+    the signature its validator expects. `stat` should be the one used for the lookup.
+    """
+    existing_cache = cache_fn(subsection)
+    if stat is None:
+        stat = os.stat(filename)
+    count = len(existing_cache)
+    replaced = title in existing_cache
+    existing_cache[title] = {**get_validator(subsection).signature(filename, stat), "value": value}
+    evicted = count + (0 if replaced else 1) - len(existing_cache)
+    _count(subsection, writes=1, evictions=max(0, evicted))
+
+
+def cache_stats() -> dict:
+    """Counters, settings and size of every subsection opened by this process."""
+    with stats_lock:
+        counters = {subsection: dict(section) for subsection, section in stats.items()}
+    result = {}
+    for subsection, cache_obj in list(caches.items()):
+        section = counters.get(subsection, {})
+        lookups = sum(section.get(key, 0) for key in ("hits", "misses", "stale"))
+        reads = section.get("reads", 0)
+        result[subsection] = {
+            **section,
+            "hit_rate": round(section["hits"] / lookups, 4) if lookups else None,
+            "avg_read_ms": round(section["read_seconds"] * 1000 / reads, 3) if reads else None,
+            "entries": len(cache_obj),
+            "volume_bytes": cache_obj.volume(),
+            "validator": validator_name(subsection),
+            **cache_settings(subsection),
+        }
+    return {"directory": cache_dir, "migration": dict(migration), "subsections": result}
+
+
+def _counter_samples(key):
+    with stats_lock:
+        return [({"subsection": subsection}, section[key]) for subsection, section in sorted(stats.items())]
+
+
+for _key, _documentation in (
+    ("hits", "Metadata cache lookups answered by a valid entry."),
+    ("misses", "Metadata cache lookups without entry."),
+    ("stale", "Metadata cache lookups whose entry no longer matched its file."),
+    ("writes", "Entries written to the metadata cache."),
+    ("evictions", "Entries culled to keep the metadata cache under its size limit."),
+    ("reads", "Metadata cache lookups."),
+    ("read_seconds", "Time spent in metadata cache lookups."),
+):
+    registry.snapshot(
+        f"comfyapi_cache_{_key}_total",
+        _documentation,
+        "counter",
+        functools.partial(_counter_samples, _key),
+    )
 
-    return entry["value"]
\ No newline at end of file
+start_migration()
@@ -0,0 +1,153 @@
+import collections
+import concurrent.futures
+import json
+import math
+
+import folder_paths
+
+from .cache import cached_data_for_file, get_many, set_many
+from .lora import SdVersion, scan_workers
+from ..utils.metrics import scan_seconds
+
+# bytes per element of the safetensors dtypes
+DTYPE_SIZES = {
+    "F64": 8,
+    "F32": 4,
+    "F16": 2,
+    "BF16": 2,
+    "F8_E4M3": 1,
+    "F8_E5M2": 1,
+    "I64": 8,
+    "I32": 4,
+    "I16": 2,
+    "I8": 1,
+    "U8": 1,
+    "BOOL": 1,
+}
+
+
+def read_safetensors_header(filename) -> dict:
+    with open(filename, mode="rb") as file:
+        header_len = int.from_bytes(file.read(8), "little")
+        json_start = file.read(2)
+
+        assert header_len > 2 and json_start in (
+            b'{"',
+            b"{'",
+        ), f"{filename} is not a safetensors file"
+        return json.loads(json_start + file.read(header_len - 2))
+
+
+def detect_checkpoint_version(keys) -> SdVersion:
+    """Architecture of a checkpoint from its tensor names, no weight is loaded."""
+    keys = list(keys)
+
+    def has(fragment):
+        return any(fragment in key for key in keys)
+
+    if has("double_blocks.") and has("single_blocks."):
+        return SdVersion.Flux
+    if has("joint_blocks."):
+        return SdVersion.SD3
+    if has("conditioner.embedders.1.") or has("diffusion_model.label_emb."):
+        return SdVersion.SDXL
+    if has("cond_stage_model.model.transformer."):
+        return SdVersion.SD2
+    if has("cond_stage_model.transformer.") or has("diffusion_model.input_blocks."):
+        return SdVersion.SD1
+    return SdVersion.Unknown
+
+
+def read_checkpoint_info(filename) -> dict:
+    header = read_safetensors_header(filename)
+    metadata = {}
+    for k, v in (header.pop("__metadata__", None) or {}).items():
+        metadata[k] = v
+        if isinstance(v, str) and v[0:1] == "{":
+            try:
+                metadata[k] = json.loads(v)
+            except Exception:
+                pass
+
+    parameters = 0
+    size_bytes = 0
+    dtype_parameters = collections.Counter()
+    for tensor in header.values():
+        count = math.prod(tensor.get("shape", ()))
+        dtype = tensor.get("dtype", "unknown")
+        parameters += count
+        size_bytes += count * DTYPE_SIZES.get(dtype, 0)
+        dtype_parameters[dtype] += count
+
+    return {
+        "sd_version": detect_checkpoint_version(header.keys()).name,
+        "dtype": dtype_parameters.most_common(1)[0][0] if dtype_parameters else None,
+        "parameters": parameters,
+        "size_bytes": size_bytes,
+        "tensors": len(header),
+        "metadata": metadata,
+    }
+
+
+def checkpoint_info(name, filename, **kwargs) -> dict:
+    """
+    Cached header information of a checkpoint, stored next to the LoRA metadata in
+    the safetensors-metadata subsection. Other formats are reported as Unknown.
+    Extra keyword arguments are passed to `cached_data_for_file`.
+    """
+    if not filename.lower().endswith((".safetensors", ".sft")):
+        return {
+            "sd_version": SdVersion.Unknown.name,
+            "dtype": None,
+            "parameters": None,
+            "size_bytes": None,
+            "tensors": None,
+            "metadata": {},
+        }
+
+    return cached_data_for_file(
+        "safetensors-metadata",
+        "checkpoint/" + name,
+        filename,
+        lambda: read_checkpoint_info(filename),
+        **kwargs,
+    )
+
+
+def list_checkpoint_infos(names) -> dict:
+    """name -> info for the given checkpoints, cache entries are read and written in a single transaction."""
+    entries = get_many("safetensors-metadata", ["checkpoint/" + name for name in names])
+    pending = {}
+
+    def load(name):
+        filename = folder_paths.get_full_path("checkpoints", name)
+        if filename is None:
+            return name, None
+        try:
+            entry = entries.get("checkpoint/" + name)
+            return name, checkpoint_info(name, filename, entry=entry, pending=pending)
+        except Exception as e:
+            print(e, f"reading checkpoint {filename}")
+            return name, None
+
+    with scan_seconds.time(scan="checkpoint_info", folder="checkpoints"):
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, scan_workers), thread_name_prefix="extra-api-checkpoint-scan"
+        ) as pool:
+            infos = dict(pool.map(load, names))
+    set_many("safetensors-metadata", pending)
+    return infos
+
+
+def matches_filters(info, sd_versions=None, dtypes=None, min_params=None, max_params=None) -> bool:
+    if info is None:
+        return not (sd_versions or dtypes or min_params or max_params)
+    if sd_versions and info["sd_version"].lower() not in sd_versions:
+        return False
+    if dtypes and (info["dtype"] or "").lower() not in dtypes:
+        return False
+    if min_params is not None and (info["parameters"] or 0) < min_params:
+        return False
+    if max_params is not None and (info["parameters"] or 0) > max_params:
+        return False
+    return True
@@ -0,0 +1,200 @@
+import concurrent.futures
+import hashlib
+import mmap
+import os
+import threading
+
+from .cache import cache_fn, cached_data_for_file
+from ..utils import config
+
+CHUNK_SIZE = 2**20
+AUTOV2_LENGTH = 10
+SHORTHASH_LENGTH = 12
+
+hashing_enabled = config.get_bool("HASH_MODELS", False)
+hash_workers = config.get_int("HASH_WORKERS", 1)
+hash_lookup = {}  # full hashes, AutoV2 and short hashes -> {(type, full_path): model}
+hash_keys = {}  # (type, full_path) -> its keys in hash_lookup
+hash_lock = threading.Lock()
+hash_stats = {"pending": 0, "hashed": 0, "cached": 0, "errors": 0}
+_executor = None
+
+
+def _update_from_file(hasher, filename, offset=0, payload_hasher=None, payload_offset=0):
+    """
+    Feeds the file from `offset` to `hasher` and, in the same read, the part after
+    `payload_offset` to `payload_hasher`.
+    """
+    with open(filename, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size <= offset:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for start in range(offset, size, CHUNK_SIZE):
+                    # the slices must be released before the mmap is closed
+                    with view[start : start + CHUNK_SIZE] as chunk:
+                        hasher.update(chunk)
+                        if payload_hasher is not None and start + len(chunk) > payload_offset:
+                            with chunk[max(0, payload_offset - start) :] as payload:
+                                payload_hasher.update(payload)
+            finally:
+                view.release()
+
+
+def safetensors_payload_offset(filename) -> int:
+    with open(filename, "rb") as file:
+        return 8 + int.from_bytes(file.read(8), "little")
+
+
+def calculate_sha256(filename) -> str:
+    hasher = hashlib.sha256()
+    _update_from_file(hasher, filename)
+    return hasher.hexdigest()
+
+
+def addnet_hash_safetensors(filename) -> str:
+    """sha256 of the tensor data of a safetensors file, skipping the header (kohya "sshs_model_hash")."""
+    hasher = hashlib.sha256()
+    _update_from_file(hasher, filename, offset=safetensors_payload_offset(filename))
+    return hasher.hexdigest()
+
+
+def file_hashes(filename: str) -> dict:
+    """
+    sha256 (AutoV2 is its first 10 characters) and addnet hash of a model, cached by
+    path, mtime and size whatever the validator of the cache.
+    """
+    stat = os.stat(filename)
+    size = stat.st_size
+    is_safetensors = filename.lower().endswith(".safetensors")
+    computed = []
+
+    def compute():
+        computed.append(filename)
+        # both hashes come from a single read of the file
+        hasher = hashlib.sha256()
+        addnet_hasher = hashlib.sha256() if is_safetensors else None
+        payload_offset = safetensors_payload_offset(filename) if is_safetensors else 0
+        _update_from_file(hasher, filename, payload_hasher=addnet_hasher, payload_offset=payload_offset)
+        return {
+            "size": size,
+            "sha256": hasher.hexdigest(),
+            "addnet_hash": addnet_hasher.hexdigest() if is_safetensors else None,
+        }
+
+    entry = cache_fn("hashes").get(filename)
+    if entry and entry.get("value", {}).get("size") != size:
+        entry = None
+    value = cached_data_for_file(
+        "hashes", filename, filename, compute, entry=entry, stat=stat
+    )
+    with hash_lock:
+        hash_stats["hashed" if computed else "cached"] += 1
+    return value
+
+
+def register_hashes(model_type: str, name: str, filename: str, hashes: dict):
+    model = {
+        "type": model_type,
+        "name": name,
+        "full_path": filename,
+        "sha256": hashes["sha256"],
+        "autov2": hashes["sha256"][:AUTOV2_LENGTH],
+        "addnet_hash": hashes.get("addnet_hash"),
+    }
+    keys = {hashes["sha256"], model["autov2"], hashes["sha256"][:SHORTHASH_LENGTH]}
+    if model["addnet_hash"]:
+        keys |= {model["addnet_hash"], model["addnet_hash"][:SHORTHASH_LENGTH]}
+    with hash_lock:
+        # the keys of an earlier version of the file
+        _drop_keys((model_type, filename))
+        for key in keys:
+            hash_lookup.setdefault(key, {})[(model_type, filename)] = model
+        hash_keys[(model_type, filename)] = keys
+
+
+def _drop_keys(model_key):
+    for key in hash_keys.pop(model_key, ()):
+        models = hash_lookup.get(key)
+        if models is not None:
+            models.pop(model_key, None)
+            if not models:
+                del hash_lookup[key]
+
+
+def unregister_hashes(model_type: str, filename: str):
+    """Removes a deleted or modified model from the hash lookup."""
+    with hash_lock:
+        _drop_keys((model_type, filename))
+
+
+def lookup(hash_value: str) -> list:
+    with hash_lock:
+        models = list(hash_lookup.get(hash_value.lower(), {}).values())
+    return [model for model in models if os.path.exists(model["full_path"])]
+
+
+def schedule_hash(model_type: str, name: str, filename: str, callback=None):
+    """Hashes a model in the background, at most COMFYUI_EXTRA_API_HASH_WORKERS files at a time."""
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, hash_workers), thread_name_prefix="extra-api-hash"
+        )
+
+    def run():
+        try:
+            hashes = file_hashes(filename)
+            register_hashes(model_type, name, filename, hashes)
+            if callback is not None:
+                callback(hashes)
+        except Exception as e:
+            print(f"[extra-api] failed to hash {filename}: {e}")
+            with hash_lock:
+                hash_stats["errors"] += 1
+        finally:
+            with hash_lock:
+                hash_stats["pending"] -= 1
+
+    with hash_lock:
+        hash_stats["pending"] += 1
+    return _executor.submit(run)
+
+
+def schedule_checkpoints():
+    import folder_paths
+
+    for name in folder_paths.get_filename_list("checkpoints"):
+        filename = folder_paths.get_full_path("checkpoints", name)
+        if filename:
+            schedule_hash("checkpoints", name, filename)
+
+
+def schedule_loras():
+    from .lora import available_networks
+
+    for entry in list(available_networks.values()):
+        entry.schedule_hash()
+
+
+def start_hashing():
+    """
+    Hashes every checkpoint and LoRA in the background once the LoRA index is ready,
+    enabled with COMFYUI_EXTRA_API_HASH_MODELS=1. The first pass reads every model
+    file in full, later starts only hash the files missing from the cache.
+    """
+    if not hashing_enabled:
+        return None
+
+    from .lora import index_ready
+
+    def run():
+        schedule_checkpoints()
+        index_ready.wait()
+        schedule_loras()
+
+    thread = threading.Thread(target=run, name="extra-api-hash-scheduler", daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,16 @@
+import concurrent.futures
 import enum
 import os
-from .cache import cached_data_for_file
+import stat
+import sys
+import threading
+import time
+from .cache import cached_data_for_file, get_many, set_many
+from . import hashes
+from .lora_index import LoraCatalog, extract_tags, lora_catalog
+from .shared_index import shared_index
+from ..utils import config
+from ..utils.metrics import scan_seconds
 import re
 import folder_paths as fp
 
@@ -11,6 +21,17 @@ loaded_bundle_embeddings = {}
 networks_in_memory = {}
 available_network_hash_lookup = {}
 forbidden_network_aliases = {}
+last_scan_stats = {}
+# incremented on every change of available_networks, used to invalidate memoized listings
+registry_version = 0
+scan_workers = config.get_int("LORA_SCAN_WORKERS", 16)
+# serializes the rescans, snapshot loads and watcher updates of the registry
+scan_lock = threading.Lock()
+# guards the hash lookup, also updated by the hashing threads
+hash_lookup_lock = threading.Lock()
+DEFAULT_FORBIDDEN_ALIASES = {"none": 1, "Addams": 1}
+# set when available_networks holds a complete scan, cleared while a rescan is running
+index_ready = threading.Event()
 
 
 def read_metadata_from_safetensors(filename):
@@ -45,6 +66,8 @@ class SdVersion(enum.Enum):
     SD1 = 2
     SD2 = 3
     SDXL = 4
+    SD3 = 5
+    Flux = 6
 
 
 metadata_tags_order = {
@@ -56,68 +79,132 @@ metadata_tags_order = {
 }
 
 
+def load_network_metadata(name, filename, **kwargs):
+    """
+    Returns the safetensors metadata of a network and whether it was served from the cache.
+    Extra keyword arguments are passed to `cached_data_for_file`.
+    """
+    misses = []
+
+    def read_metadata():
+        misses.append(filename)
+        metadata = read_metadata_from_safetensors(filename)
+
+        return metadata
+
+    try:
+        metadata = cached_data_for_file(
+            "safetensors-metadata", "lora/" + name, filename, read_metadata, **kwargs
+        )
+    except Exception as e:
+        print(e, f"reading lora {filename}")
+        return {}, False
+
+    return metadata or {}, not misses
+
+
 class NetworkOnDisk:
-    def __init__(self, name, filename):
+    """
+    Registry record of a LoRA. Only the indexed fields stay in memory, the full
+    metadata (tag frequencies, dataset dirs...) is read back from the
+    safetensors-metadata cache when `metadata` is accessed.
+    """
+
+    __slots__ = ("name", "filename", "alias", "hash", "shorthash", "sd_version", "is_safetensors")
+
+    def __init__(self, name, filename, metadata=None):
         self.name = name
         self.filename = filename
-        self.metadata = {}
         self.is_safetensors = os.path.splitext(filename)[1].lower() == ".safetensors"
 
-        def read_metadata():
-            metadata = read_metadata_from_safetensors(filename)
+        if metadata is None:
+            metadata = self.load_metadata()
 
-            return metadata
+        self.alias = metadata.get("ss_output_name", self.name)
 
-        if self.is_safetensors:
-            try:
-                self.metadata = cached_data_for_file(
-                    "safetensors-metadata", "lora/" + self.name, filename, read_metadata
-                )
-            except Exception as e:
-                print(e, f"reading lora {filename}")
-
-        if self.metadata:
-            m = {}
-            for k, v in sorted(
-                self.metadata.items(), key=lambda x: metadata_tags_order.get(x[0], 999)
-            ):
-                m[k] = v
+        # the full hash is computed in the background by `schedule_hash`
+        self._set_hash(metadata.get("sshs_model_hash") or "")
 
-            self.metadata = m
+        self.sd_version = self.detect_version(metadata)
 
-        self.alias = self.metadata.get("ss_output_name", self.name)
+    @classmethod
+    def from_record(cls, record):
+        """Rebuilds an entry published by `to_record` without reading the file."""
+        entry = cls.__new__(cls)
+        entry.name, entry.filename, entry.alias, hash_value, sd_version = record
+        entry.is_safetensors = os.path.splitext(entry.filename)[1].lower() == ".safetensors"
+        entry._set_hash(hash_value or "")
+        entry.sd_version = SdVersion[sd_version]
+        return entry
 
-        self.hash = None
-        self.shorthash = None
-        # self.set_hash(
-        #     self.metadata.get('sshs_model_hash') or
-        #     hashes.sha256_from_cache(self.filename, "lora/" + self.name, use_addnet_hash=self.is_safetensors) or
-        #     ''
-        # )
+    def to_record(self):
+        return [self.name, self.filename, self.alias, self.hash, self.sd_version.name]
 
-        self.sd_version = self.detect_version()
+    def load_metadata(self):
+        if not self.is_safetensors:
+            return {}
+        metadata, _ = load_network_metadata(self.name, self.filename)
+        return metadata
 
-    def detect_version(self):
-        if str(self.metadata.get("ss_base_model_version", "")).startswith("sdxl_"):
+    @property
+    def metadata(self):
+        metadata = self.load_metadata()
+        return {
+            k: v
+            for k, v in sorted(
+                metadata.items(), key=lambda x: metadata_tags_order.get(x[0], 999)
+            )
+        }
+
+    @property
+    def tags(self):
+        """Every training tag, most frequent first. The catalog only keeps the top ones."""
+        return extract_tags(self.load_metadata())
+
+    def detect_version(self, metadata=None):
+        if metadata is None:
+            metadata = self.load_metadata()
+        if str(metadata.get("ss_base_model_version", "")).startswith("sdxl_"):
             return SdVersion.SDXL
-        elif str(self.metadata.get("ss_v2", "")) == "True":
+        elif str(metadata.get("ss_v2", "")) == "True":
             return SdVersion.SD2
-        elif len(self.metadata):
+        elif len(metadata):
             return SdVersion.SD1
 
         return SdVersion.Unknown
 
-    # def set_hash(self, v):
-    #     self.hash = v
-    #     self.shorthash = self.hash[0:12]
-
-    #     if self.shorthash:
-    #         import networks
-    #         networks.available_network_hash_lookup[self.shorthash] = self
+    def _set_hash(self, v):
+        self.hash = v
+        self.shorthash = self.hash[0:12]
+
+    def set_hash(self, v):
+        """Updates the hash, and the hash lookup when the entry is registered."""
+        with hash_lookup_lock:
+            if available_network_hash_lookup.get(self.shorthash) is self:
+                del available_network_hash_lookup[self.shorthash]
+            self._set_hash(v)
+            if self.shorthash and available_networks.get(self.name) is self:
+                available_network_hash_lookup[self.shorthash] = self
+
+    def read_hash(self):
+        if not self.hash:
+            file_hashes = hashes.file_hashes(self.filename)
+            hashes.register_hashes("loras", self.name, self.filename, file_hashes)
+            self.set_hash(self._hash_from(file_hashes))
+
+    def schedule_hash(self):
+        return hashes.schedule_hash(
+            "loras",
+            self.name,
+            self.filename,
+            lambda file_hashes: self.set_hash(self._hash_from(file_hashes)),
+        )
 
-    # def read_hash(self):
-    #     if not self.hash:
-    #         self.set_hash(hashes.sha256(self.filename, "lora/" + self.name, use_addnet_hash=self.is_safetensors) or '')
+    def _hash_from(self, file_hashes):
+        # same convention as the webui: addnet hash for safetensors, sha256 otherwise
+        if self.is_safetensors:
+            return file_hashes["addnet_hash"] or ""
+        return file_hashes["sha256"]
 
     def get_alias(self):
         if self.alias.lower() in forbidden_network_aliases:
@@ -154,11 +241,66 @@ def walk_files(path, allowed_extensions=None):
 
 
 def list_available_networks():
-    available_networks.clear()
-    available_network_aliases.clear()
-    forbidden_network_aliases.clear()
-    available_network_hash_lookup.clear()
-    forbidden_network_aliases.update({"none": 1, "Addams": 1})
+    """Rescans the lora folders and returns the timings and metadata cache statistics of the scan."""
+    with scan_lock, scan_seconds.time(scan="lora_index", folder="loras"):
+        index_ready.clear()
+        try:
+            return _list_available_networks()
+        finally:
+            index_ready.set()
+
+
+def bump_registry_version():
+    global registry_version
+    registry_version += 1
+
+
+class Registry:
+    """
+    The registry dicts and search catalog. Rescans fill a new one on the side and
+    swap it in once complete, the live one keeps serving the requests meanwhile.
+    """
+
+    __slots__ = ("networks", "aliases", "forbidden_aliases", "hash_lookup", "catalog")
+
+    def __init__(self, networks, aliases, forbidden_aliases, hash_lookup, catalog):
+        self.networks = networks
+        self.aliases = aliases
+        self.forbidden_aliases = forbidden_aliases
+        self.hash_lookup = hash_lookup
+        self.catalog = catalog
+
+    @classmethod
+    def empty(cls):
+        return cls({}, {}, dict(DEFAULT_FORBIDDEN_ALIASES), {}, LoraCatalog())
+
+    @classmethod
+    def live(cls):
+        return cls(
+            available_networks,
+            available_network_aliases,
+            forbidden_network_aliases,
+            available_network_hash_lookup,
+            lora_catalog,
+        )
+
+
+def _swap_registry(registry):
+    """Makes `registry` the live one, called with `scan_lock` held."""
+    global available_networks, available_network_aliases, forbidden_network_aliases
+    global available_network_hash_lookup
+    with hash_lookup_lock:
+        available_networks = registry.networks
+        available_network_aliases = registry.aliases
+        forbidden_network_aliases = registry.forbidden_aliases
+        available_network_hash_lookup = registry.hash_lookup
+    lora_catalog.replace(registry.catalog)
+    bump_registry_version()
+
+
+def _list_available_networks():
+    started = time.perf_counter()
+    registry = Registry.empty()
 
     lora_paths = fp.get_folder_paths("loras")
 
@@ -167,24 +309,192 @@ def list_available_networks():
         candidates += list(
             walk_files(lora_dir, allowed_extensions=[".pt", ".ckpt", ".safetensors"])
         )
-    for filename in candidates:
-        if os.path.isdir(filename):
-            continue
+    walked = time.perf_counter()
 
-        name = os.path.splitext(os.path.basename(filename))[0]
+    names = {
+        filename: os.path.splitext(os.path.basename(filename))[0]
+        for filename in candidates
+    }
+    entries = get_many(
+        "safetensors-metadata",
+        [
+            "lora/" + name
+            for filename, name in names.items()
+            if filename.lower().endswith(".safetensors")
+        ],
+    )
+    prefetched = time.perf_counter()
+
+    stats = {"cache_hits": 0, "cache_misses": 0, "errors": 0}
+    stats_lock = threading.Lock()
+    # entries read from the files, written back in one transaction
+    pending = {}
+
+    def load(filename):
+        # a single stat per file, reused to validate the cache entry
         try:
-            entry = NetworkOnDisk(name, filename)
-        except OSError:  # should catch FileNotFoundError and PermissionError etc.
-            print(f"Failed to load network {name} from {filename}", exc_info=True)
-            continue
+            st = os.stat(filename)
+        except OSError as e:
+            print(f"Failed to load network {names[filename]} from {filename}: {e}")
+            with stats_lock:
+                stats["errors"] += 1
+            return None
+        if stat.S_ISDIR(st.st_mode):
+            return None
+
+        name = names[filename]
+        metadata = None
+        if filename.lower().endswith(".safetensors"):
+            metadata, hit = load_network_metadata(
+                name,
+                filename,
+                entry=entries.get("lora/" + name),
+                pending=pending,
+                stat=st,
+            )
+            with stats_lock:
+                stats["cache_hits" if hit else "cache_misses"] += 1
 
-        available_networks[name] = entry
+        try:
+            return NetworkOnDisk(name, filename, metadata=metadata or {}), metadata
+        except OSError as e:  # should catch FileNotFoundError and PermissionError etc.
+            print(f"Failed to load network {name} from {filename}: {e}")
+            with stats_lock:
+                stats["errors"] += 1
+            return None
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, scan_workers), thread_name_prefix="extra-api-lora-scan"
+    ) as pool:
+        # results come back in walk order, entries are registered as soon as they are ready
+        for loaded in pool.map(load, candidates):
+            if loaded is not None:
+                add_network(*loaded, registry=registry)
+    set_many("safetensors-metadata", pending)
+    _swap_registry(registry)
+
+    finished = time.perf_counter()
+    stats.update(
+        {
+            "count": len(available_networks),
+            "workers": scan_workers,
+            "walk_seconds": round(walked - started, 4),
+            "cache_read_seconds": round(prefetched - walked, 4),
+            "load_seconds": round(finished - prefetched, 4),
+            "total_seconds": round(finished - started, 4),
+        }
+    )
+    last_scan_stats.clear()
+    last_scan_stats.update(stats)
+    return stats
+
+
+def network_name(filename) -> str:
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def register_network(filename):
+    with scan_lock:
+        return _register_network(filename)
+
+
+def _register_network(filename):
+    name = network_name(filename)
+    try:
+        metadata = None
+        if filename.lower().endswith(".safetensors"):
+            metadata, _ = load_network_metadata(name, filename)
+        entry = NetworkOnDisk(name, filename, metadata=metadata or {})
+    except OSError as e:  # should catch FileNotFoundError and PermissionError etc.
+        print(f"Failed to load network {name} from {filename}: {e}")
+        return None
+
+    if hashes.hashing_enabled:
+        entry.schedule_hash()
+    return add_network(entry, metadata)
+
+
+def add_network(entry, metadata=None, tags=None, registry=None):
+    """
+    Adds the entry to `registry`, the live registry by default. `metadata` (or the
+    already extracted `tags`) is only used to index the trigger tags, it is read from
+    the cache when omitted.
+    """
+    live = registry is None
+    if live:
+        registry = Registry.live()
+    name = entry.name
+    if metadata is None and tags is None:
+        metadata = entry.load_metadata()
+    registry.catalog.add(name, entry.alias, entry.sd_version.name, metadata, tags=tags)
+    with hash_lookup_lock:
+        registry.networks[name] = entry
+        if entry.shorthash:
+            registry.hash_lookup[entry.shorthash] = entry
+    if live:
+        bump_registry_version()
+
+    if entry.alias in registry.aliases:
+        registry.forbidden_aliases[entry.alias.lower()] = 1
+
+    registry.aliases[name] = entry
+    registry.aliases[entry.alias] = entry
+    return entry
+
+
+def unregister_network(filename):
+    with scan_lock:
+        _unregister_network(filename)
+
+
+def _unregister_network(filename):
+    # names are the file stems, an entry of another folder with the same stem is kept
+    name = network_name(filename)
+    entry = available_networks.get(name)
+    if entry is None or entry.filename != filename:
+        return
+
+    with hash_lookup_lock:
+        del available_networks[name]
+        if available_network_hash_lookup.get(entry.shorthash) is entry:
+            del available_network_hash_lookup[entry.shorthash]
+    lora_catalog.remove(name)
+    hashes.unregister_hashes("loras", filename)
+    bump_registry_version()
+    for key in (name, entry.alias):
+        if available_network_aliases.get(key) is entry:
+            del available_network_aliases[key]
+
+
+def apply_network_changes(changes):
+    """Applies the deltas reported by `watcher.FolderWatcher` to `available_networks`."""
+    with scan_lock:
+        for filename in changes.removed:
+            _unregister_network(filename)
+
+        for filename in changes.added:
+            root = os.path.dirname(filename)
+            if "/." in root or "\\." in root:
+                continue
+            _register_network(filename)
 
-        if entry.alias in available_network_aliases:
-            forbidden_network_aliases[entry.alias.lower()] = 1
 
-        available_network_aliases[name] = entry
-        available_network_aliases[entry.alias] = entry
+def registry_snapshot() -> list:
+    """The registry as plain records, published to the other processes by the shared index."""
+    return [
+        entry.to_record() + [lora_catalog.tags_of(name)]
+        for name, entry in list(available_networks.items())
+    ]
+
+
+def load_registry_snapshot(records):
+    """Replaces the registry with the records of `registry_snapshot`, no file is read."""
+    registry = Registry.empty()
+    for record in records:
+        add_network(NetworkOnDisk.from_record(record[:5]), tags=record[5], registry=registry)
+    with scan_lock:
+        _swap_registry(registry)
+        index_ready.set()
 
 
 def create_lora_json(obj, include_metadata=False):
@@ -198,4 +508,55 @@ def create_lora_json(obj, include_metadata=False):
     return rt
 
 
-list_available_networks()
+def _dict_size(d) -> int:
+    return sys.getsizeof(d) + sum(sys.getsizeof(k) for k in d)
+
+
+def registry_memory() -> dict:
+    """Approximate size in bytes of the LoRA registries, the records are counted once."""
+    entries = list(available_networks.values())
+    records = sum(
+        sys.getsizeof(e)
+        + sum(sys.getsizeof(getattr(e, slot)) for slot in ("name", "filename", "alias", "hash"))
+        for e in entries
+    )
+    return {
+        "networks": len(entries),
+        "aliases": len(available_network_aliases),
+        "hash_lookup": len(available_network_hash_lookup),
+        "records_bytes": records,
+        "available_networks_bytes": _dict_size(available_networks),
+        "available_network_aliases_bytes": _dict_size(available_network_aliases),
+        "available_network_hash_lookup_bytes": _dict_size(available_network_hash_lookup),
+        "catalog": lora_catalog.memory(),
+    }
+
+
+def index_status() -> str:
+    return "ready" if index_ready.is_set() else "warming"
+
+
+def start_background_indexing():
+    def build_index():
+        try:
+            stats = list_available_networks()
+            print(
+                f"[extra-api] indexed {stats['count']} loras in {stats['total_seconds']}s"
+            )
+        except Exception as e:
+            print(f"[extra-api] failed to index loras: {e}")
+
+    thread = threading.Thread(
+        target=build_index, name="extra-api-lora-index", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+if shared_index.follower:
+    # the registry is loaded from the snapshots published by the owner process
+    pass
+elif config.get_bool("LORA_LAZY", True):
+    start_background_indexing()
+else:
+    list_available_networks()
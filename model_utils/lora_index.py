@@ -0,0 +1,321 @@
+import collections
+import difflib
+import re
+import sys
+import threading
+
+TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+# most frequent training tags kept in memory per network, the others stay in the metadata cache
+TRIGGER_WORDS = 10
+FUZZY_CUTOFF = 0.6
+FUZZY_MATCHES = 100
+# terms sharing the most trigrams with a fuzzy query, the only ones compared with difflib
+FUZZY_CANDIDATES = 500
+
+
+def extract_tags(metadata: dict) -> list:
+    """Tags of the `ss_tag_frequency` training metadata, most frequent first."""
+    counts = collections.Counter()
+    frequency = metadata.get("ss_tag_frequency") if metadata else None
+    if isinstance(frequency, dict):
+        for dataset_tags in frequency.values():
+            if not isinstance(dataset_tags, dict):
+                continue
+            for tag, count in dataset_tags.items():
+                tag = str(tag).strip().lower()
+                if tag:
+                    counts[tag] += count if isinstance(count, int) else 1
+    return [tag for tag, _ in counts.most_common()]
+
+
+def terms_of(*values) -> set:
+    terms = set()
+    for value in values:
+        value = value.lower()
+        terms.add(value)
+        terms.update(token for token in TOKEN_SPLIT.split(value) if len(token) > 1)
+    return terms
+
+
+class Trie:
+    """Prefix tree mapping terms to the set of keys indexed under them."""
+
+    __slots__ = ("root",)
+
+    def __init__(self):
+        self.root = ({}, set())
+
+    def insert(self, term: str, key):
+        node = self.root
+        for ch in term:
+            node = node[0].setdefault(ch, ({}, set()))
+        node[1].add(key)
+
+    def remove(self, term: str, key):
+        path = [self.root]
+        for ch in term:
+            node = path[-1][0].get(ch)
+            if node is None:
+                return
+            path.append(node)
+        path[-1][1].discard(key)
+        # prune the branches left empty
+        for i in range(len(term), 0, -1):
+            node = path[i]
+            if node[0] or node[1]:
+                break
+            del path[i - 1][0][term[i - 1]]
+
+    def search(self, prefix: str) -> set:
+        node = self.root
+        for ch in prefix:
+            node = node[0].get(ch)
+            if node is None:
+                return set()
+        keys = set()
+        stack = [node]
+        while stack:
+            children, node_keys = stack.pop()
+            keys |= node_keys
+            stack.extend(children.values())
+        return keys
+
+    def memory(self) -> tuple:
+        """(nodes, approximate bytes) of the tree."""
+        nodes = 0
+        size = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            size += sys.getsizeof(node) + sys.getsizeof(node[0]) + sys.getsizeof(node[1])
+            stack.extend(node[0].values())
+        return nodes, size
+
+
+def trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Terms by trigram, bounds the candidates of a fuzzy match to the similar terms."""
+
+    __slots__ = ("grams",)
+
+    def __init__(self):
+        self.grams = {}
+
+    def add(self, term: str):
+        for gram in trigrams(term):
+            self.grams.setdefault(gram, set()).add(term)
+
+    def remove(self, term: str):
+        for gram in trigrams(term):
+            terms = self.grams.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self.grams[gram]
+
+    def close_matches(self, query: str, candidates: int = FUZZY_CANDIDATES) -> list:
+        """(term, ratio) of the terms close to `query`, best first."""
+        shared = collections.Counter()
+        for gram in trigrams(query):
+            shared.update(self.grams.get(gram, ()))
+        matches = []
+        matcher = difflib.SequenceMatcher(b=query)
+        for term, _ in shared.most_common(candidates):
+            matcher.set_seq1(term)
+            ratio = matcher.ratio()
+            if ratio >= FUZZY_CUTOFF:
+                matches.append((term, ratio))
+        matches.sort(key=lambda match: -match[1])
+        return matches[:FUZZY_MATCHES]
+
+    def memory(self) -> int:
+        return sys.getsizeof(self.grams) + sum(
+            sys.getsizeof(gram) + sys.getsizeof(terms) for gram, terms in self.grams.items()
+        )
+
+
+class LoraCatalog:
+    """
+    Search index over the LoRA registry: a trie of names/aliases, a trie and an
+    inverted index of the TRIGGER_WORDS most frequent training tags of every
+    network, and trigram indexes of both for the fuzzy matching. Updated entry by
+    entry when `available_networks` changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.names = Trie()
+        self.tag_trie = Trie()
+        self.terms = {}  # term -> names
+        self.tags = {}  # tag -> names
+        self.term_grams = TrigramIndex()
+        self.tag_grams = TrigramIndex()
+        self.entries = {}  # name -> (terms, tags, sd_version)
+
+    def clear(self):
+        with self.lock:
+            self.names = Trie()
+            self.tag_trie = Trie()
+            self.term_grams = TrigramIndex()
+            self.tag_grams = TrigramIndex()
+            self.terms.clear()
+            self.tags.clear()
+            self.entries.clear()
+
+    def replace(self, other: "LoraCatalog"):
+        """Takes over the index of `other`, built on the side by a rescan."""
+        with self.lock, other.lock:
+            self.names = other.names
+            self.tag_trie = other.tag_trie
+            self.terms = other.terms
+            self.tags = other.tags
+            self.term_grams = other.term_grams
+            self.tag_grams = other.tag_grams
+            self.entries = other.entries
+
+    def add(self, name: str, alias: str, sd_version: str, metadata: dict = None, tags=None):
+        """Indexes a network, `tags` can be given instead of the metadata they are extracted from."""
+        terms = terms_of(name, alias)
+        if tags is None:
+            tags = extract_tags(metadata)
+        # the same tags come back for many networks, a single copy is kept
+        tags = tuple(sys.intern(tag) for tag in tags[:TRIGGER_WORDS])
+        with self.lock:
+            self.remove(name)
+            for term in terms:
+                self.names.insert(term, name)
+                self._insert(self.terms, self.term_grams, term, name)
+            for tag in tags:
+                self.tag_trie.insert(tag, name)
+                self._insert(self.tags, self.tag_grams, tag, name)
+            self.entries[name] = (frozenset(terms), tags, sd_version)
+
+    def remove(self, name: str):
+        with self.lock:
+            entry = self.entries.pop(name, None)
+            if entry is None:
+                return
+            terms, tags, _ = entry
+            for term in terms:
+                self.names.remove(term, name)
+                self._discard(self.terms, self.term_grams, term, name)
+            for tag in tags:
+                self.tag_trie.remove(tag, name)
+                self._discard(self.tags, self.tag_grams, tag, name)
+
+    @staticmethod
+    def _insert(index, grams, key, name):
+        names = index.get(key)
+        if names is None:
+            names = index[key] = set()
+            grams.add(key)
+        names.add(name)
+
+    @staticmethod
+    def _discard(index, grams, key, name):
+        names = index.get(key)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del index[key]
+                grams.remove(key)
+
+    def memory(self) -> dict:
+        with self.lock:
+            name_nodes, name_bytes = self.names.memory()
+            tag_nodes, tag_bytes = self.tag_trie.memory()
+            index_bytes = sum(
+                sys.getsizeof(key) + sys.getsizeof(names)
+                for index in (self.terms, self.tags)
+                for key, names in index.items()
+            )
+            entries_bytes = sum(
+                sys.getsizeof(terms) + sys.getsizeof(tags) + sum(map(sys.getsizeof, tags))
+                for terms, tags, _ in self.entries.values()
+            )
+            grams_bytes = self.term_grams.memory() + self.tag_grams.memory()
+            return {
+                "entries": len(self.entries),
+                "terms": len(self.terms),
+                "tags": len(self.tags),
+                "trie_nodes": name_nodes + tag_nodes,
+                "bytes": name_bytes + tag_bytes + index_bytes + entries_bytes + grams_bytes,
+            }
+
+    def trigger_words(self, name: str, count: int = TRIGGER_WORDS) -> list:
+        entry = self.entries.get(name)
+        return list(entry[1][:count]) if entry else []
+
+    def tags_of(self, name: str) -> list:
+        entry = self.entries.get(name)
+        return list(entry[1]) if entry else []
+
+    def _match_names(self, query: str, mode: str) -> dict:
+        scores = {}
+        tokens = [t for t in TOKEN_SPLIT.split(query) if t]
+        for name in self.names.search(query):
+            scores[name] = 2.0 if name.lower() == query else 1.5
+        if len(tokens) > 1:
+            matches = set.intersection(*(self.names.search(t) for t in tokens))
+            for name in matches:
+                scores.setdefault(name, 1.0)
+        if mode == "fuzzy":
+            for term, ratio in self.term_grams.close_matches(query):
+                for name in self.terms.get(term, ()):
+                    scores[name] = max(scores.get(name, 0.0), ratio)
+        return scores
+
+    def _match_tags(self, query: str, mode: str) -> dict:
+        scores = {name: 1.0 for name in self.tag_trie.search(query)}
+        if mode == "fuzzy":
+            for tag, ratio in self.tag_grams.close_matches(query):
+                for name in self.tags.get(tag, ()):
+                    scores[name] = max(scores.get(name, 0.0), ratio)
+        return scores
+
+    def search(self, query=None, mode="prefix", fields="names", tags=None, sd_versions=None) -> list:
+        """
+        Names of the matching networks, best matches first.
+
+        `query` is matched as a prefix of names, aliases and their words (and/or tags,
+        see `fields`), `mode="fuzzy"` also accepts close spellings. `tags` must all be
+        trigger tags of the network, `sd_versions` restricts the architecture.
+        """
+        if mode not in ("prefix", "fuzzy"):
+            raise ValueError(f"invalid mode: {mode}")
+        if fields not in ("names", "tags", "all"):
+            raise ValueError(f"invalid fields: {fields}")
+
+        with self.lock:
+            if query:
+                query = query.strip().lower()
+                scores = {}
+                if fields in ("names", "all"):
+                    scores.update(self._match_names(query, mode))
+                if fields in ("tags", "all"):
+                    for name, score in self._match_tags(query, mode).items():
+                        scores[name] = max(scores.get(name, 0.0), score)
+            else:
+                scores = dict.fromkeys(self.entries, 0.0)
+
+            if tags:
+                for tag in tags:
+                    allowed = self.tags.get(tag.strip().lower(), set())
+                    scores = {n: s for n, s in scores.items() if n in allowed}
+            if sd_versions:
+                wanted = {v.lower() for v in sd_versions}
+                scores = {
+                    n: s
+                    for n, s in scores.items()
+                    if self.entries[n][2].lower() in wanted
+                }
+
+        return [name for name, _ in sorted(scores.items(), key=lambda x: (-x[1], x[0].lower()))]
+
+
+lora_catalog = LoraCatalog()
@@ -1,14 +1,88 @@
+import bisect
+import os
+import time
+
 import folder_paths
 
+from . import hashes
+from .shared_index import SHARED_FOLDERS, shared_index
+from .watcher import folder_watcher
+from ..utils.metrics import scan_seconds
+
 
 def refresh_folder(folder_name: str) -> list:
     if not folder_name:
         raise ValueError("folder_name is required")
-    
+
     if folder_name not in folder_paths.folder_names_and_paths:
         raise ValueError("invalid folder_name or folder_name not initialized")
-    
-    result = folder_paths.get_filename_list_(folder_name)
+
+    # another process scans the folder, only its last snapshot needs to be loaded
+    if shared_index.follower and folder_name in SHARED_FOLDERS:
+        shared_index.load_changed()
+        if folder_name in folder_paths.filename_list_cache:
+            return folder_paths.filename_list_cache[folder_name][0]
+
+    # the watcher keeps the cached list up to date, only pending changes need to be applied
+    if (
+        folder_watcher.active
+        and folder_name in folder_watcher.watched_folders
+        and folder_name in folder_paths.filename_list_cache
+    ):
+        folder_watcher.flush()
+        return folder_paths.filename_list_cache[folder_name][0]
+
+    with scan_seconds.time(scan="refresh", folder=folder_name):
+        result = folder_paths.get_filename_list_(folder_name)
     folder_paths.filename_list_cache[folder_name] = result
 
-    return result[0]
\ No newline at end of file
+    return result[0]
+
+
+def apply_filename_changes(folder_name: str, base_path: str, changes):
+    """
+    Applies watcher deltas of one of the folder's base paths to `folder_paths.filename_list_cache`,
+    keeping the entry valid for ComfyUI's own mtime check.
+    """
+    # modified files are reported as removed and added again
+    for path in changes.removed:
+        hashes.unregister_hashes(folder_name, path)
+    if folder_name == "checkpoints" and hashes.hashing_enabled:
+        for path in changes.added:
+            hashes.schedule_hash(folder_name, os.path.relpath(path, base_path), path)
+
+    entry = folder_paths.filename_list_cache.get(folder_name)
+    if entry is None:
+        return
+
+    files = list(entry[0])
+    folders = dict(entry[1])
+    other_paths = [
+        p for p in folder_paths.folder_names_and_paths[folder_name][0] if p != base_path
+    ]
+
+    for path in changes.removed:
+        rel = os.path.relpath(path, base_path)
+        # still provided by another base path
+        if any(os.path.isfile(os.path.join(p, rel)) for p in other_paths):
+            continue
+        i = bisect.bisect_left(files, rel)
+        if i < len(files) and files[i] == rel:
+            del files[i]
+
+    for path in changes.added:
+        rel = os.path.relpath(path, base_path)
+        i = bisect.bisect_left(files, rel)
+        if i == len(files) or files[i] != rel:
+            files.insert(i, rel)
+
+    for path in changes.removed_dirs:
+        folders.pop(path, None)
+    folders.update(changes.dirs)
+
+    folder_paths.filename_list_cache[folder_name] = (
+        files,
+        folders,
+        time.perf_counter(),
+        *entry[3:],
+    )
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import cache_dir
+from ..utils import config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SHARED_FOLDERS = ("checkpoints", "loras")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    kind TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+
+class SharedIndex:
+    """
+    Listings shared by the ComfyUI processes of a host. The process holding the lock
+    file owns the scans and publishes versioned snapshots (filename lists of the model
+    folders, LoRA registry, output totals) to a SQLite file, the other processes
+    load a snapshot only when its version changed instead of rescanning.
+    """
+
+    def __init__(self, filename: str, enabled: bool = False, interval: float = 5.0):
+        self.filename = filename
+        self.enabled = enabled
+        self.interval = interval
+        self.lock = threading.RLock()
+        self.versions = {}  # kind -> version published or loaded by this process
+        self.published = {}  # kind -> source version of the last publication
+        self._owner = None
+        self._lock_file = None
+        self._conn = None
+        self._thread = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            conn = sqlite3.connect(self.filename, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _try_lock(self) -> bool:
+        if fcntl is None:
+            # no inter-process lock, every process scans on its own
+            return True
+        if self._lock_file is None:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            self._lock_file = open(self.filename + ".lock", "a+")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    @property
+    def owner(self) -> bool:
+        if not self.enabled:
+            return True
+        with self.lock:
+            if self._owner is None:
+                self._owner = self._try_lock()
+            return self._owner
+
+    @property
+    def follower(self) -> bool:
+        return not self.owner
+
+    def publish(self, kind: str, data) -> int:
+        """Stores a snapshot, the version is only incremented when the content changed."""
+        body = json.dumps(data, separators=(",", ":")).encode("utf8")
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        with self.lock, self.conn as conn:
+            row = conn.execute(
+                "SELECT version, digest FROM snapshots WHERE kind = ?", (kind,)
+            ).fetchone()
+            if row is not None and row[1] == digest:
+                version = row[0]
+            else:
+                version = (row[0] if row else 0) + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshots (kind, version, digest, owner_pid, updated, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, version, digest, os.getpid(), time.time(), body),
+                )
+            self.versions[kind] = version
+        return version
+
+    def changed(self) -> dict:
+        """kind -> version of the snapshots newer than the ones loaded by this process."""
+        rows = self.conn.execute("SELECT kind, version FROM snapshots").fetchall()
+        return {kind: version for kind, version in rows if self.versions.get(kind) != version}
+
+    def read(self, kind: str):
+        row = self.conn.execute(
+            "SELECT version, data FROM snapshots WHERE kind = ?", (kind,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1])
+
+    def status(self) -> dict:
+        rows = self.conn.execute(
+            "SELECT kind, version, owner_pid, updated FROM snapshots"
+        ).fetchall() if self.enabled else []
+        return {
+            "enabled": self.enabled,
+            "owner": self.owner,
+            "path": self.filename,
+            "snapshots": {
+                kind: {
+                    "version": version,
+                    "loaded_version": self.versions.get(kind),
+                    "owner_pid": owner_pid,
+                    "updated": updated,
+                }
+                for kind, version, owner_pid, updated in rows
+            },
+        }
+
+    def publish_all(self):
+        """Owner side: publishes the listings that changed since the last pass."""
+        import folder_paths
+        from . import lora
+        from ..utils.output_index import output_index
+
+        for folder_name in SHARED_FOLDERS:
+            if folder_name not in folder_paths.folder_names_and_paths:
+                continue
+            # revalidates the cached list against the folder mtimes
+            folder_paths.get_filename_list(folder_name)
+            files, folders = folder_paths.filename_list_cache[folder_name][:2]
+            self.publish("files/" + folder_name, {"files": files, "folders": folders})
+
+        # a warming registry is partial, it is published once the scan completed
+        if lora.index_ready.is_set() and self.published.get("loras") != lora.registry_version:
+            self.publish("loras", lora.registry_snapshot())
+            self.published["loras"] = lora.registry_version
+
+        totals = {}
+        for folder in (folder_paths.get_output_directory(), folder_paths.get_temp_directory()):
+            output_index.sync(folder)
+            totals[os.path.abspath(folder)] = output_index.totals(folder)
+        self.publish("output", totals)
+
+    def load_changed(self):
+        """Follower side: loads the snapshots published since the last pass."""
+        import folder_paths
+        from . import lora
+
+        for kind in self.changed():
+            version, data = self.read(kind)
+            if kind.startswith("files/"):
+                folder_name = kind[len("files/") :]
+                folder_paths.filename_list_cache[folder_name] = (
+                    data["files"],
+                    data["folders"],
+                    time.perf_counter(),
+                )
+            elif kind == "loras":
+                lora.load_registry_snapshot(data)
+            # output: the rows live in the shared output index, only the version is tracked
+            self.versions[kind] = version
+
+    def refresh(self):
+        """Runs a pass immediately, called by the refresh endpoints."""
+        if not self.enabled:
+            return
+        if self.owner:
+            self.publish_all()
+        else:
+            self.load_changed()
+
+    def _take_over(self):
+        """The owner exited, this process now scans and publishes."""
+        import folder_paths
+        from . import lora
+        from .watcher import start_watchers
+        from ..utils.output_index import output_index
+
+        print(f"[extra-api] process {os.getpid()} now owns the shared index")
+        # the output rows are no longer written by another process
+        for folder in (folder_paths.get_output_directory(), folder_paths.get_temp_directory()):
+            output_index.external.discard(os.path.abspath(folder))
+        # the previous owner applied the filesystem changes for every process
+        start_watchers()
+        lora.start_background_indexing()
+
+    def start(self):
+        """Publishes (owner) or follows (other processes) the snapshots every COMFYUI_EXTRA_API_SHARED_INDEX_INTERVAL seconds."""
+        if not self.enabled or self._thread is not None:
+            return None
+
+        import folder_paths
+        from ..utils.output_index import output_index
+
+        if self.follower:
+            for folder in (folder_paths.get_output_directory(), folder_paths.get_temp_directory()):
+                output_index.external.add(os.path.abspath(folder))
+
+        def run():
+            while True:
+                try:
+                    if not self.owner and self._try_lock():
+                        with self.lock:
+                            self._owner = True
+                        self._take_over()
+                    self.refresh()
+                except Exception as e:
+                    print(f"[extra-api] shared index pass failed: {e}")
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=run, name="extra-api-shared-index", daemon=True)
+        self._thread.start()
+        print(
+            f"[extra-api] shared index {self.filename} "
+            f"({'owner' if self.owner else 'follower'}, every {self.interval}s)"
+        )
+        return self._thread
+
+
+shared_index = SharedIndex(
+    config.get_str("SHARED_INDEX_PATH") or os.path.join(cache_dir, "shared-index.sqlite3"),
+    enabled=config.get_bool("SHARED_INDEX", False),
+    interval=config.get_float("SHARED_INDEX_INTERVAL", 5.0),
+)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+from ..utils import config
+
+FINGERPRINT_KB = config.get_int("CACHE_FINGERPRINT_KB", 64)
+
+
+class Validator:
+    """
+    Decides whether a cache entry still describes its file. `signature` is stored
+    in new entries next to the value, `is_valid` compares an entry to the file.
+    Both receive the result of the single `os.stat` made per lookup.
+    """
+
+    def signature(self, filename: str, st: os.stat_result) -> dict:
+        return {"mtime": st.st_mtime}
+
+    def is_valid(self, entry: dict, filename: str, st: os.stat_result) -> bool:
+        raise NotImplementedError
+
+
+class MtimeValidator(Validator):
+    """Entries are valid until the file gets newer than when it was cached."""
+
+    def is_valid(self, entry, filename, st):
+        return st.st_mtime <= entry.get("mtime", 0)
+
+
+class StatValidator(Validator):
+    """
+    Entries are valid while mtime, size and inode are unchanged, so a file replaced
+    by an older copy is detected. Keys missing from older entries are not compared,
+    inodes are ignored on filesystems reporting 0.
+    """
+
+    def signature(self, filename, st):
+        signature = {"mtime": st.st_mtime, "size": st.st_size}
+        if st.st_ino:
+            signature["inode"] = st.st_ino
+        return signature
+
+    def is_valid(self, entry, filename, st):
+        return all(
+            entry.get(key, value) == value
+            for key, value in StatValidator.signature(self, filename, st).items()
+        )
+
+
+def fingerprint(filename: str, size: int, length: int) -> str:
+    """blake2b of the first and last `length` bytes of a file."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as file:
+        hasher.update(file.read(length))
+        if size > 2 * length:
+            file.seek(size - length)
+            hasher.update(file.read(length))
+        elif size > length:
+            hasher.update(file.read())
+    return hasher.hexdigest()
+
+
+class FingerprintValidator(StatValidator):
+    """
+    Stat check plus a hash of the first and last COMFYUI_EXTRA_API_CACHE_FINGERPRINT_KB
+    KB, for mounts where mtimes are coarse or preserved on copy. The file is only
+    read when the stat check passes.
+    """
+
+    def __init__(self, length: int = FINGERPRINT_KB * 1024):
+        self.length = length
+
+    def signature(self, filename, st):
+        return {
+            **super().signature(filename, st),
+            "fingerprint": fingerprint(filename, st.st_size, self.length),
+        }
+
+    def is_valid(self, entry, filename, st):
+        if not super().is_valid(entry, filename, st):
+            return False
+        return entry.get("fingerprint") == fingerprint(filename, st.st_size, self.length)
+
+
+validators = {
+    "mtime": MtimeValidator(),
+    "stat": StatValidator(),
+    "fingerprint": FingerprintValidator(),
+}
+_selected = {}
+
+
+def register_validator(name: str, validator: Validator):
+    validators[name] = validator
+    _selected.clear()
+
+
+def validator_name(subsection: str) -> str:
+    # COMFYUI_EXTRA_API_CACHE_<SUBSECTION>_VALIDATOR overrides COMFYUI_EXTRA_API_CACHE_VALIDATOR
+    section_key = "CACHE_" + subsection.upper().replace("-", "_") + "_VALIDATOR"
+    return config.get_str(section_key) or config.get_str("CACHE_VALIDATOR", "stat")
+
+
+def get_validator(subsection: str) -> Validator:
+    validator = _selected.get(subsection)
+    if validator is None:
+        name = validator_name(subsection)
+        if name not in validators:
+            raise ValueError(f"unknown cache validator: {name}")
+        validator = _selected[subsection] = validators[name]
+    return validator
@@ -0,0 +1,425 @@
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from ..utils import config
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+NETWORK_FS_TYPES = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smbfs",
+    "smb3",
+    "9p",
+    "ceph",
+    "glusterfs",
+    "lustre",
+    "gpfs",
+}
+IGNORED_DIR_NAMES = {".git"}
+
+Changes = namedtuple("Changes", ["root", "added", "removed", "dirs", "removed_dirs"])
+
+
+def new_changes(root):
+    return Changes(root, [], [], {}, [])
+
+
+def has_changes(changes: Changes) -> bool:
+    return bool(
+        changes.added or changes.removed or changes.dirs or changes.removed_dirs
+    )
+
+
+def filesystem_type(path: str):
+    try:
+        with open("/proc/mounts", "r", encoding="utf8") as file:
+            mounts = [line.split()[1:3] for line in file if line.strip()]
+    except OSError:
+        return None
+
+    path = os.path.realpath(path)
+    best_mount, best_type = "", None
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        prefix = mount_point.rstrip("/") + "/"
+        if (path == mount_point or path.startswith(prefix)) and len(
+            mount_point
+        ) > len(best_mount):
+            best_mount, best_type = mount_point, fs_type
+    return best_type
+
+
+def needs_polling(path: str) -> bool:
+    fs_type = filesystem_type(path) or ""
+    return fs_type in NETWORK_FS_TYPES or fs_type.startswith("fuse")
+
+
+def is_link_cycle(entry: os.DirEntry, directory: str) -> bool:
+    """Whether `entry` links to `directory` or one of its parents, following it would never end."""
+    if not entry.is_symlink():
+        return False
+    target = os.path.realpath(entry.path)
+    current = os.path.realpath(directory)
+    return current == target or current.startswith(target.rstrip(os.sep) + os.sep)
+
+
+class TreeState:
+    """
+    Last known listing of a watched tree. Changes are computed by relisting
+    only the directories that are known to be dirty, so a pass costs
+    O(changed directories) instead of a full walk.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.dirs = {}  # dir path -> (mtime, {file name: mtime}, {subdir names})
+
+    def _list(self, path):
+        mtime = os.stat(path).st_mtime
+        files = {}
+        subdirs = set()
+        for entry in os.scandir(path):
+            try:
+                if entry.is_dir(follow_symlinks=True):
+                    if entry.name not in IGNORED_DIR_NAMES and not is_link_cycle(entry, path):
+                        subdirs.add(entry.name)
+                else:
+                    files[entry.name] = entry.stat().st_mtime
+            except OSError:
+                continue
+        return mtime, files, subdirs
+
+    def _add_tree(self, path, changes):
+        try:
+            mtime, files, subdirs = self._list(path)
+        except OSError:
+            return
+        self.dirs[path] = (mtime, files, subdirs)
+        changes.dirs[path] = mtime
+        changes.added.extend(os.path.join(path, name) for name in files)
+        for name in subdirs:
+            self._add_tree(os.path.join(path, name), changes)
+
+    def _remove_tree(self, path, changes):
+        state = self.dirs.pop(path, None)
+        if state is None:
+            return
+        changes.removed_dirs.append(path)
+        changes.removed.extend(os.path.join(path, name) for name in state[1])
+        for name in state[2]:
+            self._remove_tree(os.path.join(path, name), changes)
+
+    def _rescan(self, path, changes):
+        old = self.dirs.get(path)
+        if old is None:
+            return
+        try:
+            mtime, files, subdirs = self._list(path)
+        except OSError:
+            self._remove_tree(path, changes)
+            return
+
+        self.dirs[path] = (mtime, files, subdirs)
+        changes.dirs[path] = mtime
+        old_files = old[1]
+        for name, file_mtime in files.items():
+            old_mtime = old_files.get(name)
+            if old_mtime == file_mtime:
+                continue
+            if old_mtime is not None:
+                # modified in place, reported as a replacement
+                changes.removed.append(os.path.join(path, name))
+            changes.added.append(os.path.join(path, name))
+        for name in old_files.keys() - files.keys():
+            changes.removed.append(os.path.join(path, name))
+        for name in subdirs - old[2]:
+            self._add_tree(os.path.join(path, name), changes)
+        for name in old[2] - subdirs:
+            self._remove_tree(os.path.join(path, name), changes)
+
+    def build(self):
+        self.dirs.clear()
+        self._add_tree(self.root, new_changes(self.root))
+
+    def rescan(self, paths) -> Changes:
+        changes = new_changes(self.root)
+        if self.root not in self.dirs:
+            self._add_tree(self.root, changes)
+        # parents first, so that removed subtrees are not listed twice
+        for path in sorted(set(paths), key=len):
+            self._rescan(path, changes)
+        return changes
+
+    def poll(self) -> Changes:
+        dirty = []
+        for path, (mtime, _, _) in list(self.dirs.items()):
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    dirty.append(path)
+            except OSError:
+                dirty.append(path)
+        return self.rescan(dirty)
+
+
+class FolderWatcher:
+    """
+    Keeps `TreeState`s of watched folders up to date and forwards the deltas to
+    the registered listeners. Local folders are watched through inotify when
+    `inotify_simple` is installed, network mounts (and everything else) are
+    polled every `poll_interval` seconds.
+    """
+
+    def __init__(self, poll_interval: float = 5.0, backend: str = "auto"):
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.lock = threading.RLock()
+        self.states = {}  # root -> TreeState
+        self.listeners = {}  # root -> [(callback, extensions)]
+        self.polled = set()
+        self.watched_folders = set()
+        self._inotify = None
+        self._wds = {}  # wd -> [(root, dir path)]
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def active(self) -> bool:
+        return bool(self._threads)
+
+    def _use_inotify(self, root) -> bool:
+        if self.backend == "poll" or inotify_simple is None:
+            return False
+        if self.backend == "inotify":
+            return True
+        return not needs_polling(root)
+
+    def watch(self, root: str, callback, extensions=None):
+        """
+        callback(changes) is called with the added/removed files (filtered by `extensions`),
+        the new mtimes of the relisted directories and the removed directories.
+        """
+        if extensions is not None:
+            extensions = {ext.lower() for ext in extensions} or None
+
+        with self.lock:
+            self.listeners.setdefault(root, []).append((callback, extensions))
+            if root in self.states:
+                return
+
+            state = TreeState(root)
+            state.build()
+            self.states[root] = state
+            if self._use_inotify(root):
+                self._add_inotify_watches(root, state.dirs)
+            else:
+                self.polled.add(root)
+
+    def is_watching(self, root: str) -> bool:
+        return self.active and root in self.states
+
+    def _add_inotify_watches(self, root, paths):
+        if self._inotify is None:
+            self._inotify = inotify_simple.INotify()
+        flags = inotify_simple.flags
+        mask = (
+            flags.CREATE
+            | flags.DELETE
+            | flags.CLOSE_WRITE
+            | flags.MOVED_FROM
+            | flags.MOVED_TO
+            | flags.DELETE_SELF
+            | flags.MOVE_SELF
+        )
+        for path in paths:
+            try:
+                wd = self._inotify.add_watch(path, mask)
+            except OSError as e:
+                logging.warning(f"[extra-api] cannot watch {path}: {e}, polling instead")
+                self.polled.add(root)
+                continue
+            targets = self._wds.setdefault(wd, [])
+            if (root, path) not in targets:
+                targets.append((root, path))
+
+    def _remove_inotify_watches(self, root, paths):
+        paths = set(paths)
+        for wd, targets in list(self._wds.items()):
+            targets[:] = [t for t in targets if not (t[0] == root and t[1] in paths)]
+            if not targets:
+                del self._wds[wd]
+                try:
+                    self._inotify.rm_watch(wd)
+                except OSError:
+                    pass
+
+    def _dispatch(self, changes: Changes):
+        if not has_changes(changes):
+            return
+        for callback, extensions in self.listeners.get(changes.root, ()):
+            if extensions is None:
+                filtered = changes
+            else:
+                keep = lambda p: os.path.splitext(p)[1].lower() in extensions
+                filtered = changes._replace(
+                    added=[p for p in changes.added if keep(p)],
+                    removed=[p for p in changes.removed if keep(p)],
+                )
+            try:
+                callback(filtered)
+            except Exception:
+                logging.exception(f"[extra-api] watcher callback failed for {changes.root}")
+
+    def _apply(self, root, dirty_paths=None):
+        state = self.states[root]
+        if dirty_paths is None:
+            changes = state.poll()
+        else:
+            changes = state.rescan(dirty_paths)
+        if self._inotify is not None and root not in self.polled:
+            if changes.removed_dirs:
+                self._remove_inotify_watches(root, changes.removed_dirs)
+            new_dirs = [p for p in changes.dirs if not self._is_inotify_watched(root, p)]
+            if new_dirs:
+                self._add_inotify_watches(root, new_dirs)
+        self._dispatch(changes)
+
+    def _is_inotify_watched(self, root, path) -> bool:
+        return any((root, path) in targets for targets in self._wds.values())
+
+    def _read_inotify(self, timeout_ms):
+        flags = inotify_simple.flags
+        dirty = {}
+        overflow = False
+        for event in self._inotify.read(timeout=timeout_ms, read_delay=100):
+            if event.mask & flags.Q_OVERFLOW:
+                overflow = True
+                continue
+            for root, path in self._wds.get(event.wd, ()):
+                dirty.setdefault(root, set()).add(path)
+        if overflow:
+            # events were dropped, fall back to comparing every directory mtime
+            return {root: None for root in self.states if root not in self.polled}
+        return dirty
+
+    def flush(self):
+        """Synchronously applies every pending change."""
+        with self.lock:
+            if self._inotify is not None:
+                for root, paths in self._read_inotify(0).items():
+                    self._apply(root, paths)
+            for root in list(self.polled):
+                self._apply(root)
+
+    def _inotify_loop(self):
+        while not self._stop.is_set():
+            try:
+                pending = self._read_inotify(1000)
+                if pending:
+                    with self.lock:
+                        for root, paths in pending.items():
+                            self._apply(root, paths)
+            except Exception:
+                logging.exception("[extra-api] inotify watcher error")
+                self._stop.wait(self.poll_interval)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                with self.lock:
+                    for root in list(self.polled):
+                        self._apply(root)
+            except Exception:
+                logging.exception("[extra-api] polling watcher error")
+
+    def start(self):
+        if self.active:
+            return
+        self._stop.clear()
+        targets = [self._poll_loop]
+        if self._inotify is not None:
+            targets.append(self._inotify_loop)
+        for target in targets:
+            thread = threading.Thread(
+                target=target, name="extra-api-watcher", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads.clear()
+
+
+folder_watcher = FolderWatcher(
+    poll_interval=config.get_float("WATCH_POLL_INTERVAL", 5.0),
+    backend=config.get_str("WATCH_BACKEND", "auto"),
+)
+
+
+def start_watchers():
+    """
+    Watches the checkpoints and loras folders and the output/temp directories,
+    enabled with COMFYUI_EXTRA_API_WATCH=1.
+    """
+    if not config.get_bool("WATCH", False):
+        return
+
+    from .shared_index import shared_index
+
+    # the owner of the shared index watches for every process
+    if shared_index.follower:
+        return
+
+    import folder_paths
+    from .refresh import apply_filename_changes
+    from .lora import apply_network_changes
+    from ..utils.output_index import output_index, IMAGE_EXTENSIONS
+
+    for folder_name in ("checkpoints", "loras"):
+        if folder_name not in folder_paths.folder_names_and_paths:
+            continue
+        paths, extensions = folder_paths.folder_names_and_paths[folder_name]
+        for base_path in paths:
+            if not os.path.isdir(base_path):
+                continue
+            folder_watcher.watch(
+                base_path,
+                lambda changes, f=folder_name, b=base_path: apply_filename_changes(
+                    f, b, changes
+                ),
+                extensions=extensions or None,
+            )
+            if folder_name == "loras":
+                folder_watcher.watch(
+                    base_path,
+                    apply_network_changes,
+                    extensions=[".pt", ".ckpt", ".safetensors"],
+                )
+        folder_watcher.watched_folders.add(folder_name)
+
+    for folder in (
+        folder_paths.get_output_directory(),
+        folder_paths.get_temp_directory(),
+    ):
+        os.makedirs(folder, exist_ok=True)
+        # the watcher only reports later changes, the files already there are indexed first
+        output_index.sync(folder, force=True)
+        folder_watcher.watch(
+            folder, output_index.apply_changes, extensions=IMAGE_EXTENSIONS
+        )
+        output_index.watched.add(os.path.abspath(folder))
+
+    folder_watcher.start()
+    print(
+        f"[extra-api] watching {len(folder_watcher.states)} folders "
+        f"({len(folder_watcher.polled)} polled every {folder_watcher.poll_interval}s)"
+    )
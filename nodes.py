@@ -3,10 +3,14 @@ from comfy import samplers
 from PIL import Image, ImageSequence, ImageOps
 from io import BytesIO
 import base64
+import json
 import torch
+import torch.nn.functional as F
 import numpy as np
 import node_helpers
 
+from .utils.decoded_cache import decoded_inputs, input_key
+
 
 def optional_models(folder_name):
     models = folder_paths.get_filename_list(folder_name)
@@ -65,7 +69,13 @@ class SimpleGenImageInterface:
                         "default": "",
                     },
                 ),
-            }
+            },
+            "optional": {
+                # 0 keeps every frame of animated inputs
+                "max_frames": ("INT", {"default": 0, "min": 0, "max": 4096}),
+                # 0 keeps the input resolution
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384}),
+            },
         }
 
     RETURN_TYPES = (
@@ -103,41 +113,95 @@ class SimpleGenImageInterface:
 
     FUNCTION = "execute"
 
+    @classmethod
+    def IS_CHANGED(cls, img2img_base64="", max_frames=0, max_side=0, **kwargs):
+        # the outputs only depend on the inputs, the payload is compared by hash
+        if not img2img_base64:
+            return ""
+        return input_key(img2img_base64, max_frames, max_side)
+
     def base64_to_pil(self, base64_string):
         image = Image.open(BytesIO(base64.b64decode(base64_string)))
         return image
 
-    def extract_image(img: Image.Image):
-        output_images = []
-        output_masks = []
+    def extract_image(self, img: Image.Image, max_frames=0, max_side=0):
+        """
+        Decodes the frames of `img` into a preallocated uint8 buffer, converted once to
+        the float image/mask tensors. `max_frames` caps the number of frames and
+        `max_side` downscales them on load (0 disables both). Frames whose size differs
+        from the first one are skipped.
+        """
+        frame_count = getattr(img, "n_frames", 1)
+        if max_frames:
+            frame_count = min(frame_count, max_frames)
+
+        pixels = None
+        alpha = None
+        source_size = None
+        size = None
+        count = 0
         for i in ImageSequence.Iterator(img):
+            if count == frame_count:
+                break
             i = node_helpers.pillow(ImageOps.exif_transpose, i)
 
+            if source_size is None:
+                source_size = size = i.size
+                if max_side and max(size) > max_side:
+                    scale = max_side / max(size)
+                    size = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+                pixels = np.empty((frame_count, size[1], size[0], 3), dtype=np.uint8)
+            elif i.size != source_size:
+                continue
+
             if i.mode == "I":
                 i = i.point(lambda i: i * (1 / 255))
-            image = i.convert("RGB")
-            image = np.array(image).astype(np.float32) / 255.0
-            image = torch.from_numpy(image)[None,]
-            if "A" in i.getbands():
-                mask = np.array(i.getchannel("A")).astype(np.float32) / 255.0
-                mask = 1.0 - torch.from_numpy(mask)
-            else:
-                mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
-            output_images.append(image)
-            output_masks.append(mask.unsqueeze(0))
-
-        if len(output_images) > 1:
-            output_image = torch.cat(output_images, dim=0)
-            output_mask = torch.cat(output_masks, dim=0)
+            # converted before resizing, Pillow resizes palette and 1-bit frames with NEAREST
+            has_alpha = "A" in i.getbands() or "transparency" in i.info
+            mode = "RGBA" if has_alpha else "RGB"
+            if i.mode != mode:
+                i = i.convert(mode)
+            if size != source_size:
+                i = i.resize(size, Image.LANCZOS)
+            pixels[count] = i if mode == "RGB" else np.asarray(i)[..., :3]
+
+            if has_alpha:
+                if alpha is None:
+                    # frames without alpha are opaque, 255 becomes an empty mask
+                    alpha = np.full((frame_count, size[1], size[0]), 255, dtype=np.uint8)
+                alpha[count] = i.getchannel("A")
+            count += 1
+
+        output_image = torch.from_numpy(pixels[:count]).to(torch.float32).div_(255.0)
+        if alpha is not None:
+            output_mask = torch.from_numpy(alpha[:count]).to(torch.float32)
+            output_mask.div_(255.0).neg_().add_(1.0)
         else:
-            output_image = output_images[0]
-            output_mask = output_masks[0]
+            output_mask = torch.zeros((count, 64, 64), dtype=torch.float32, device="cpu")
 
         return output_image, output_mask
 
     def empty_image(self, width, height):
         return Image.new("RGB", (width, height), color="white")
 
+    def load_image(self, img2img_base64, max_frames=0, max_side=0):
+        """Image and mask tensors of the input, decoded payloads are reused from `decoded_inputs`."""
+        if not img2img_base64:
+            return self.extract_image(self.empty_image(64, 64))
+
+        key = input_key(img2img_base64, max_frames, max_side)
+        cached = decoded_inputs.get(key)
+        if cached is not None:
+            return cached
+
+        img = self.base64_to_pil(img2img_base64)
+        if max_side and img.format == "JPEG":
+            # decodes directly at a reduced scale, the frames are then resized to max_side
+            img.draft("RGB", (max_side, max_side))
+        result = self.extract_image(img, max_frames=max_frames, max_side=max_side)
+        decoded_inputs.put(key, result)
+        return result
+
     def execute(
         self,
         model,
@@ -152,15 +216,13 @@ class SimpleGenImageInterface:
         scheduler,
         denoise,
         img2img_base64,
+        max_frames=0,
+        max_side=0,
     ):
         if not model or model == 'none':
             model = folder_paths.get_filename_list("checkpoints")[0]
 
-        img = self.empty_image(64, 64)
-        if img2img_base64:
-            img = self.base64_to_pil(img2img_base64)
-
-        image, mask = self.extract_image(img)
+        image, mask = self.load_image(img2img_base64, max_frames, max_side)
 
         return (
             model,
@@ -177,3 +239,269 @@ class SimpleGenImageInterface:
             image,
             mask,
         )
+
+
+def parse_list(value, name, item_type=str):
+    """
+    Items of a JSON list input. A plain string (or a JSON scalar) is a single item,
+    an empty input an empty list.
+    """
+    if isinstance(value, str):
+        if not value.strip():
+            return []
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            if item_type is not str:
+                raise ValueError(f"{name} must be a JSON list")
+    if not isinstance(value, list):
+        value = [value]
+    try:
+        return [item_type(item) for item in value]
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a list of {item_type.__name__}")
+
+
+def broadcast(values, batch_size, name, default):
+    """`values` repeated to `batch_size` items, lists of 0 or 1 item are broadcast."""
+    if not values:
+        return [default] * batch_size
+    if len(values) == 1:
+        return values * batch_size
+    if len(values) != batch_size:
+        raise ValueError(f"{name} has {len(values)} items, expected 1 or {batch_size}")
+    return values
+
+
+def distinct(values):
+    """`values` as a single item list when they are all equal."""
+    if all(value == values[0] for value in values[1:]):
+        return values[:1]
+    return values
+
+
+def fit_image(image, mask, width, height, fit):
+    """
+    First frame of `image` and its mask at width x height. "resize" stretches the
+    image, "pad" scales it to fit and centers it, the padding is masked.
+    """
+    image = image[:1].movedim(-1, 1)
+    if mask.shape[1:] != image.shape[2:]:
+        # inputs without alpha have a placeholder mask
+        mask = torch.zeros((1, image.shape[2], image.shape[3]), dtype=torch.float32)
+    mask = mask[:1].unsqueeze(1)
+
+    source_height, source_width = image.shape[2:]
+    if fit == "pad":
+        scale = min(width / source_width, height / source_height)
+        size = (max(1, round(source_height * scale)), max(1, round(source_width * scale)))
+    else:
+        size = (height, width)
+    if size != (source_height, source_width):
+        image = F.interpolate(image, size=size, mode="bilinear", antialias=True, align_corners=False)
+        mask = F.interpolate(mask, size=size, mode="bilinear", antialias=True, align_corners=False)
+
+    top = (height - size[0]) // 2
+    left = (width - size[1]) // 2
+    output_image = torch.zeros((height, width, 3), dtype=torch.float32)
+    output_mask = torch.ones((height, width), dtype=torch.float32)
+    output_image[top : top + size[0], left : left + size[1]] = image[0].movedim(0, -1)
+    output_mask[top : top + size[0], left : left + size[1]] = mask[0, 0]
+    return output_image, output_mask
+
+
+class SimpleGenImageBatchInterface(SimpleGenImageInterface):
+    """
+    Batch variant of SimpleGenImageInterface: prompts, seeds and img2img images are
+    JSON lists, lists with a single item are repeated to the batch size. The images
+    are fitted to width x height and returned as one IMAGE/MASK batch. Prompts and
+    seeds are list outputs, reduced to a single item when every item has the same
+    value, so the sampler runs once on the whole batch.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        checkpoints = optional_models("checkpoints")
+        return {
+            "required": {
+                "model": (checkpoints,),
+                "prompts": (
+                    "STRING",
+                    {
+                        "multiline": True,
+                        "default": "[]",
+                    },
+                ),
+                "negative_prompts": (
+                    "STRING",
+                    {
+                        "multiline": True,
+                        "default": "[]",
+                    },
+                ),
+                "width": ("INT", {"default": 512, "min": 64, "max": 4096}),
+                "height": ("INT", {"default": 512, "min": 64, "max": 4096}),
+                "seeds": (
+                    "STRING",
+                    {
+                        "multiline": False,
+                        "default": "[0]",
+                    },
+                ),
+                "steps": ("INT", {"default": 20, "min": 1, "max": 10000}),
+                "cfg": (
+                    "FLOAT",
+                    {
+                        "default": 8.0,
+                        "min": 0.0,
+                        "max": 100.0,
+                        "step": 0.1,
+                        "round": 0.01,
+                    },
+                ),
+                "sampler_name": (samplers.KSampler.SAMPLERS,),
+                "scheduler": (samplers.KSampler.SCHEDULERS,),
+                "denoise": (
+                    "FLOAT",
+                    {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01},
+                ),
+                "img2img_base64_list": (
+                    "STRING",
+                    {
+                        "multiline": False,
+                        "default": "[]",
+                    },
+                ),
+                "fit": (["resize", "pad"],),
+            },
+            "optional": {
+                # 0 keeps the input resolution before fitting
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384}),
+            },
+        }
+
+    RETURN_TYPES = (
+        "STRING",
+        "STRING",
+        "STRING",
+        "INT",
+        "INT",
+        "INT",
+        "INT",
+        "FLOAT",
+        "STRING",
+        "STRING",
+        "FLOAT",
+        "IMAGE",
+        "MASK",
+        "INT",
+    )
+    RETURN_NAMES = (
+        "model",
+        "prompts",
+        "negative_prompts",
+        "width",
+        "height",
+        "seeds",
+        "steps",
+        "cfg",
+        "sampler_name",
+        "scheduler",
+        "denoise",
+        "image",
+        "mask",
+        "batch_size",
+    )
+    OUTPUT_IS_LIST = (
+        False,
+        True,
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+    )
+
+    @classmethod
+    def IS_CHANGED(cls, img2img_base64_list="", fit="resize", max_side=0, **kwargs):
+        if not img2img_base64_list:
+            return ""
+        return input_key(img2img_base64_list, fit, max_side)
+
+    def load_batch(self, images, batch_size, width, height, fit, max_side=0):
+        """The images fitted to width x height, in a single preallocated batch."""
+        if not images:
+            # txt2img, a blank image at the requested size for every item
+            return (
+                torch.zeros((batch_size, height, width, 3), dtype=torch.float32),
+                torch.zeros((batch_size, height, width), dtype=torch.float32),
+            )
+
+        output_image = torch.empty((batch_size, height, width, 3), dtype=torch.float32)
+        output_mask = torch.empty((batch_size, height, width), dtype=torch.float32)
+        fitted = {}
+        for index, payload in enumerate(images):
+            # repeated payloads are decoded and fitted once
+            if payload not in fitted:
+                image, mask = self.load_image(payload, max_frames=1, max_side=max_side)
+                fitted[payload] = fit_image(image, mask, width, height, fit)
+            output_image[index], output_mask[index] = fitted[payload]
+        return output_image, output_mask
+
+    def execute(
+        self,
+        model,
+        prompts,
+        negative_prompts,
+        width,
+        height,
+        seeds,
+        steps,
+        cfg,
+        sampler_name,
+        scheduler,
+        denoise,
+        img2img_base64_list,
+        fit="resize",
+        max_side=0,
+    ):
+        if not model or model == 'none':
+            model = folder_paths.get_filename_list("checkpoints")[0]
+
+        prompts = parse_list(prompts, "prompts")
+        negative_prompts = parse_list(negative_prompts, "negative_prompts")
+        seeds = parse_list(seeds, "seeds", int)
+        images = parse_list(img2img_base64_list, "img2img_base64_list")
+
+        batch_size = max(len(prompts), len(negative_prompts), len(seeds), len(images), 1)
+        prompts = broadcast(prompts, batch_size, "prompts", "")
+        negative_prompts = broadcast(negative_prompts, batch_size, "negative_prompts", "")
+        seeds = broadcast(seeds, batch_size, "seeds", 0)
+        images = broadcast(images, batch_size, "img2img_base64_list", None) if images else []
+
+        image, mask = self.load_batch(images, batch_size, width, height, fit, max_side)
+
+        # every list item runs the downstream nodes on the whole batch
+        return (
+            model,
+            distinct(prompts),
+            distinct(negative_prompts),
+            width,
+            height,
+            distinct(seeds),
+            steps,
+            cfg,
+            sampler_name,
+            scheduler,
+            denoise,
+            image,
+            mask,
+            batch_size,
+        )
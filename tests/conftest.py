@@ -0,0 +1,60 @@
+"""
+The package modules run against the ComfyUI stubs of the benchmarks, in a temporary
+ComfyUI root shared by the whole session.
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from harness import import_package, install_stubs  # noqa: E402
+
+ROOT = tempfile.mkdtemp(prefix="extra-api-tests-")
+
+# read by the package modules when they are imported
+os.environ["COMFYUI_EXTRA_API_CACHE_DIR"] = os.path.join(ROOT, "cache")
+os.environ["COMFYUI_EXTRA_API_LORA_LAZY"] = "0"
+os.environ["COMFYUI_EXTRA_API_HASH_MODELS"] = "0"
+os.environ["COMFYUI_EXTRA_API_WATCH"] = "0"
+os.environ["COMFYUI_EXTRA_API_WATCH_BACKEND"] = "poll"
+os.environ["COMFYUI_EXTRA_API_SHARED_INDEX"] = "0"
+
+folder_paths = install_stubs(ROOT)
+import_package()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(ROOT, ignore_errors=True)
+
+
+@pytest.fixture
+def comfy_folders():
+    return folder_paths
+
+
+@pytest.fixture
+def api():
+    """Calls the routes of the API on a test server: `api("GET", path, **kwargs)`."""
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    from server import PromptServer
+
+    from comfyui_extra_api import api_server  # noqa: F401, registers the routes
+
+    def call(method, path, **kwargs):
+        async def run():
+            app = web.Application()
+            app.add_routes(PromptServer.instance.routes)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.request(method, path, **kwargs)
+                return response.status, response.headers, await response.read()
+
+        return asyncio.run(run())
+
+    return call
@@ -0,0 +1,71 @@
+import json
+import os
+import struct
+
+from PIL import Image
+
+from comfyui_extra_api.utils.metrics import registry
+
+
+def test_errors_are_sent_with_their_http_status(api):
+    status, _, body = api("GET", "/comfyapi/v1/output-images?limit=abc")
+    assert status == 400
+    assert json.loads(body)["code"] == 400
+
+    status, _, body = api("GET", "/comfyapi/v1/download?filename=../etc/passwd")
+    assert status == 400
+    assert json.loads(body)["code"] == 400
+
+    metrics = registry.render().decode()
+    labels = 'route="/comfyapi/v1/output-images",method="GET",status="400"'
+    assert f"comfyapi_http_requests_total{{{labels}}}" in metrics
+
+
+def write_checkpoint(filename, keys):
+    header = {key: {"dtype": "F16", "shape": [1], "data_offsets": [0, 2]} for key in keys}
+    data = json.dumps(header).encode("utf8")
+    with open(filename, "wb") as file:
+        file.write(struct.pack("<Q", len(data)) + data + bytes(2))
+
+
+def test_checkpoint_info_follows_files_overwritten_in_place(api, comfy_folders):
+    directory = comfy_folders.get_folder_paths("checkpoints")[0]
+    filename = os.path.join(directory, "overwritten.safetensors")
+    write_checkpoint(filename, ["model.double_blocks.0.w", "model.single_blocks.0.w"])
+    comfy_folders.filename_list_cache.clear()
+
+    def architecture():
+        status, _, body = api("GET", "/comfyapi/v1/checkpoints?info=true")
+        assert status == 200
+        checkpoints = {c["name"]: c for c in json.loads(body)["result"]}
+        return checkpoints["overwritten.safetensors"]["sd_version"]
+
+    try:
+        assert architecture() == "Flux"
+        stat = os.stat(filename)
+        write_checkpoint(filename, ["model.joint_blocks.0.w", "model.joint_blocks.1.weight"])
+        # a different size is enough, whatever the mtime resolution of the filesystem
+        assert os.stat(filename).st_size != stat.st_size
+        assert architecture() == "SD3"
+    finally:
+        os.remove(filename)
+        comfy_folders.filename_list_cache.clear()
+
+
+def test_thumbnail_etags_are_compared_exactly(api, comfy_folders):
+    filename = os.path.join(comfy_folders.get_output_directory(), "thumbnail-source.png")
+    Image.new("RGB", (64, 48), "red").save(filename)
+    path = "/comfyapi/v1/thumbnail?filename=thumbnail-source.png&size=32"
+    try:
+        status, headers, _ = api("GET", path)
+        assert status == 200
+        etag = headers["ETag"]
+
+        assert api("GET", path, headers={"If-None-Match": etag})[0] == 304
+        assert api("GET", path, headers={"If-None-Match": f'"other", W/{etag}'})[0] == 304
+        assert api("GET", path, headers={"If-None-Match": "*"})[0] == 304
+        # a tag containing the current one is another tag
+        assert api("GET", path, headers={"If-None-Match": f'"{etag}0"'})[0] == 200
+        assert api("GET", path, headers={"If-None-Match": etag[:-3] + '"'})[0] == 200
+    finally:
+        os.remove(filename)
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import sys
+import types
+
+import pytest
+from server import PromptServer
+
+from comfyui_extra_api.utils import generate
+
+
+class PromptQueue:
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+    def get_current_queue(self):
+        return [], list(self.items)
+
+    def get_history(self, prompt_id=None):
+        return {}
+
+
+@pytest.fixture(autouse=True)
+def checkpoint(comfy_folders):
+    directory = comfy_folders.get_folder_paths("checkpoints")[0]
+    with open(os.path.join(directory, "model.safetensors"), "wb"):
+        pass
+    comfy_folders.filename_list_cache.clear()
+
+
+@pytest.fixture
+def prompt_queue(monkeypatch):
+    queue = PromptQueue()
+    monkeypatch.setattr(PromptServer.instance, "prompt_queue", queue, raising=False)
+    monkeypatch.setattr(PromptServer.instance, "number", 3, raising=False)
+    return queue
+
+
+def install_execution(monkeypatch, validate_prompt, sensitive=True):
+    execution = types.ModuleType("execution")
+    execution.validate_prompt = validate_prompt
+    if sensitive:
+        execution.SENSITIVE_EXTRA_DATA_KEYS = ("auth_token_comfy_org",)
+    monkeypatch.setitem(sys.modules, "execution", execution)
+
+
+def submit(values):
+    async def run():
+        return await generate.GenerationJobs().submit("txt2img", values)
+
+    return asyncio.run(run())
+
+
+def test_valid_prompt_is_queued_in_process(monkeypatch, prompt_queue):
+    validated = []
+
+    async def validate_prompt(prompt_id, prompt, partial_execution_targets):
+        validated.append(prompt_id)
+        return True, None, ["7"], {}
+
+    install_execution(monkeypatch, validate_prompt)
+    job = submit({"model": "model.safetensors", "prompt": "a cat", "seed": 5})
+
+    (item,) = prompt_queue.items
+    number, prompt_id, workflow, extra_data, outputs, sensitive = item
+    assert (number, prompt_id, outputs, sensitive) == (3, job.id, ["7"], {})
+    assert validated == [job.id]
+    assert extra_data["client_id"] == generate.CLIENT_ID
+    assert workflow["2"]["inputs"]["text"] == "a cat"
+    assert workflow["5"]["inputs"]["seed"] == 5
+    assert PromptServer.instance.number == 4
+    assert job.number == 3 and job.status == "queued"
+
+
+def test_older_validate_prompt_signature(monkeypatch, prompt_queue):
+    install_execution(monkeypatch, lambda prompt: (True, None, ["7"], {}), sensitive=False)
+    job = submit({"model": "model.safetensors"})
+
+    (item,) = prompt_queue.items
+    assert len(item) == 5
+    assert item[1] == job.id
+
+
+def test_invalid_prompt_is_rejected(monkeypatch, prompt_queue):
+    node_errors = {"5": {"errors": [{"message": "Value not in list"}]}}
+
+    async def validate_prompt(prompt_id, prompt, partial_execution_targets):
+        error = {"type": "prompt_outputs_failed_validation", "message": "invalid prompt"}
+        return False, error, [], node_errors
+
+    install_execution(monkeypatch, validate_prompt)
+    with pytest.raises(generate.PromptRejected) as rejected:
+        submit({"model": "model.safetensors"})
+
+    assert str(rejected.value) == "invalid prompt"
+    assert rejected.value.node_errors == node_errors
+    assert prompt_queue.items == []
+    assert PromptServer.instance.number == 3
+
+
+@pytest.mark.parametrize("name", ["steps", "cfg"])
+def test_null_numbers_are_rejected(api, name):
+    values = {"model": "model.safetensors", name: None}
+    status, _, body = api("POST", "/comfyapi/v1/generate", json=values)
+    assert status == 400
+    assert f"invalid {name}" in json.loads(body)["message"]
+
+
+def test_null_seed_draws_a_random_seed():
+    params = generate.resolve_parameters({"model": "model.safetensors", "seed": None})
+    assert params["seed"] >= 0
+
+
+def test_image_index_is_validated(api, comfy_folders):
+    output_dir = comfy_folders.get_output_directory()
+    with open(os.path.join(output_dir, "job.png"), "wb") as file:
+        file.write(b"png")
+    job = generate.Job("job-with-images", "txt2img", 0)
+    job.status = "completed"
+    job.images = [{"filename": "job.png", "subfolder": "", "type": "output"}]
+    generate.generation_jobs.add(job)
+
+    path = "/comfyapi/v1/generate/job-with-images/images/"
+    try:
+        assert api("GET", path + "0")[0] == 200
+        assert api("GET", path + "-1")[0] == 404
+        assert api("GET", path + "1")[0] == 404
+        assert api("GET", path + "abc")[0] == 400
+    finally:
+        os.remove(os.path.join(output_dir, "job.png"))
@@ -0,0 +1,52 @@
+import hashlib
+
+import pytest
+from harness import safetensors_header
+
+from comfyui_extra_api.model_utils import hashes
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 2**20])
+def test_single_read_matches_separate_hashes(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(hashes, "CHUNK_SIZE", chunk_size)
+    filename = tmp_path / f"model_{chunk_size}.safetensors"
+    data = safetensors_header(0, 5) + bytes(range(256)) * 3
+    filename.write_bytes(data)
+    payload_offset = 8 + int.from_bytes(data[:8], "little")
+
+    result = hashes.file_hashes(str(filename))
+
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    assert result["addnet_hash"] == hashlib.sha256(data[payload_offset:]).hexdigest()
+    assert result["sha256"] == hashes.calculate_sha256(str(filename))
+    assert result["addnet_hash"] == hashes.addnet_hash_safetensors(str(filename))
+
+
+def register(filename, sha256, addnet=None):
+    hashes.register_hashes("loras", "model", filename, {"sha256": sha256, "addnet_hash": addnet})
+
+
+def test_rehashed_model_leaves_its_old_keys(tmp_path):
+    filename = str(tmp_path / "model.safetensors")
+    (tmp_path / "model.safetensors").write_bytes(b"x")
+    old, new = "a" * 64, "b" * 64
+    register(filename, old, "c" * 64)
+    assert [m["full_path"] for m in hashes.lookup(old[:10])] == [filename]
+
+    register(filename, new)
+    for key in (old, old[:10], old[:12], "c" * 64, "c" * 12):
+        assert key not in hashes.hash_lookup
+    assert [m["sha256"] for m in hashes.lookup(new)] == [new]
+
+    hashes.unregister_hashes("loras", filename)
+    assert new not in hashes.hash_lookup
+    assert ("loras", filename) not in hashes.hash_keys
+
+
+def test_other_models_keep_a_shared_key(tmp_path):
+    first, second = str(tmp_path / "first.pt"), str(tmp_path / "second.pt")
+    register(first, "d" * 64)
+    register(second, "d" * 64)
+    hashes.unregister_hashes("loras", first)
+    assert list(hashes.hash_lookup["d" * 64]) == [("loras", second)]
+    hashes.unregister_hashes("loras", second)
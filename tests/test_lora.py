@@ -0,0 +1,104 @@
+import os
+import sys
+
+import pytest
+from harness import safetensors_header
+
+from comfyui_extra_api.model_utils import hashes, lora, lora_index
+from comfyui_extra_api.model_utils.lora_index import lora_catalog
+from comfyui_extra_api.model_utils.watcher import new_changes
+
+
+@pytest.fixture
+def lora_dir(comfy_folders):
+    directory = comfy_folders.get_folder_paths("loras")[0]
+    yield directory
+    for dirpath, _, files in os.walk(directory):
+        for file in files:
+            os.remove(os.path.join(dirpath, file))
+    lora.list_available_networks()
+
+
+def write_lora(directory, index):
+    filename = os.path.join(directory, f"lora_{index}.safetensors")
+    with open(filename, "wb") as file:
+        file.write(safetensors_header(index, 4))
+    return filename
+
+
+def test_rescan_keeps_serving_the_registry(lora_dir, monkeypatch):
+    for i in range(3):
+        write_lora(lora_dir, i)
+    lora.list_available_networks()
+    write_lora(lora_dir, 3)
+
+    seen = []
+    load_network_metadata = lora.load_network_metadata
+
+    def observe(*args, **kwargs):
+        seen.append((set(lora.available_networks), set(lora_catalog.search())))
+        return load_network_metadata(*args, **kwargs)
+
+    monkeypatch.setattr(lora, "load_network_metadata", observe)
+    stats = lora.list_available_networks()
+
+    old = {"lora_0", "lora_1", "lora_2"}
+    assert seen and all(networks == old and names == old for networks, names in seen)
+    assert stats["count"] == 4
+    assert set(lora.available_networks) == old | {"lora_3"}
+    assert set(lora_catalog.search()) == old | {"lora_3"}
+
+
+def test_removed_network_leaves_the_hash_lookup(lora_dir):
+    filename = write_lora(lora_dir, 0)
+    changes = new_changes(lora_dir)
+    changes.added.append(filename)
+    lora.apply_network_changes(changes)
+
+    entry = lora.available_networks["lora_0"]
+    entry.set_hash("0123456789abcdef")
+    assert lora.available_network_hash_lookup["0123456789ab"] is entry
+
+    changes = new_changes(lora_dir)
+    changes.removed.append(filename)
+    lora.apply_network_changes(changes)
+
+    assert "lora_0" not in lora.available_networks
+    assert "0123456789ab" not in lora.available_network_hash_lookup
+    assert lora_catalog.search("lora_0") == []
+
+
+def test_unregister_keeps_a_network_of_the_same_name(lora_dir):
+    filename = write_lora(lora_dir, 0)
+    lora.register_network(filename)
+    lora.unregister_network(os.path.join(lora_dir, "other", "lora_0.safetensors"))
+    assert lora.available_networks["lora_0"].filename == filename
+
+
+def test_only_the_top_tags_stay_resident(lora_dir):
+    # safetensors_header writes 30 training tags
+    filename = write_lora(lora_dir, 0)
+    lora.register_network(filename)
+    entry = lora.available_networks["lora_0"]
+
+    trigger_words = lora_catalog.trigger_words("lora_0")
+    assert len(trigger_words) == lora_index.TRIGGER_WORDS
+    assert lora_catalog.tags_of("lora_0") == trigger_words
+    assert all(word is sys.intern(word) for word in trigger_words)
+    assert lora_catalog.memory()["tags"] == lora_index.TRIGGER_WORDS
+    # the full list is read back from the metadata
+    assert len(entry.tags) == 30
+    assert entry.tags[: lora_index.TRIGGER_WORDS] == trigger_words
+
+
+def test_removed_network_leaves_the_model_hashes(lora_dir):
+    filename = write_lora(lora_dir, 0)
+    lora.register_network(filename)
+    hashes.register_hashes("loras", "lora_0", filename, hashes.file_hashes(filename))
+    sha256 = hashes.file_hashes(filename)["sha256"]
+    assert hashes.lookup(sha256)
+
+    changes = new_changes(lora_dir)
+    changes.removed.append(filename)
+    lora.apply_network_changes(changes)
+    assert sha256 not in hashes.hash_lookup
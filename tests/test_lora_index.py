@@ -0,0 +1,37 @@
+from comfyui_extra_api.model_utils import lora_index
+from comfyui_extra_api.model_utils.lora_index import LoraCatalog
+
+
+def catalog_of(names):
+    catalog = LoraCatalog()
+    for name in names:
+        catalog.add(name, name, "SD1", tags=[])
+    return catalog
+
+
+def test_fuzzy_search_finds_close_spellings():
+    catalog = catalog_of(["Anime_Style_v2", "watercolor", "pixel_art", "cyberpunk_city"])
+    assert catalog.search("watercolour", mode="fuzzy")[0] == "watercolor"
+    assert catalog.search("animee", mode="fuzzy")[0] == "Anime_Style_v2"
+    assert catalog.search("watercolour") == []
+
+
+def test_fuzzy_search_only_compares_trigram_candidates(monkeypatch):
+    catalog = catalog_of([f"style_{i:05d}" for i in range(2000)] + ["watercolor"])
+    compared = []
+    ratio = lora_index.difflib.SequenceMatcher.ratio
+
+    def counting_ratio(self):
+        compared.append(self.a)
+        return ratio(self)
+
+    monkeypatch.setattr(lora_index.difflib.SequenceMatcher, "ratio", counting_ratio)
+    assert catalog.search("watercolour", mode="fuzzy") == ["watercolor"]
+    assert compared == ["watercolor"]
+
+
+def test_removed_terms_leave_the_trigram_index():
+    catalog = catalog_of(["watercolor"])
+    catalog.remove("watercolor")
+    assert catalog.term_grams.grams == {}
+    assert catalog.search("watercolour", mode="fuzzy") == []
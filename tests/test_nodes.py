@@ -0,0 +1,118 @@
+import base64
+import json
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from comfyui_extra_api.nodes import SimpleGenImageBatchInterface
+
+
+def png_base64(width, height, mode="RGB"):
+    buffer = BytesIO()
+    Image.new(mode, (width, height)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def run_batch(prompts, seeds, images, fit="resize", width=96, height=64):
+    return SimpleGenImageBatchInterface().execute(
+        model="model.safetensors",
+        prompts=json.dumps(prompts),
+        negative_prompts="[]",
+        width=width,
+        height=height,
+        seeds=json.dumps(seeds),
+        steps=20,
+        cfg=7.0,
+        sampler_name="euler",
+        scheduler="normal",
+        denoise=0.6,
+        img2img_base64_list=json.dumps(images),
+        fit=fit,
+    )
+
+
+def outputs(result):
+    return dict(zip(SimpleGenImageBatchInterface.RETURN_NAMES, result))
+
+
+def test_images_are_batched():
+    is_list = dict(
+        zip(SimpleGenImageBatchInterface.RETURN_NAMES, SimpleGenImageBatchInterface.OUTPUT_IS_LIST)
+    )
+    assert len(is_list) == len(SimpleGenImageBatchInterface.RETURN_TYPES)
+    assert {name for name, value in is_list.items() if value} == {
+        "prompts",
+        "negative_prompts",
+        "seeds",
+    }
+
+
+@pytest.mark.parametrize("fit", ["resize", "pad"])
+def test_img2img_batch(fit):
+    result = outputs(run_batch(["a", "b", "c"], [1, 2, 3], [png_base64(40, 40)], fit=fit))
+    assert result["batch_size"] == 3
+    assert result["prompts"] == ["a", "b", "c"]
+    assert result["negative_prompts"] == [""]
+    assert result["seeds"] == [1, 2, 3]
+    assert result["image"].shape == (3, 64, 96, 3)
+    assert result["mask"].shape == (3, 64, 96)
+    if fit == "pad":
+        # the square image is centered, the side bands are masked
+        assert result["mask"][:, :, 0].min() == 1.0
+        assert result["mask"][:, 32, 48].max() == 0.0
+
+
+def test_broadcast_values_are_single_items():
+    images = [png_base64(40, 40), png_base64(30, 60, "RGBA")]
+    result = outputs(run_batch(["a"], [7], images))
+    assert result["batch_size"] == 2
+    assert (result["prompts"], result["negative_prompts"], result["seeds"]) == (["a"], [""], [7])
+    assert result["image"].shape == (2, 64, 96, 3)
+    assert result["mask"].shape == (2, 64, 96)
+
+
+def test_txt2img_batch_is_blank():
+    result = outputs(run_batch(["a", "a"], [5], []))
+    assert result["seeds"] == [5]
+    assert result["prompts"] == ["a"]
+    assert result["image"].shape == (2, 64, 96, 3)
+    assert result["mask"].shape == (2, 64, 96)
+    assert result["image"].abs().sum() == 0
+    assert result["mask"].abs().sum() == 0
+
+
+def test_mismatched_lists_are_rejected():
+    with pytest.raises(ValueError):
+        run_batch(["a", "b", "c"], [1, 2], [])
+
+
+def test_palette_frames_are_resized_smoothly():
+    # a 1 pixel checkerboard only averages to gray with a filtering resize
+    image = Image.new("P", (64, 64))
+    image.putpalette([0, 0, 0, 255, 255, 255])
+    image.putdata([(x + y) % 2 for y in range(64) for x in range(64)])
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    payload = base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    output_image, output_mask = SimpleGenImageBatchInterface().load_image(payload, max_side=16)
+
+    assert output_image.shape == (1, 16, 16, 3)
+    assert 0.3 < output_image.mean() < 0.7
+    assert output_image.std() < 0.1
+
+
+def test_transparent_frames_keep_their_mask():
+    image = Image.new("RGBA", (64, 32), (255, 0, 0, 255))
+    image.paste((0, 0, 0, 0), (0, 0, 32, 32))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    payload = base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    output_image, output_mask = SimpleGenImageBatchInterface().load_image(payload, max_side=32)
+
+    assert output_image.shape == (1, 16, 32, 3)
+    assert output_mask.shape == (1, 16, 32)
+    assert output_mask[0, :, :12].min() == 1.0
+    assert output_mask[0, :, 20:].max() == 0.0
@@ -0,0 +1,75 @@
+import os
+
+from harness import png_with_metadata
+
+from comfyui_extra_api.model_utils import watcher
+from comfyui_extra_api.model_utils.watcher import new_changes
+from comfyui_extra_api.utils.output_index import OutputImageIndex, output_index
+
+
+def write_image(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(png_with_metadata(8, 8))
+
+
+def listed(index, root):
+    images, _ = index.query(root)
+    return sorted(os.path.relpath(image["full_path"], root) for image in images)
+
+
+def test_watched_output_lists_existing_files(comfy_folders, monkeypatch):
+    output_dir = comfy_folders.get_output_directory()
+    existing = [
+        "top.png",
+        os.path.join("a", "one.png"),
+        os.path.join("a", "b", "two.png"),
+        os.path.join("c", "three.webp"),
+    ]
+    for name in existing:
+        write_image(os.path.join(output_dir, name))
+
+    monkeypatch.setenv("COMFYUI_EXTRA_API_WATCH", "1")
+    watcher.start_watchers()
+    try:
+        write_image(os.path.join(output_dir, "a", "b", "new.png"))
+        watcher.folder_watcher.flush()
+        # watched roots are not rescanned, the listing comes from the watcher deltas
+        output_index.sync(output_dir)
+        assert listed(output_index, output_dir) == sorted(
+            existing + [os.path.join("a", "b", "new.png")]
+        )
+    finally:
+        watcher.folder_watcher.stop()
+
+
+def test_changes_of_unsynced_root_are_ignored(tmp_path):
+    root = tmp_path / "output"
+    write_image(str(root / "sub" / "old.png"))
+    write_image(str(root / "new.png"))
+    index = OutputImageIndex(str(tmp_path / "index.sqlite3"))
+
+    changes = new_changes(str(root))
+    changes.added.append(str(root / "new.png"))
+    changes.dirs[str(root)] = os.path.getmtime(root)
+    index.apply_changes(changes)
+
+    index.sync(str(root))
+    assert listed(index, str(root)) == ["new.png", os.path.join("sub", "old.png")]
+
+
+def test_symlink_cycles_are_not_followed(tmp_path):
+    root = tmp_path / "output"
+    write_image(str(root / "a" / "one.png"))
+    os.symlink(str(root), str(root / "a" / "loop"))
+    os.symlink(str(root / "a"), str(root / "a" / "self"))
+    write_image(str(tmp_path / "elsewhere" / "two.png"))
+    os.symlink(str(tmp_path / "elsewhere"), str(root / "linked"))
+    index = OutputImageIndex(str(tmp_path / "index.sqlite3"))
+
+    index.sync(str(root))
+    assert listed(index, str(root)) == [os.path.join("a", "one.png"), os.path.join("linked", "two.png")]
+
+    state = watcher.TreeState(str(root))
+    state.build()
+    assert sorted(os.path.relpath(path, root) for path in state.dirs) == [".", "a", "linked"]
@@ -0,0 +1,28 @@
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from comfyui_extra_api.utils.response_cache import etag_matches
+
+
+def request(if_none_match=None):
+    headers = {"If-None-Match": if_none_match} if if_none_match is not None else {}
+    return make_mocked_request("GET", "/", headers=headers)
+
+
+@pytest.mark.parametrize(
+    "header, matches",
+    [
+        (None, False),
+        ("", False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"x", W/"abc" ', True),
+        ("*", True),
+        ('"ab"', False),
+        ('"abcd"', False),
+        ('"xabcx"', False),
+        ('"ab", "c"', False),
+    ],
+)
+def test_etag_matches(header, matches):
+    assert etag_matches(request(header), '"abc"') is matches
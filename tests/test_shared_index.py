@@ -0,0 +1,24 @@
+import os
+
+from comfyui_extra_api.model_utils import lora, watcher
+from comfyui_extra_api.model_utils.shared_index import SharedIndex
+from comfyui_extra_api.utils.output_index import output_index
+
+
+def test_take_over_watches_the_folders(comfy_folders, monkeypatch, tmp_path):
+    output_dir = os.path.abspath(comfy_folders.get_output_directory())
+    temp_dir = os.path.abspath(comfy_folders.get_temp_directory())
+    monkeypatch.setenv("COMFYUI_EXTRA_API_WATCH", "1")
+    monkeypatch.setattr(lora, "start_background_indexing", lambda: None)
+    monkeypatch.setattr(output_index, "external", {output_dir, temp_dir})
+
+    index = SharedIndex(str(tmp_path / "shared.sqlite3"), enabled=True)
+    index._owner = True
+    monkeypatch.setattr("comfyui_extra_api.model_utils.shared_index.shared_index", index)
+    try:
+        index._take_over()
+        assert not output_index.external
+        assert watcher.folder_watcher.is_watching(output_dir)
+        assert watcher.folder_watcher.is_watching(temp_dir)
+    finally:
+        watcher.folder_watcher.stop()
@@ -0,0 +1,61 @@
+import json
+import os
+
+ENV_PREFIX = "COMFYUI_EXTRA_API_"
+package_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+_file_values = None
+
+
+def config_filename() -> str:
+    return os.environ.get(ENV_PREFIX + "CONFIG") or os.path.join(package_dir, "config.json")
+
+
+def file_values() -> dict:
+    """
+    Settings of the JSON config file, keys are the environment variable names
+    without the prefix, e.g. {"CACHE_SIZE_LIMIT": 1073741824}. Environment
+    variables take precedence.
+    """
+    global _file_values
+    if _file_values is None:
+        try:
+            with open(config_filename(), "r", encoding="utf8") as file:
+                data = json.load(file)
+            _file_values = {str(k).upper(): v for k, v in data.items()}
+        except FileNotFoundError:
+            _file_values = {}
+        except Exception as e:
+            print(f"[extra-api] failed to read {config_filename()}: {e}")
+            _file_values = {}
+    return _file_values
+
+
+def get_str(name: str, default: str = None) -> str:
+    value = os.environ.get(ENV_PREFIX + name)
+    if value is not None:
+        return value
+    value = file_values().get(name)
+    if value is None:
+        return default
+    return str(value)
+
+
+def get_bool(name: str, default: bool = False) -> bool:
+    value = get_str(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_int(name: str, default: int) -> int:
+    value = get_str(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def get_float(name: str, default: float) -> float:
+    value = get_str(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from . import config
+from .metrics import registry
+
+
+def tensors_size(value) -> int:
+    return sum(t.element_size() * t.nelement() for t in value)
+
+
+def input_key(payload: str, *options) -> str:
+    """Hash of a base64 payload and of the decoding options applied to it."""
+    hasher = hashlib.blake2b(payload.encode("utf8"), digest_size=16)
+    hasher.update(repr(options).encode("utf8"))
+    return hasher.hexdigest()
+
+
+class DecodedInputCache:
+    """
+    LRU of the (image, mask) tensors decoded from base64 inputs, bounded by their
+    size in bytes. Prompts queued with the same source image skip the decoding.
+    The tensors are shared, nodes must not modify their inputs in place.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = tensors_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= tensors_size(previous)
+            self.entries[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= tensors_size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+decoded_inputs = DecodedInputCache(config.get_int("DECODED_CACHE_MAX_BYTES", 2**30))
+
+registry.snapshot(
+    "comfyapi_decoded_inputs_bytes",
+    "Size of the image/mask tensors kept by the decoded input cache.",
+    "gauge",
+    lambda: [({}, decoded_inputs.bytes)],
+)
+for _key in ("hits", "misses", "evictions"):
+    registry.snapshot(
+        f"comfyapi_decoded_inputs_{_key}_total",
+        f"Decoded input cache {_key}.",
+        "counter",
+        lambda key=_key: [({}, getattr(decoded_inputs, key))],
+    )
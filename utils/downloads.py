@@ -0,0 +1,77 @@
+import io
+import tarfile
+import zipfile
+from urllib.parse import urlencode
+
+import folder_paths
+
+from . import config
+from .files import INDEXED_FOLDER_TYPES
+from .output_index import output_index
+
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar": ("application/x-tar", ".tar"),
+}
+ARCHIVE_CHUNK_SIZE = config.get_int("ARCHIVE_CHUNK_SIZE", 256 * 1024)
+ARCHIVE_MAX_FILES = config.get_int("ARCHIVE_MAX_FILES", 10000)
+
+
+def download_url(filename: str, folder_type: str) -> str:
+    return "/comfyapi/v1/download?" + urlencode({"filename": filename, "type": folder_type})
+
+
+def record_access(folder_type: str, filepath: str):
+    """Updates the access time of an output/temp image, used by the `atime` retention order."""
+    if folder_type in INDEXED_FOLDER_TYPES:
+        output_index.touch(folder_paths.get_directory_by_type(folder_type), filepath)
+
+
+class ArchiveStream(io.RawIOBase):
+    """
+    Write-only, non-seekable file handing its data to `send` in chunks of
+    `chunk_size` bytes. zipfile and tarfile then produce their streaming variants,
+    the archive is never held in memory.
+    """
+
+    def __init__(self, send, chunk_size: int = ARCHIVE_CHUNK_SIZE):
+        self.send = send
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.send(bytes(self.buffer))
+            self.buffer.clear()
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+        super().close()
+
+
+def write_archive(fmt: str, files: list, send):
+    """
+    Writes the (arcname, path) files as a zip (stored, images are already compressed)
+    or tar archive, passing the data to `send` as it is produced.
+    """
+    with ArchiveStream(send) as stream:
+        if fmt == "zip":
+            with zipfile.ZipFile(stream, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for arcname, path in files:
+                    archive.write(path, arcname)
+        elif fmt == "tar":
+            with tarfile.open(fileobj=stream, mode="w|") as archive:
+                for arcname, path in files:
+                    archive.add(path, arcname, recursive=False)
+        else:
+            raise ValueError(f"invalid format: {fmt}")
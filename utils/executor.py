@@ -0,0 +1,178 @@
+import asyncio
+import atexit
+import concurrent.futures
+import functools
+import os
+import threading
+
+from . import config
+from .metrics import registry
+
+
+class ExecutorBusy(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Runs blocking functions for the API handlers outside the event loop.
+
+    At most `max_concurrency` calls run at the same time, up to `max_queue`
+    more wait for a slot and anything beyond that is rejected with
+    `ExecutorBusy` instead of piling up behind a slow disk.
+    """
+
+    def __init__(self, name: str, pool_factory, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.pool_factory = pool_factory
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self._pool = None
+        self._semaphore = None
+
+    @property
+    def pool(self) -> concurrent.futures.Executor:
+        if self._pool is None:
+            with self.lock:
+                if self._pool is None:
+                    self._pool = self.pool_factory(self.max_concurrency)
+        return self._pool
+
+    async def run(self, endpoint: str, fn, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        stats = endpoint_stats(endpoint)
+        if self.max_queue and self.waiting >= self.max_queue:
+            stats["rejected"] += 1
+            raise ExecutorBusy(f"{self.name} executor is busy, try again later")
+
+        stats["queued"] += 1
+        stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queued"])
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            stats["queued"] -= 1
+
+        stats["running"] += 1
+        self.active += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.pool, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.active -= 1
+            stats["running"] -= 1
+            stats["completed"] += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+endpoints = {}
+
+
+def endpoint_stats(endpoint: str) -> dict:
+    stats = endpoints.get(endpoint)
+    if stats is None:
+        stats = endpoints.setdefault(
+            endpoint,
+            {"queued": 0, "running": 0, "completed": 0, "rejected": 0, "max_queue_depth": 0},
+        )
+    return stats
+
+
+io_executor = BoundedExecutor(
+    "io",
+    lambda n: concurrent.futures.ThreadPoolExecutor(n, thread_name_prefix="extra-api-io"),
+    max_concurrency=config.get_int("IO_WORKERS", min(32, (os.cpu_count() or 1) + 4)),
+    max_queue=config.get_int("IO_MAX_QUEUE", 256),
+)
+
+# CPU heavy work (image decoding) goes to a process pool only when explicitly enabled,
+# otherwise it shares the thread pool of the io executor.
+cpu_workers = config.get_int("CPU_WORKERS", 0)
+cpu_executor = (
+    BoundedExecutor(
+        "cpu",
+        lambda n: concurrent.futures.ProcessPoolExecutor(n),
+        max_concurrency=cpu_workers,
+        max_queue=config.get_int("CPU_MAX_QUEUE", 64),
+    )
+    if cpu_workers > 0
+    else io_executor
+)
+
+
+async def run_io(endpoint: str, fn, *args, **kwargs):
+    return await io_executor.run(endpoint, fn, *args, **kwargs)
+
+
+async def run_cpu(endpoint: str, fn, *args, **kwargs):
+    """`fn` and its arguments must be picklable when a process pool is configured."""
+    return await cpu_executor.run(endpoint, fn, *args, **kwargs)
+
+
+def executor_stats() -> dict:
+    pools = {"io": io_executor.stats()}
+    if cpu_executor is not io_executor:
+        pools["cpu"] = cpu_executor.stats()
+    return {
+        "pools": pools,
+        "endpoints": {name: dict(stats) for name, stats in endpoints.items()},
+    }
+
+
+@atexit.register
+def shutdown_executors():
+    io_executor.shutdown()
+    cpu_executor.shutdown()
+
+
+def _pool_samples(key):
+    executors = {io_executor.name: io_executor, cpu_executor.name: cpu_executor}
+    return [({"pool": name}, getattr(executor, key)) for name, executor in executors.items()]
+
+
+def _endpoint_samples(key):
+    return [({"endpoint": name}, stats[key]) for name, stats in sorted(endpoints.items())]
+
+
+registry.snapshot(
+    "comfyapi_executor_active", "Calls running in the pool.", "gauge", lambda: _pool_samples("active")
+)
+registry.snapshot(
+    "comfyapi_executor_waiting",
+    "Calls waiting for a worker of the pool.",
+    "gauge",
+    lambda: _pool_samples("waiting"),
+)
+registry.snapshot(
+    "comfyapi_executor_queued",
+    "Calls of the endpoint waiting for a worker.",
+    "gauge",
+    lambda: _endpoint_samples("queued"),
+)
+registry.snapshot(
+    "comfyapi_executor_rejected_total",
+    "Calls of the endpoint rejected because the queue was full.",
+    "counter",
+    lambda: _endpoint_samples("rejected"),
+)
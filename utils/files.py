@@ -0,0 +1,90 @@
+import fnmatch
+import os
+import time
+
+import folder_paths
+
+from .output_index import output_index, IMAGE_EXTENSIONS
+
+FOLDER_TYPES = ("output", "input", "temp")
+INDEXED_FOLDER_TYPES = ("output", "temp")
+
+
+def validate_filename(filename: str):
+    if not filename:
+        raise ValueError("filename is required")
+
+    if filename[0] == "/" or ".." in filename:
+        raise ValueError("invalid filename")
+
+
+def resolve_annotated_file(filename: str, default_type: str = "output"):
+    """
+    Returns the path of an annotated filename ("name.png [output]", "sub/name.png [temp]"...),
+    names without annotation are looked up in the `default_type` directory.
+    Returns None when the file does not exist.
+    """
+    validate_filename(filename)
+    if default_type not in FOLDER_TYPES:
+        raise ValueError(f"invalid type: {default_type}")
+
+    default_dir = folder_paths.get_directory_by_type(default_type)
+    filepath = folder_paths.get_annotated_filepath(filename, default_dir)
+    return filepath if os.path.isfile(filepath) else None
+
+
+def select_images(folder_type: str, pattern: str = None, older_than_hours: float = None) -> list:
+    """
+    Filenames (relative to the `folder_type` directory) of the images matching a glob
+    pattern and/or older than the given age. Output and temp images come from the index.
+    """
+    folder = folder_paths.get_directory_by_type(folder_type)
+    cutoff = time.time() - older_than_hours * 3600 if older_than_hours is not None else None
+
+    if folder_type in INDEXED_FOLDER_TYPES:
+        output_index.sync(folder)
+        images, _ = output_index.query(folder, until=cutoff)
+        names = [
+            f"{image['subfolder']}/{image['name']}" if image["subfolder"] else image["name"]
+            for image in images
+        ]
+    else:
+        names = []
+        for root, _, files in os.walk(folder):
+            for file in files:
+                if not file.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                filepath = os.path.join(root, file)
+                if cutoff is not None and os.path.getmtime(filepath) >= cutoff:
+                    continue
+                names.append(os.path.relpath(filepath, folder).replace(os.sep, "/"))
+
+    if pattern:
+        names = [name for name in names if fnmatch.fnmatchcase(name, pattern)]
+    return names
+
+
+def delete_images(folder_type: str, filenames: list) -> list:
+    """
+    Deletes files of the `folder_type` directory and removes them from the output index,
+    returns one {"filename", "code"[, "message"]} result per file.
+    """
+    results = []
+    removed = []
+    for filename in filenames:
+        try:
+            filepath = resolve_annotated_file(f"{filename} [{folder_type}]", folder_type)
+            if filepath is None:
+                results.append({"filename": filename, "code": 404, "message": f"file {filename} not found"})
+                continue
+            os.remove(filepath)
+            removed.append(filepath)
+            results.append({"filename": filename, "code": 200})
+        except ValueError as e:
+            results.append({"filename": filename, "code": 400, "message": str(e)})
+        except Exception as e:
+            results.append({"filename": filename, "code": 500, "message": str(e)})
+
+    if removed and folder_type in INDEXED_FOLDER_TYPES:
+        output_index.remove_many(folder_paths.get_directory_by_type(folder_type), removed)
+    return results
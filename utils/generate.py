@@ -0,0 +1,418 @@
+import asyncio
+import copy
+import inspect
+import json
+import os
+import random
+import time
+import uuid
+from urllib.parse import urlencode
+
+import folder_paths
+
+from . import config
+from .executor import ExecutorBusy, run_io
+
+TEMPLATES_DIR = config.get_str("GENERATE_TEMPLATES_DIR", "")
+POLL_INTERVAL = config.get_float("GENERATE_POLL_INTERVAL", 0.25)
+MAX_JOBS = config.get_int("GENERATE_MAX_JOBS", 1000)
+MAX_WAIT = config.get_float("GENERATE_MAX_WAIT", 300)
+# websocket client of the queued prompts, no socket listens to it
+CLIENT_ID = "extra-api"
+
+# ComfyUI API format workflows, "{{name}}" values are replaced by the generation parameters
+TXT2IMG = {
+    "1": {
+        "class_type": "CheckpointLoaderSimple",
+        "inputs": {"ckpt_name": "{{model}}"},
+    },
+    "2": {
+        "class_type": "CLIPTextEncode",
+        "inputs": {"text": "{{prompt}}", "clip": ["1", 1]},
+    },
+    "3": {
+        "class_type": "CLIPTextEncode",
+        "inputs": {"text": "{{negative_prompt}}", "clip": ["1", 1]},
+    },
+    "4": {
+        "class_type": "EmptyLatentImage",
+        "inputs": {"width": "{{width}}", "height": "{{height}}", "batch_size": 1},
+    },
+    "5": {
+        "class_type": "KSampler",
+        "inputs": {
+            "model": ["1", 0],
+            "positive": ["2", 0],
+            "negative": ["3", 0],
+            "latent_image": ["4", 0],
+            "seed": "{{seed}}",
+            "steps": "{{steps}}",
+            "cfg": "{{cfg}}",
+            "sampler_name": "{{sampler_name}}",
+            "scheduler": "{{scheduler}}",
+            "denoise": "{{denoise}}",
+        },
+    },
+    "6": {
+        "class_type": "VAEDecode",
+        "inputs": {"samples": ["5", 0], "vae": ["1", 2]},
+    },
+    "7": {
+        "class_type": "SaveImage",
+        "inputs": {"images": ["6", 0], "filename_prefix": "extra-api"},
+    },
+}
+
+# the source image is decoded by SimpleGenImageInterface and encoded in place of the empty latent
+IMG2IMG = copy.deepcopy(TXT2IMG)
+IMG2IMG["4"] = {
+    "class_type": "VAEEncode",
+    "inputs": {"pixels": ["8", 11], "vae": ["1", 2]},
+}
+IMG2IMG["8"] = {
+    "class_type": "SimpleGenImageInterface",
+    "inputs": {
+        name: "{{" + name + "}}"
+        for name in (
+            "model",
+            "prompt",
+            "negative_prompt",
+            "width",
+            "height",
+            "seed",
+            "steps",
+            "cfg",
+            "sampler_name",
+            "scheduler",
+            "denoise",
+            "img2img_base64",
+            "max_frames",
+            "max_side",
+        )
+    },
+}
+
+DEFAULT_TEMPLATES = {"txt2img": TXT2IMG, "img2img": IMG2IMG}
+
+
+def load_templates() -> dict:
+    """The built-in templates and the *.json workflows of COMFYUI_EXTRA_API_GENERATE_TEMPLATES_DIR."""
+    templates = dict(DEFAULT_TEMPLATES)
+    if TEMPLATES_DIR and os.path.isdir(TEMPLATES_DIR):
+        for file in sorted(os.listdir(TEMPLATES_DIR)):
+            name, ext = os.path.splitext(file)
+            if ext.lower() != ".json":
+                continue
+            try:
+                with open(os.path.join(TEMPLATES_DIR, file), encoding="utf8") as f:
+                    templates[name] = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[extra-api] failed to load the workflow template {file}: {e}")
+    return templates
+
+
+def parameter_types() -> dict:
+    """{name: (type, default)} of the SimpleGenImageInterface inputs, combos are lists of values."""
+    from ..nodes import SimpleGenImageInterface
+
+    input_types = SimpleGenImageInterface.INPUT_TYPES()
+    types = {}
+    for section in ("required", "optional"):
+        for name, spec in input_types.get(section, {}).items():
+            kind = spec[0]
+            options = spec[1] if len(spec) > 1 else {}
+            default = options.get("default", kind[0] if isinstance(kind, list) and kind else None)
+            types[name] = (kind, default)
+    return types
+
+
+def resolve_parameters(values: dict) -> dict:
+    """The generation parameters with their defaults, converted to the node input types."""
+    types = parameter_types()
+    unknown = set(values) - set(types)
+    if unknown:
+        raise ValueError(f"unknown parameters: {', '.join(sorted(unknown))}")
+
+    params = {}
+    for name, (kind, default) in types.items():
+        value = values.get(name, default)
+        if isinstance(kind, list):
+            if name == "model" and (not value or value == "none"):
+                value = folder_paths.get_filename_list("checkpoints")[0]
+            elif value not in kind:
+                raise ValueError(f"invalid {name}: {value}")
+        elif kind in ("INT", "FLOAT"):
+            if name == "seed" and value is None:
+                # replaced by a random seed below
+                value = default
+            try:
+                value = int(value) if kind == "INT" else float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid {name}: {value!r}")
+        elif kind == "STRING":
+            value = "" if value is None else str(value)
+        params[name] = value
+
+    # an omitted or negative seed draws a new one
+    if values.get("seed") is None or params["seed"] < 0:
+        params["seed"] = random.randint(0, 2**63 - 1)
+    return params
+
+
+def fill_template(template: dict, params: dict) -> dict:
+    """Copy of the workflow with its "{{name}}" values replaced by the parameters."""
+
+    def fill(value):
+        if isinstance(value, str) and value.startswith("{{") and value.endswith("}}"):
+            name = value[2:-2].strip()
+            if name not in params:
+                raise ValueError(f"unknown template parameter: {name}")
+            return params[name]
+        if isinstance(value, dict):
+            return {k: fill(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [fill(v) for v in value]
+        return value
+
+    return fill(template)
+
+
+def view_url(image: dict) -> str:
+    return "/view?" + urlencode(
+        {"filename": image["filename"], "subfolder": image["subfolder"], "type": image["type"]}
+    )
+
+
+def image_path(image: dict):
+    """Path of an image of the history outputs, None when it is not in a ComfyUI directory."""
+    directory = folder_paths.get_directory_by_type(image["type"])
+    if directory is None:
+        return None
+    directory = os.path.abspath(directory)
+    filepath = os.path.abspath(os.path.join(directory, image["subfolder"], image["filename"]))
+    if os.path.commonpath((filepath, directory)) != directory:
+        return None
+    return filepath
+
+
+class PromptRejected(Exception):
+    def __init__(self, message: str, node_errors: dict):
+        super().__init__(message)
+        self.node_errors = node_errors
+
+
+class Job:
+    __slots__ = ("id", "template", "number", "created", "status", "position", "images", "error", "changed")
+
+    def __init__(self, job_id: str, template: str, number):
+        self.id = job_id
+        self.template = template
+        self.number = number
+        self.created = time.time()
+        # queued, running, completed or failed
+        self.status = "queued"
+        self.position = None
+        self.images = []
+        self.error = None
+        self.changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def update(self, status: str, position=None, images=None, error=None):
+        if (status, position) == (self.status, self.position) and images is None and error is None:
+            return
+        self.status = status
+        self.position = position
+        if images is not None:
+            self.images = images
+        if error is not None:
+            self.error = error
+        # wakes up the current waiters, the next ones wait for the next change
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def wait_change(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> dict:
+        result = {
+            "job_id": self.id,
+            "template": self.template,
+            "status": self.status,
+            "created": self.created,
+        }
+        if self.position is not None:
+            result["position"] = self.position
+        if self.status == "completed":
+            result["images"] = [
+                {
+                    **image,
+                    "url": view_url(image),
+                    "data_url": f"/comfyapi/v1/generate/{self.id}/images/{index}",
+                }
+                for index, image in enumerate(self.images)
+            ]
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+
+def history_images(entry: dict) -> list:
+    images = []
+    for output in entry.get("outputs", {}).values():
+        for image in output.get("images", []):
+            if "filename" in image:
+                images.append(
+                    {
+                        "filename": image["filename"],
+                        "subfolder": image.get("subfolder", ""),
+                        "type": image.get("type", "output"),
+                    }
+                )
+    return images
+
+
+def history_error(entry: dict) -> str:
+    for message in entry.get("status", {}).get("messages", []):
+        if message and message[0] == "execution_error":
+            details = message[1]
+            return f"{details.get('node_type', '')}: {details.get('exception_message', '')}".strip()
+    return "execution failed"
+
+
+class GenerationJobs:
+    """
+    Jobs submitted through /comfyapi/v1/generate. A single task follows the ComfyUI
+    queue and history every COMFYUI_EXTRA_API_GENERATE_POLL_INTERVAL seconds and
+    wakes up the clients waiting for a job.
+    """
+
+    def __init__(self, max_jobs: int = MAX_JOBS):
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self.templates = load_templates()
+        self.poller = None
+
+    async def queue_prompt(self, workflow: dict) -> tuple:
+        """
+        Validates and queues the workflow in process, the same way as ComfyUI's /prompt
+        handler. Returns the prompt id and queue number.
+        """
+        import execution
+        from server import PromptServer
+
+        server = PromptServer.instance
+        data = {"prompt": workflow, "client_id": CLIENT_ID}
+        if hasattr(server, "trigger_on_prompt"):
+            # the prompt handlers of the other extensions
+            data = server.trigger_on_prompt(data)
+        workflow = data["prompt"]
+
+        prompt_id = str(uuid.uuid4())
+        # recent ComfyUI versions have a validate_prompt(prompt_id, prompt,
+        # partial_execution_targets) coroutine, older ones take the prompt alone
+        if len(inspect.signature(execution.validate_prompt).parameters) >= 3:
+            valid = execution.validate_prompt(prompt_id, workflow, None)
+        else:
+            valid = execution.validate_prompt(workflow)
+        if inspect.isawaitable(valid):
+            valid = await valid
+        if not valid[0]:
+            error = valid[1]
+            message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            raise PromptRejected(message, valid[3])
+
+        number = server.number
+        server.number += 1
+        extra_data = {
+            "client_id": data.get("client_id", CLIENT_ID),
+            "create_time": int(time.time() * 1000),
+        }
+        item = (number, prompt_id, workflow, extra_data, valid[2])
+        if hasattr(execution, "SENSITIVE_EXTRA_DATA_KEYS"):
+            # newer queues carry the extra data kept out of the history
+            item += ({},)
+        server.prompt_queue.put(item)
+        return prompt_id, number
+
+    async def submit(self, template_name: str, values: dict) -> Job:
+        template = self.templates.get(template_name)
+        if template is None:
+            raise ValueError(f"unknown template: {template_name}")
+        workflow = fill_template(template, resolve_parameters(values))
+        prompt_id, number = await self.queue_prompt(workflow)
+
+        job = Job(prompt_id, template_name, number)
+        self.add(job)
+        self.start()
+        return job
+
+    def add(self, job: Job):
+        self.jobs[job.id] = job
+        if len(self.jobs) > self.max_jobs:
+            # forgets the oldest finished jobs, their images stay in the output directory
+            for job_id in [j.id for j in self.jobs.values() if j.done][: len(self.jobs) - self.max_jobs]:
+                del self.jobs[job_id]
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def start(self):
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.ensure_future(self.poll())
+
+    async def poll(self):
+        while any(not job.done for job in self.jobs.values()):
+            await asyncio.sleep(POLL_INTERVAL)
+            pending = [job for job in self.jobs.values() if not job.done]
+            try:
+                states = await run_io("generate", queue_states, [job.id for job in pending])
+            except ExecutorBusy:
+                continue
+            except Exception as e:
+                print(f"[extra-api] failed to read the ComfyUI queue: {e}")
+                continue
+            for job in pending:
+                job.update(*states[job.id])
+
+    def stats(self) -> dict:
+        statuses = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"jobs": len(self.jobs), "statuses": statuses, "templates": sorted(self.templates)}
+
+
+def queue_states(job_ids: list) -> dict:
+    """{job_id: (status, position, images, error)} from the ComfyUI queue and history."""
+    from server import PromptServer
+
+    prompt_queue = PromptServer.instance.prompt_queue
+    running, pending = prompt_queue.get_current_queue()
+    running_ids = {item[1] for item in running}
+    positions = {item[1]: index for index, item in enumerate(sorted(pending, key=lambda item: item[0]))}
+
+    states = {}
+    for job_id in job_ids:
+        if job_id in running_ids:
+            states[job_id] = ("running", None, None, None)
+        elif job_id in positions:
+            states[job_id] = ("queued", positions[job_id], None, None)
+        else:
+            entry = prompt_queue.get_history(prompt_id=job_id).get(job_id)
+            if entry is None:
+                # neither queued nor in the history: deleted from the queue or interrupted
+                states[job_id] = ("failed", None, None, "the prompt was removed from the queue")
+            elif entry.get("status", {}).get("status_str", "success") == "success":
+                states[job_id] = ("completed", None, history_images(entry), None)
+            else:
+                states[job_id] = ("failed", None, None, history_error(entry))
+    return states
+
+
+generation_jobs = GenerationJobs()
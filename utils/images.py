@@ -1,9 +1,23 @@
+import asyncio
 import base64
+import io
 import json
+import struct
+import zlib
 from io import BytesIO
 
 from PIL import Image
 
+from ..model_utils.cache import cached_data_for_file
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+SKIP_CHUNK_SIZE = 2**16
+
+EXIF_IFD_POINTER = 0x8769
+EXIF_USER_COMMENT = 0x9286
+
+
 def base64_decode_to_pil(img_base64: str) -> Image:
     img_data = base64.b64decode(img_base64)
     return Image.open(BytesIO(img_data))
@@ -21,8 +35,311 @@ def extract_img_metadata(img: Image.Image)-> dict:
             raise ValueError(f"Failed to extract metadata from image: {e}")
     else:
         metadata = img.text
-    
+
+    return extract_text_metadata(metadata)
+
+
+def extract_text_metadata(metadata: dict) -> dict:
     if prompt := metadata.get("prompt"):
         return prompt
-    
-    return metadata
\ No newline at end of file
+
+    return metadata
+
+
+class UnsupportedImageFormat(ValueError):
+    pass
+
+
+class Base64Reader(io.RawIOBase):
+    """
+    File-like object decoding a base64 string on demand, so that a parser that
+    stops early never decodes (nor copies) the rest of the payload.
+    """
+
+    def __init__(self, data: str):
+        if data.startswith("data:"):
+            data = data[data.find(",") + 1 :]
+        if any(c in data[:1024] for c in " \r\n"):
+            data = "".join(data.split())
+        self.data = data
+        self.pos = 0
+        self.buffer = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            out = self.buffer + base64.b64decode(self.data[self.pos :])
+            self.buffer, self.pos = b"", len(self.data)
+            return out
+
+        while len(self.buffer) < size and self.pos < len(self.data):
+            step = max(4096, ((size - len(self.buffer)) // 3 + 1) * 4)
+            chunk = self.data[self.pos : self.pos + step]
+            self.pos += len(chunk)
+            self.buffer += base64.b64decode(chunk)
+
+        out, self.buffer = self.buffer[:size], self.buffer[size:]
+        return out
+
+    def skip(self, size: int):
+        buffered = min(size, len(self.buffer))
+        self.buffer = self.buffer[buffered:]
+        size -= buffered
+        # every 4 characters encode 3 bytes, whole groups are skipped without decoding
+        groups = min(size // 3, (len(self.data) - self.pos) // 4 - 1)
+        if groups > 0:
+            self.pos += groups * 4
+            size -= groups * 3
+        if size:
+            self.read(size)
+
+
+class StreamReader(io.RawIOBase):
+    """
+    Blocking file-like view over an async chunk reader (an aiohttp request body or
+    multipart part), to be used by a parser running in a worker thread.
+    """
+
+    def __init__(self, read_chunk, loop: asyncio.AbstractEventLoop):
+        self.read_chunk = read_chunk
+        self.loop = loop
+        self.buffer = b""
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            chunk = asyncio.run_coroutine_threadsafe(
+                self.read_chunk(), self.loop
+            ).result()
+            if not chunk:
+                self.eof = True
+            self.buffer += chunk
+
+        if size is None or size < 0:
+            size = len(self.buffer)
+        out, self.buffer = self.buffer[:size], self.buffer[size:]
+        return out
+
+
+def _read_exact(stream, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("unexpected end of image data")
+    return data
+
+
+def _skip(stream, size: int):
+    if hasattr(stream, "skip"):
+        stream.skip(size)
+    elif stream.seekable():
+        stream.seek(size, io.SEEK_CUR)
+    else:
+        while size > 0:
+            chunk = stream.read(min(size, SKIP_CHUNK_SIZE))
+            if not chunk:
+                raise ValueError("unexpected end of image data")
+            size -= len(chunk)
+
+
+def read_png_text(stream) -> dict:
+    """Reads the tEXt/zTXt/iTXt chunks of a PNG stream, stops at the first IDAT chunk."""
+    text = {}
+    while True:
+        length, chunk_type = struct.unpack(">I4s", _read_exact(stream, 8))
+        if chunk_type in (b"IDAT", b"IEND"):
+            return text
+        if chunk_type not in PNG_TEXT_CHUNKS:
+            _skip(stream, length + 4)
+            continue
+
+        data = _read_exact(stream, length)
+        _skip(stream, 4)  # crc
+        keyword, _, data = data.partition(b"\0")
+        keyword = keyword.decode("latin-1")
+        if chunk_type == b"tEXt":
+            text[keyword] = data.decode("latin-1")
+        elif chunk_type == b"zTXt":
+            text[keyword] = zlib.decompress(data[1:]).decode("latin-1")
+        else:
+            compressed = data[0:1] == b"\1"
+            _, _, data = data[2:].partition(b"\0")  # language tag
+            _, _, data = data.partition(b"\0")  # translated keyword
+            if compressed:
+                data = zlib.decompress(data)
+            text[keyword] = data.decode("utf8")
+
+
+def _read_tiff_strings(data: bytes) -> dict:
+    """ASCII tags of IFD0 and the exif UserComment of a TIFF/EXIF block."""
+    if data[:2] == b"II":
+        order = "<"
+    elif data[:2] == b"MM":
+        order = ">"
+    else:
+        return {}
+
+    values = {}
+
+    def read_ifd(offset, tags):
+        if offset + 2 > len(data):
+            return
+        (count,) = struct.unpack_from(order + "H", data, offset)
+        for i in range(count):
+            entry = offset + 2 + i * 12
+            if entry + 12 > len(data):
+                break
+            tag, kind, n = struct.unpack_from(order + "HHI", data, entry)
+            if tag == EXIF_IFD_POINTER:
+                tags[tag] = struct.unpack_from(order + "I", data, entry + 8)[0]
+                continue
+            if kind not in (2, 7):  # ASCII, UNDEFINED
+                continue
+            if n <= 4:
+                raw = data[entry + 8 : entry + 8 + n]
+            else:
+                (value_offset,) = struct.unpack_from(order + "I", data, entry + 8)
+                raw = data[value_offset : value_offset + n]
+            tags[tag] = raw
+
+    ifd0 = {}
+    read_ifd(struct.unpack_from(order + "I", data, 4)[0], ifd0)
+    exif = {}
+    if EXIF_IFD_POINTER in ifd0:
+        read_ifd(ifd0.pop(EXIF_IFD_POINTER), exif)
+
+    for tag, raw in ifd0.items():
+        values[tag] = raw.rstrip(b"\0").decode("utf8", errors="replace")
+    comment = exif.get(EXIF_USER_COMMENT)
+    if comment:
+        encoding, body = comment[:8], comment[8:]
+        if encoding.startswith(b"UNICODE"):
+            codec = "utf-16-be" if order == ">" else "utf-16-le"
+            values[EXIF_USER_COMMENT] = body.decode(codec, errors="replace").rstrip("\0")
+        else:
+            values[EXIF_USER_COMMENT] = body.rstrip(b"\0").decode("utf8", errors="replace")
+    return values
+
+
+def exif_to_text(data: bytes) -> dict:
+    """
+    ComfyUI stores the workflow of WebP images in EXIF strings formatted as
+    "<key>:<json>" (e.g. "prompt:{...}"), the other strings are kept by tag id.
+    """
+    if data.startswith(b"Exif\0\0"):
+        data = data[6:]
+
+    text = {}
+    for tag, value in _read_tiff_strings(data).items():
+        key, sep, rest = value.partition(":")
+        if sep and key.isidentifier():
+            text[key] = rest
+        elif tag == EXIF_USER_COMMENT:
+            text["parameters"] = value
+        else:
+            text[str(tag)] = value
+    return text
+
+
+def read_webp_text(stream) -> dict:
+    """Reads the EXIF chunk of a WebP stream, image chunks are skipped without decoding."""
+    _read_exact(stream, 4)  # "WEBP"
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            return {}
+        chunk_type, length = struct.unpack("<4sI", header)
+        if chunk_type == b"EXIF":
+            return exif_to_text(_read_exact(stream, length))
+        _skip(stream, length + (length & 1))
+
+
+def read_jpeg_text(stream) -> dict:
+    """Reads the EXIF and comment segments of a JPEG stream, stops at the image data."""
+    text = {}
+    while True:
+        marker = _read_exact(stream, 2)
+        while marker[1:] == b"\xff":  # fill bytes
+            marker = marker[1:] + _read_exact(stream, 1)
+        if marker[0] != 0xFF or marker[1] in (0xDA, 0xD9):  # start of scan / end of image
+            return text
+        if 0xD0 <= marker[1] <= 0xD7 or marker[1] == 0x01:  # no payload
+            continue
+
+        (length,) = struct.unpack(">H", _read_exact(stream, 2))
+        if marker[1] == 0xE1 or marker[1] == 0xFE:
+            data = _read_exact(stream, length - 2)
+            if marker[1] == 0xFE:
+                text.setdefault("comment", data.decode("utf8", errors="replace"))
+            elif data.startswith(b"Exif\0\0"):
+                text.update(exif_to_text(data))
+        else:
+            _skip(stream, length - 2)
+
+
+def read_img_text(stream) -> dict:
+    """Text metadata of a PNG, WebP or JPEG stream, read without decoding the image."""
+    head = stream.read(8)
+    if head == PNG_SIGNATURE:
+        return read_png_text(stream)
+    if head[:4] == b"RIFF":
+        return read_webp_text(stream)
+    if head[:2] == b"\xff\xd8":
+        stream = _Prepend(head[2:], stream)
+        return read_jpeg_text(stream)
+    raise UnsupportedImageFormat("unsupported image format")
+
+
+class _Prepend(io.RawIOBase):
+    def __init__(self, head: bytes, stream):
+        self.head = head
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            out, self.head = self.head + self.stream.read(), b""
+            return out
+        out, self.head = self.head[:size], self.head[size:]
+        if len(out) < size:
+            out += self.stream.read(size - len(out))
+        return out
+
+    def skip(self, size: int):
+        buffered = min(size, len(self.head))
+        self.head = self.head[buffered:]
+        if size > buffered:
+            _skip(self.stream, size - buffered)
+
+
+def extract_stream_metadata(stream) -> dict:
+    return extract_text_metadata(read_img_text(stream))
+
+
+def decode_img_metadata(img_base64: str) -> dict:
+    try:
+        return extract_stream_metadata(Base64Reader(img_base64))
+    except UnsupportedImageFormat:
+        # other formats go through PIL
+        img = base64_decode_to_pil(img_base64)
+        return extract_img_metadata(img)
+
+
+def file_img_metadata(filepath: str) -> dict:
+    """Metadata of an image file, cached by path and mtime."""
+
+    def read_metadata():
+        with open(filepath, "rb") as file:
+            try:
+                return extract_stream_metadata(file)
+            except UnsupportedImageFormat:
+                file.seek(0)
+                return extract_img_metadata(Image.open(file))
+
+    return cached_data_for_file("pnginfo", filepath, filepath, read_metadata)
@@ -0,0 +1,261 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SCAN_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def samples(self):
+        """(suffix, labels, value) of the exposition."""
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield "", dict(zip(self.labels, key)), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Snapshot(Metric):
+    """Values read when the metrics are scraped, `collect` returns [(labels, value)]."""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, collect):
+        super().__init__(name, documentation)
+        self.type = metric_type
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield "", labels, value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def add(self, metric: Metric) -> Metric:
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        return self.add(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, documentation, labels, buckets))
+
+    def snapshot(self, name: str, documentation: str, metric_type: str, collect) -> Snapshot:
+        return self.add(Snapshot(name, documentation, metric_type, collect))
+
+    def render(self) -> bytes:
+        """Prometheus text exposition of every metric."""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                lines += metric.render()
+            except Exception as e:
+                print(f"[extra-api] failed to collect the {metric.name} metric: {e}")
+        return ("\n".join(lines) + "\n").encode("utf8")
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "comfyapi_http_requests_total",
+    "Requests handled by the extra API, by HTTP status of the response.",
+    ("route", "method", "status"),
+)
+http_request_seconds = registry.histogram(
+    "comfyapi_http_request_duration_seconds",
+    "Time from the start of the handler to the end of the response.",
+    ("route", "method"),
+)
+http_response_bytes = registry.counter(
+    "comfyapi_http_response_bytes_total",
+    "Bytes sent in response bodies, chunked responses include their framing.",
+    ("route", "method"),
+)
+scan_seconds = registry.histogram(
+    "comfyapi_scan_duration_seconds",
+    "Duration of the folder scans and of the metadata reads of the listings.",
+    ("scan", "folder"),
+    buckets=SCAN_BUCKETS,
+)
+
+
+def sent_bytes(request, response) -> int:
+    if request.method == "HEAD":
+        return 0
+    # files are sent with sendfile, which bypasses the byte count of the payload writer
+    return response.content_length if response.content_length is not None else response.body_length
+
+
+def instrument(handler, method: str, route: str):
+    """
+    Wraps a route handler to record its count, latency and bytes sent. The response is
+    only recorded once aiohttp has sent it, middlewares may still change its headers.
+    """
+
+    @functools.wraps(handler)
+    async def wrapper(request):
+        started = time.perf_counter()
+        try:
+            response = await handler(request)
+        except Exception as e:
+            status = getattr(e, "status", 500)
+            http_requests.inc(route=route, method=method, status=status)
+            http_request_seconds.observe(time.perf_counter() - started, route=route, method=method)
+            raise
+
+        status = response.status
+        write_eof = response.write_eof
+
+        async def recorded_write_eof(*args, **kwargs):
+            try:
+                await write_eof(*args, **kwargs)
+            finally:
+                del response.write_eof
+                http_requests.inc(route=route, method=method, status=status)
+                http_request_seconds.observe(
+                    time.perf_counter() - started, route=route, method=method
+                )
+                http_response_bytes.inc(sent_bytes(request, response), route=route, method=method)
+
+        response.write_eof = recorded_write_eof
+        return response
+
+    return wrapper
+
+
+class InstrumentedRoutes:
+    """RouteTableDef proxy instrumenting the handlers registered through it."""
+
+    def __init__(self, routes):
+        self.routes = routes
+
+    def _register(self, register, method: str, path: str, kwargs: dict):
+        def decorator(handler):
+            register(path, **kwargs)(instrument(handler, method, path))
+            return handler
+
+        return decorator
+
+    def route(self, method: str, path: str, **kwargs):
+        return self._register(
+            lambda path, **kwargs: self.routes.route(method, path, **kwargs), method, path, kwargs
+        )
+
+    def get(self, path: str, **kwargs):
+        return self._register(self.routes.get, "GET", path, kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self._register(self.routes.post, "POST", path, kwargs)
+
+    def put(self, path: str, **kwargs):
+        return self._register(self.routes.put, "PUT", path, kwargs)
+
+    def patch(self, path: str, **kwargs):
+        return self._register(self.routes.patch, "PATCH", path, kwargs)
+
+    def delete(self, path: str, **kwargs):
+        return self._register(self.routes.delete, "DELETE", path, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.routes, name)
@@ -0,0 +1,422 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .metrics import scan_seconds
+from ..model_utils.cache import cache_dir
+from ..model_utils.watcher import is_link_cycle
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+SORT_COLUMNS = {"name": "name", "mtime": "mtime", "size": "size", "atime": "atime"}
+
+index_filename = os.path.join(cache_dir, "output-images.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    subfolder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+);
+CREATE INDEX IF NOT EXISTS images_by_name ON images (root, name, path);
+CREATE INDEX IF NOT EXISTS images_by_mtime ON images (root, mtime, path);
+CREATE INDEX IF NOT EXISTS images_by_size ON images (root, size, path);
+CREATE INDEX IF NOT EXISTS images_by_subfolder ON images (root, subfolder);
+CREATE TABLE IF NOT EXISTS dirs (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent TEXT,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (root, path)
+);
+"""
+
+# applied in order to bring a database at `PRAGMA user_version` = index up to date
+MIGRATIONS = [
+    # 1: access time for LRU eviction and per-root totals maintained by triggers
+    """
+    ALTER TABLE images ADD COLUMN atime REAL NOT NULL DEFAULT 0;
+    UPDATE images SET atime = mtime;
+    CREATE INDEX IF NOT EXISTS images_by_atime ON images (root, atime, path);
+    CREATE TABLE IF NOT EXISTS totals (
+        root TEXT PRIMARY KEY,
+        files INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    );
+    INSERT INTO totals (root, files, bytes)
+        SELECT root, COUNT(*), COALESCE(SUM(size), 0) FROM images GROUP BY root;
+    CREATE TRIGGER IF NOT EXISTS images_insert AFTER INSERT ON images BEGIN
+        INSERT INTO totals (root, files, bytes)
+            SELECT NEW.root, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM totals WHERE root = NEW.root);
+        UPDATE totals SET files = files + 1, bytes = bytes + NEW.size WHERE root = NEW.root;
+    END;
+    CREATE TRIGGER IF NOT EXISTS images_delete AFTER DELETE ON images BEGIN
+        UPDATE totals SET files = files - 1, bytes = bytes - OLD.size WHERE root = OLD.root;
+    END;
+    CREATE TRIGGER IF NOT EXISTS images_update AFTER UPDATE OF size ON images BEGIN
+        UPDATE totals SET bytes = bytes - OLD.size + NEW.size WHERE root = NEW.root;
+    END;
+    """,
+]
+
+
+def encode_cursor(value, path: str) -> str:
+    raw = json.dumps([value, path], separators=(",", ":")).encode("utf8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        value, path = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("invalid cursor")
+    return value, path
+
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+class OutputImageIndex:
+    """
+    Persistent SQLite index of the images under the output/temp directories.
+
+    `sync` only lists directories whose mtime changed since the last pass, so
+    an unchanged tree costs one `stat` per directory. Files overwritten in
+    place (which does not touch the directory mtime) are picked up on the next
+    forced refresh.
+    """
+
+    def __init__(self, filename: str, min_sync_interval: float = 2.0):
+        self.filename = filename
+        self.min_sync_interval = min_sync_interval
+        self.lock = threading.RLock()
+        self.last_sync = {}
+        self.watched = set()
+        # roots kept up to date by the process owning the shared index
+        self.external = set()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            conn = sqlite3.connect(self.filename, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # REPLACE deletes the old row, the totals triggers must see it
+            conn.execute("PRAGMA recursive_triggers=ON")
+            conn.executescript(SCHEMA)
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                conn.executescript(f"BEGIN; {migration}; PRAGMA user_version = {i}; COMMIT;")
+            self._conn = conn
+        return self._conn
+
+    def sync(self, root: str, force: bool = False):
+        root = os.path.abspath(root)
+        if not force and root in self.external:
+            return
+        with self.lock:
+            now = time.monotonic()
+            last = self.last_sync.get(root)
+            if not force and last is not None:
+                # watched roots are kept up to date by `apply_changes`
+                if root in self.watched or now - last < self.min_sync_interval:
+                    return
+
+            with self.conn, scan_seconds.time(scan="output_index", folder=os.path.basename(root)):
+                self._sync(root, force)
+            self.last_sync[root] = time.monotonic()
+
+    def _sync(self, root: str, force: bool):
+        conn = self.conn
+        known_dirs = {
+            path: (parent, mtime)
+            for path, parent, mtime in conn.execute(
+                "SELECT path, parent, mtime FROM dirs WHERE root = ?", (root,)
+            )
+        }
+        children = {}
+        for path, (parent, _) in known_dirs.items():
+            if parent is not None:
+                children.setdefault(parent, []).append(path)
+
+        seen = set()
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            abs_dir = os.path.join(root, *rel.split("/")) if rel else root
+            try:
+                dir_mtime = os.stat(abs_dir).st_mtime
+            except OSError:
+                continue
+
+            seen.add(rel)
+            known = known_dirs.get(rel)
+            if not force and known is not None and known[1] == dir_mtime:
+                stack.extend(children.get(rel, ()))
+                continue
+
+            subdirs = self._scan_dir(root, rel, abs_dir)
+            for name in subdirs:
+                sub_rel = _join(rel, name)
+                if sub_rel not in known_dirs:
+                    # never listed yet, the mtime placeholder forces a scan
+                    known_dirs[sub_rel] = (rel, -1.0)
+            stack.extend(_join(rel, name) for name in subdirs)
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs (root, path, parent, mtime) VALUES (?, ?, ?, ?)",
+                (root, rel, known[0] if known else None, dir_mtime),
+            )
+
+        for rel in set(known_dirs) - seen:
+            conn.execute("DELETE FROM dirs WHERE root = ? AND path = ?", (root, rel))
+            conn.execute(
+                "DELETE FROM images WHERE root = ? AND subfolder = ?", (root, rel)
+            )
+
+    def _scan_dir(self, root: str, rel: str, abs_dir: str) -> list:
+        conn = self.conn
+        indexed = {
+            name: (mtime, size)
+            for name, mtime, size in conn.execute(
+                "SELECT name, mtime, size FROM images WHERE root = ? AND subfolder = ?",
+                (root, rel),
+            )
+        }
+
+        subdirs = []
+        rows = []
+        present = set()
+        try:
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            entries = []
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=True):
+                    # linked folders are indexed like the watcher lists them, except loops
+                    if not is_link_cycle(entry, abs_dir):
+                        subdirs.append(entry.name)
+                    continue
+                ext = os.path.splitext(entry.name)[1].lower()
+                if ext not in IMAGE_EXTENSIONS:
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+
+            present.add(entry.name)
+            if indexed.get(entry.name) != (st.st_mtime, st.st_size):
+                rows.append(
+                    (
+                        root,
+                        _join(rel, entry.name),
+                        rel,
+                        entry.name,
+                        ext,
+                        st.st_mtime,
+                        st.st_size,
+                        st.st_atime,
+                    )
+                )
+
+        if rows:
+            conn.executemany(
+                "INSERT OR REPLACE INTO images (root, path, subfolder, name, ext, mtime, size, atime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        removed = [(root, _join(rel, name)) for name in set(indexed) - present]
+        if removed:
+            conn.executemany(
+                "DELETE FROM images WHERE root = ? AND path = ?", removed
+            )
+
+        return subdirs
+
+    def apply_changes(self, changes):
+        """Applies the deltas reported by `model_utils.watcher.FolderWatcher`."""
+        root = os.path.abspath(changes.root)
+        if root not in self.last_sync:
+            # recording the directory mtimes would hide the files of a never synced
+            # root from `_sync`, its first sync picks these changes up anyway
+            return
+        to_rel = lambda p: os.path.relpath(os.path.abspath(p), root).replace(
+            os.sep, "/"
+        )
+
+        rows = []
+        for path in changes.added:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rel = to_rel(path)
+            subfolder, _, name = rel.rpartition("/")
+            rows.append(
+                (
+                    root,
+                    rel,
+                    subfolder,
+                    name,
+                    os.path.splitext(name)[1].lower(),
+                    st.st_mtime,
+                    st.st_size,
+                    st.st_atime,
+                )
+            )
+
+        with self.lock, self.conn:
+            conn = self.conn
+            conn.executemany(
+                "DELETE FROM images WHERE root = ? AND path = ?",
+                [(root, to_rel(p)) for p in changes.removed],
+            )
+            for path in changes.removed_dirs:
+                rel = to_rel(path)
+                conn.execute("DELETE FROM dirs WHERE root = ? AND path = ?", (root, rel))
+                conn.execute(
+                    "DELETE FROM images WHERE root = ? AND subfolder = ?", (root, rel)
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO images (root, path, subfolder, name, ext, mtime, size, atime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            for path, mtime in changes.dirs.items():
+                rel = to_rel(path)
+                if rel == ".":
+                    rel, parent = "", None
+                else:
+                    parent = rel.rpartition("/")[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO dirs (root, path, parent, mtime) VALUES (?, ?, ?, ?)",
+                    (root, rel, parent, mtime),
+                )
+
+    def touch(self, root: str, full_path: str):
+        """Records an access to the file, used by the LRU retention policy."""
+        root = os.path.abspath(root)
+        rel = os.path.relpath(os.path.abspath(full_path), root).replace(os.sep, "/")
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE images SET atime = ? WHERE root = ? AND path = ?",
+                (time.time(), root, rel),
+            )
+
+    def totals(self, root: str):
+        """Number of files and total bytes of a root, maintained incrementally by triggers."""
+        root = os.path.abspath(root)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT files, bytes FROM totals WHERE root = ?", (root,)
+            ).fetchone()
+        return row if row else (0, 0)
+
+    def remove(self, root: str, full_path: str):
+        self.remove_many(root, [full_path])
+
+    def remove_many(self, root: str, full_paths: list):
+        root = os.path.abspath(root)
+        rows = [
+            (root, os.path.relpath(os.path.abspath(p), root).replace(os.sep, "/"))
+            for p in full_paths
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM images WHERE root = ? AND path = ?", rows
+            )
+
+    def query(
+        self,
+        root: str,
+        sort: str = "name",
+        order: str = "asc",
+        limit: int = None,
+        cursor: str = None,
+        since: float = None,
+        until: float = None,
+        subfolder: str = None,
+        extensions: list = None,
+    ):
+        """
+        Returns a page of images and the cursor of the next page (None on the last page).
+        """
+        root = os.path.abspath(root)
+        column = SORT_COLUMNS.get(sort)
+        if column is None:
+            raise ValueError(f"invalid sort: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"invalid order: {order}")
+        if limit is not None and limit <= 0:
+            raise ValueError("limit must be positive")
+
+        where = ["root = ?"]
+        params = [root]
+        if since is not None:
+            where.append("mtime >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("mtime < ?")
+            params.append(until)
+        if subfolder:
+            subfolder = subfolder.replace("\\", "/").strip("/")
+            where.append("(subfolder = ? OR substr(subfolder, 1, ?) = ?)")
+            params += [subfolder, len(subfolder) + 1, subfolder + "/"]
+        if extensions:
+            exts = [e.lower() if e.startswith(".") else "." + e.lower() for e in extensions]
+            where.append(f"ext IN ({', '.join('?' * len(exts))})")
+            params += exts
+        if cursor:
+            value, path = decode_cursor(cursor)
+            op = ">" if order == "asc" else "<"
+            where.append(f"({column}, path) {op} (?, ?)")
+            params += [value, path]
+
+        direction = "ASC" if order == "asc" else "DESC"
+        sql = (
+            f"SELECT path, subfolder, name, mtime, size, atime FROM images WHERE {' AND '.join(where)} "
+            f"ORDER BY {column} {direction}, path {direction}"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(
+                {"name": last[2], "mtime": last[3], "size": last[4], "atime": last[5]}[
+                    column
+                ],
+                last[0],
+            )
+
+        images = [
+            {
+                "name": name,
+                "full_path": os.path.join(root, *path.split("/")),
+                "subfolder": subfolder,
+                "mtime": mtime,
+                "size": size,
+            }
+            for path, subfolder, name, mtime, size, _ in rows
+        ]
+        return images, next_cursor
+
+
+output_index = OutputImageIndex(index_filename)
@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from aiohttp.web import Request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+
+
+class CachedBody:
+    def __init__(self, version, body: bytes):
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+    def encode(self, encoding: str) -> bytes:
+        data = self.encoded.get(encoding)
+        if data is None:
+            with self.lock:
+                data = self.encoded.get(encoding)
+                if data is None:
+                    if encoding == "br":
+                        data = brotli.compress(self.body, quality=5)
+                    else:
+                        data = gzip.compress(self.body, compresslevel=6)
+                    self.encoded[encoding] = data
+        return data
+
+
+class ResponseCache:
+    """
+    Memoized JSON bodies of the listing endpoints. An entry is rebuilt when the
+    version of the underlying data changes (refresh, watcher deltas...).
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, key, version, body: bytes) -> CachedBody:
+        entry = CachedBody(version, body)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def json_body(**kwargs) -> bytes:
+    return json.dumps({"code": 200, "message": "success", **kwargs}).encode("utf8")
+
+
+def query_key(request: Request) -> tuple:
+    return tuple(sorted(request.rel_url.query.items()))
+
+
+def _accepted_encoding(request: Request):
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("Accept-Encoding", "").split(",")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match lists `etag` or `*`, with the weak comparison of RFC 9110."""
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags or "*" in tags
+
+
+def cached_json_response(request: Request, entry: CachedBody) -> Response:
+    headers = {"ETag": entry.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status=304, headers=headers)
+
+    body = entry.body
+    encoding = _accepted_encoding(request) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding is not None:
+        body = entry.encode(encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body=body, headers=headers, content_type="application/json")
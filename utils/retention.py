@@ -0,0 +1,189 @@
+import threading
+import time
+
+import folder_paths
+
+from . import config
+from ..model_utils.shared_index import shared_index
+from .files import delete_images
+from .output_index import output_index
+
+RETENTION_FOLDER_TYPES = ("output", "temp")
+ORDERS = ("mtime", "atime")
+PAGE_SIZE = 1000
+
+
+class RetentionPolicy:
+    """
+    Limits of a directory: files older than `max_age_hours` are evicted, then the
+    least recently modified (`order="mtime"`) or accessed (`order="atime"`) files
+    until the directory fits in `max_bytes` and `max_files`.
+    """
+
+    def __init__(self, max_age_hours=None, max_bytes=None, max_files=None, order="mtime"):
+        if order not in ORDERS:
+            raise ValueError(f"invalid order: {order}")
+        self.max_age_hours = float(max_age_hours) if max_age_hours is not None else None
+        self.max_bytes = int(max_bytes) if max_bytes is not None else None
+        self.max_files = int(max_files) if max_files is not None else None
+        self.order = order
+
+    @classmethod
+    def from_config(cls, folder_type: str):
+        prefix = f"RETENTION_{folder_type.upper()}_"
+        return cls(
+            max_age_hours=config.get_float(prefix + "MAX_AGE_HOURS", None),
+            max_bytes=config.get_int(prefix + "MAX_BYTES", None),
+            max_files=config.get_int(prefix + "MAX_FILES", None),
+            order=config.get_str(prefix + "ORDER", "mtime"),
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            max_age_hours=data.get("max_age_hours"),
+            max_bytes=data.get("max_bytes"),
+            max_files=data.get("max_files"),
+            order=data.get("order", "mtime"),
+        )
+
+    @property
+    def active(self) -> bool:
+        return any(
+            limit is not None
+            for limit in (self.max_age_hours, self.max_bytes, self.max_files)
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "max_age_hours": self.max_age_hours,
+            "max_bytes": self.max_bytes,
+            "max_files": self.max_files,
+            "order": self.order,
+        }
+
+
+policies = {
+    folder_type: RetentionPolicy.from_config(folder_type)
+    for folder_type in RETENTION_FOLDER_TYPES
+}
+retention_lock = threading.Lock()
+
+
+def _filename(image: dict) -> str:
+    return f"{image['subfolder']}/{image['name']}" if image["subfolder"] else image["name"]
+
+
+def plan_eviction(folder_type: str, policy: RetentionPolicy) -> dict:
+    """
+    Files to evict to satisfy the policy. Usage comes from the incremental totals
+    of the output index and only the evicted files are read from it.
+    """
+    folder = folder_paths.get_directory_by_type(folder_type)
+    output_index.sync(folder)
+    files, total_bytes = output_index.totals(folder)
+    remaining_files, remaining_bytes = files, total_bytes
+    evicted = {}
+
+    if policy.max_age_hours is not None:
+        cutoff = time.time() - policy.max_age_hours * 3600
+        cursor = None
+        while True:
+            page, cursor = output_index.query(
+                folder, sort="mtime", limit=PAGE_SIZE, cursor=cursor, until=cutoff
+            )
+            for image in page:
+                evicted[_filename(image)] = image["size"]
+                remaining_files -= 1
+                remaining_bytes -= image["size"]
+            if cursor is None:
+                break
+
+    def over_quota():
+        return (policy.max_files is not None and remaining_files > policy.max_files) or (
+            policy.max_bytes is not None and remaining_bytes > policy.max_bytes
+        )
+
+    cursor = None
+    while over_quota():
+        page, cursor = output_index.query(
+            folder, sort=policy.order, limit=PAGE_SIZE, cursor=cursor
+        )
+        for image in page:
+            if not over_quota():
+                break
+            name = _filename(image)
+            if name in evicted:
+                continue
+            evicted[name] = image["size"]
+            remaining_files -= 1
+            remaining_bytes -= image["size"]
+        if cursor is None:
+            break
+
+    return {
+        "type": folder_type,
+        "policy": policy.to_dict(),
+        "files": files,
+        "bytes": total_bytes,
+        "evict_files": len(evicted),
+        "evict_bytes": total_bytes - remaining_bytes,
+        "remaining_files": remaining_files,
+        "remaining_bytes": remaining_bytes,
+        "filenames": list(evicted),
+    }
+
+
+def apply_retention(folder_type: str, policy: RetentionPolicy = None, dry_run: bool = False) -> dict:
+    policy = policy or policies[folder_type]
+    with retention_lock:
+        plan = plan_eviction(folder_type, policy)
+        if dry_run or not plan["filenames"]:
+            return plan
+
+        results = delete_images(folder_type, plan["filenames"])
+        plan["deleted"] = sum(1 for result in results if result["code"] == 200)
+        plan["errors"] = [result for result in results if result["code"] != 200]
+        return plan
+
+
+def usage() -> dict:
+    result = {}
+    for folder_type in RETENTION_FOLDER_TYPES:
+        folder = folder_paths.get_directory_by_type(folder_type)
+        output_index.sync(folder)
+        files, total_bytes = output_index.totals(folder)
+        result[folder_type] = {
+            "files": files,
+            "bytes": total_bytes,
+            "policy": policies[folder_type].to_dict(),
+        }
+    return result
+
+
+def start_retention():
+    """Applies the configured policies every COMFYUI_EXTRA_API_RETENTION_INTERVAL seconds."""
+    active = [t for t in RETENTION_FOLDER_TYPES if policies[t].active]
+    if not active:
+        return None
+
+    interval = config.get_float("RETENTION_INTERVAL", 600.0)
+
+    def run():
+        while True:
+            # with a shared index, only the owner process evicts files
+            for folder_type in active if shared_index.owner else ():
+                try:
+                    result = apply_retention(folder_type)
+                    if result.get("deleted"):
+                        print(
+                            f"[extra-api] retention: deleted {result['deleted']} {folder_type} files, "
+                            f"freed {result['evict_bytes']} bytes"
+                        )
+                except Exception as e:
+                    print(f"[extra-api] retention of {folder_type} failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="extra-api-retention", daemon=True)
+    thread.start()
+    return thread
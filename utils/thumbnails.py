@@ -0,0 +1,149 @@
+import hashlib
+import io
+import os
+import queue
+import threading
+from urllib.parse import urlencode
+
+from PIL import Image, ImageOps
+
+from . import config
+from .executor import cpu_executor
+from .output_index import IMAGE_EXTENSIONS
+from ..model_utils.cache import cached_data_for_file, store_data_for_file
+
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+MIN_SIZE = 16
+MAX_SIZE = config.get_int("THUMBNAIL_MAX_SIZE", 1024)
+DEFAULT_SIZE = 256
+QUALITY = config.get_int("THUMBNAIL_QUALITY", 80)
+PREGENERATE_SIZES = [
+    int(size) for size in config.get_str("THUMBNAIL_PREGENERATE", "").split(",") if size.strip()
+]
+PREGENERATE_FORMAT = config.get_str("THUMBNAIL_PREGENERATE_FORMAT", "webp")
+
+pregenerate_queue = queue.Queue(maxsize=10000)
+thumbnail_stats = {"generated": 0, "pregenerated": 0, "errors": 0, "dropped": 0}
+stats_lock = threading.Lock()
+
+
+def validate_params(size: int, fmt: str, quality: int):
+    if not MIN_SIZE <= size <= MAX_SIZE:
+        raise ValueError(f"size must be between {MIN_SIZE} and {MAX_SIZE}")
+    if fmt not in FORMATS:
+        raise ValueError(f"invalid format: {fmt}, expected one of {', '.join(FORMATS)}")
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+
+
+def render_thumbnail(filepath: str, size: int, fmt: str, quality: int = QUALITY) -> bytes:
+    """Encoded thumbnail fitting in size x size, module level so it can run in the process pool."""
+    with Image.open(filepath) as img:
+        # JPEG is decoded directly at a reduced scale
+        img.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size))
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif fmt == "webp" and img.mode not in ("RGB", "RGBA", "L"):
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, FORMATS[fmt][0], quality=quality)
+    return buffer.getvalue()
+
+
+def thumbnail_title(filepath: str, size: int, fmt: str, quality: int) -> str:
+    return f"{filepath}|{size}|{fmt}|{quality}"
+
+
+def thumbnail_etag(filepath: str, st: os.stat_result, size: int, fmt: str, quality: int) -> str:
+    key = f"{thumbnail_title(filepath, size, fmt, quality)}|{st.st_mtime_ns}|{st.st_size}"
+    return '"' + hashlib.blake2b(key.encode("utf8"), digest_size=16).hexdigest() + '"'
+
+
+def cached_thumbnail(filepath: str, st: os.stat_result, size: int, fmt: str, quality: int):
+    """The cached thumbnail if it is still valid for the file, None otherwise."""
+    return cached_data_for_file(
+        "thumbnails",
+        thumbnail_title(filepath, size, fmt, quality),
+        filepath,
+        lambda: None,
+        stat=st,
+    )
+
+
+def store_thumbnail(filepath: str, st: os.stat_result, size: int, fmt: str, quality: int, data: bytes):
+    store_data_for_file(
+        "thumbnails", thumbnail_title(filepath, size, fmt, quality), filepath, data, stat=st
+    )
+    with stats_lock:
+        thumbnail_stats["generated"] += 1
+
+
+def thumbnail_url(filename: str, folder_type: str, size: int, fmt: str, mtime: float) -> str:
+    # the version parameter lets clients cache the thumbnail until the image changes
+    query = urlencode(
+        {"filename": filename, "type": folder_type, "size": size, "format": fmt, "v": int(mtime)}
+    )
+    return "/comfyapi/v1/thumbnail?" + query
+
+
+def pregenerate(filepath: str):
+    """Renders the COMFYUI_EXTRA_API_THUMBNAIL_PREGENERATE sizes of an image that are not cached yet."""
+    try:
+        st = os.stat(filepath)
+        for size in PREGENERATE_SIZES:
+            if cached_thumbnail(filepath, st, size, PREGENERATE_FORMAT, QUALITY) is not None:
+                continue
+            data = cpu_executor.pool.submit(
+                render_thumbnail, filepath, size, PREGENERATE_FORMAT, QUALITY
+            ).result()
+            store_thumbnail(filepath, st, size, PREGENERATE_FORMAT, QUALITY, data)
+            with stats_lock:
+                thumbnail_stats["pregenerated"] += 1
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[extra-api] failed to generate the thumbnails of {filepath}: {e}")
+        with stats_lock:
+            thumbnail_stats["errors"] += 1
+
+
+def queue_new_outputs(changes):
+    for path in changes.added:
+        try:
+            pregenerate_queue.put_nowait(path)
+        except queue.Full:
+            with stats_lock:
+                thumbnail_stats["dropped"] += 1
+
+
+def start_pregeneration():
+    """
+    Generates thumbnails of the new output images in the background, enabled with
+    COMFYUI_EXTRA_API_THUMBNAIL_PREGENERATE=256[,512...]. New files are reported by
+    the folder watcher (COMFYUI_EXTRA_API_WATCH=1).
+    """
+    if not PREGENERATE_SIZES:
+        return None
+
+    import folder_paths
+    from ..model_utils.watcher import folder_watcher
+
+    for size in PREGENERATE_SIZES:
+        validate_params(size, PREGENERATE_FORMAT, QUALITY)
+
+    output_dir = folder_paths.get_output_directory()
+    if not folder_watcher.is_watching(output_dir):
+        print("[extra-api] thumbnail pre-generation requires COMFYUI_EXTRA_API_WATCH=1")
+        return None
+    folder_watcher.watch(output_dir, queue_new_outputs, extensions=IMAGE_EXTENSIONS)
+
+    def run():
+        while True:
+            pregenerate(pregenerate_queue.get())
+
+    thread = threading.Thread(target=run, name="extra-api-thumbnails", daemon=True)
+    thread.start()
+    return thread